@@ -1,18 +1,25 @@
-
-from PySide2 import QtWidgets
-import shiboken2
-import maya.OpenMayaUI as omui
-from nconstraintoutliner.outliner import NConstraintOutliner
+try:
+    long
+except NameError:  # python 3
+    long = int
 
 
 _nconstraint_outliner = None
 
 
 def launch():
-    if _nconstraint_outliner is None:
-        global _nconstraint_outliner
+    # the ui modules are imported on demand, the scripting and the headless
+    # modules (profiler, maps, ...) don't require them
+    from PySide2 import QtWidgets
+    import shiboken2
+    import maya.OpenMayaUI as omui
+    from nconstraintoutliner.outliner import NConstraintOutliner
+
+    global _nconstraint_outliner
+    # the widget is rebuilt if maya deleted it (main window rebuilt, ...)
+    if (_nconstraint_outliner is None or
+            not shiboken2.isValid(_nconstraint_outliner)):
         main_window = omui.MQtUtil.mainWindow()
         parent = shiboken2.wrapInstance(long(main_window), QtWidgets.QWidget)
         _nconstraint_outliner = NConstraintOutliner(parent)
     _nconstraint_outliner.show()
-
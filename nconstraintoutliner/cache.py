@@ -0,0 +1,225 @@
+"""
+This module stores the scanned dynamic constraints in a sqlite database of
+the user maya folder, so a saved scene can be reopened without resolving
+again the types, the components and the nucleus of every constraint.
+
+A scene entry is keyed by the scene path, its modification time and the
+loaded references (path and modification time). The nodes are matched by
+uuid and validated by a signature of the values the cached ones are computed
+from: the type attribute, the connected nComponents, their nBase and the
+nucleus. A node renamed or edited since the save is queried again.
+
+nconstraints = load_nconstraints()  # None if the scene isn't cached
+save_nconstraints(nconstraints)
+
+The saved values are the cached values of the DynamicConstraint instances,
+they must be up to date, see service.NConstraintIndex._after_save_callback.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from maya import cmds
+import maya.api.OpenMaya as om2
+
+from nconstraintoutliner.index import get_namespace, is_namespace_hidden
+from nconstraintoutliner.nconstraint import TYPE_ATTR_NAME, DynamicConstraint
+from nconstraintoutliner.sweeper import list_connected_nodes
+
+
+CACHE_FILENAME = 'nconstraintoutliner_cache.sqlite'
+MAXIMUM_CACHED_SCENES = 50
+# the tables are dropped when the version changes
+SCHEMA_VERSION = 2
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS scenes (
+        key TEXT PRIMARY KEY, scene TEXT, updated REAL)''',
+    '''CREATE TABLE IF NOT EXISTS nconstraints (
+        key TEXT, uuid TEXT, node TEXT, type INTEGER, nice_name TEXT,
+        nucleus TEXT, components TEXT, signature TEXT,
+        PRIMARY KEY (key, uuid))''')
+
+
+def get_cache_path():
+    return os.path.join(cmds.internalVar(userAppDir=True), CACHE_FILENAME)
+
+
+def get_scene_key():
+    '''
+    return a key identifying the saved scene and its loaded references. None
+    is returned if the scene is unsaved or modified, its content can't be
+    trusted to match a previous scan.
+    '''
+    scene = cmds.file(query=True, sceneName=True)
+    if not scene or cmds.file(query=True, modified=True):
+        return None
+    files = [scene]
+    for reference in cmds.file(query=True, reference=True) or []:
+        if cmds.referenceQuery(reference, isLoaded=True):
+            files.append(reference.split('{')[0])  # strip the copy number
+    try:
+        state = [(path, os.path.getmtime(path)) for path in files]
+    except OSError:  # the scene or a reference isn't on disk anymore
+        return None
+    return hashlib.sha1(json.dumps(state).encode('utf-8')).hexdigest()
+
+
+def get_nconstraints_signatures(nodes):
+    '''
+    return a dict {node: signature} of the values the cached values are
+    computed from: the type attribute, the connected nComponents, their
+    nBase and the nucleus. A constraint whose type or members were edited
+    gets another signature. The connections are read in bulk.
+    '''
+    nodes = list(nodes)
+    if not nodes:
+        return {}
+    ncomponents = list_connected_nodes(nodes, 'nComponent')
+    nbases = list_connected_nodes(
+        sorted(set().union(*ncomponents.values())), 'nBase')
+    nucleus = list_connected_nodes(nodes, 'nucleus')
+    selection = om2.MSelectionList()
+    for node in nodes:
+        selection.add(node)
+    signatures = {}
+    for i, node in enumerate(nodes):
+        fn = om2.MFnDependencyNode(selection.getDependNode(i))
+        constraint_type = (
+            fn.findPlug(TYPE_ATTR_NAME, False).asInt()
+            if fn.hasAttribute(TYPE_ATTR_NAME) else None)
+        node_ncomponents = sorted(ncomponents.get(node, ()))
+        values = [
+            constraint_type, node_ncomponents,
+            [sorted(nbases.get(c, ())) for c in node_ncomponents],
+            sorted(nucleus.get(node, ()))]
+        signatures[node] = hashlib.sha1(
+            json.dumps(values).encode('utf-8')).hexdigest()
+    return signatures
+
+
+def _connect():
+    connection = sqlite3.connect(get_cache_path())
+    if connection.execute('PRAGMA user_version').fetchone()[0] != (
+            SCHEMA_VERSION):
+        connection.execute('DROP TABLE IF EXISTS scenes')
+        connection.execute('DROP TABLE IF EXISTS nconstraints')
+        connection.execute('PRAGMA user_version={}'.format(SCHEMA_VERSION))
+    for statement in SCHEMA:
+        connection.execute(statement)
+    return connection
+
+
+def _list_scene_uuids():
+    ''' return a dict {uuid: node long name} of the dynamic constraints '''
+    nodes = cmds.ls(type='dynamicConstraint', long=True)
+    if not nodes:
+        return {}
+    return dict(zip(cmds.ls(nodes, uuid=True), nodes))
+
+
+def load_nconstraints(hidden_namespaces=()):
+    '''
+    return the DynamicConstraint list of the scene with their cached values
+    filled from the cache. The nodes created, renamed or edited since the
+    save are returned without cached values, the nodes of the hidden
+    namespaces are skipped. None is returned if the scene isn't in the
+    cache.
+    '''
+    key = get_scene_key()
+    if key is None:
+        return None
+    try:
+        with closing(_connect()) as connection:
+            if not connection.execute(
+                    'SELECT 1 FROM scenes WHERE key=?', (key,)).fetchone():
+                return None
+            rows = connection.execute(
+                'SELECT uuid, node, type, nice_name, nucleus, components, '
+                'signature FROM nconstraints WHERE key=?', (key,)).fetchall()
+    except sqlite3.Error as exception:
+        logging.warning('nconstraint cache unreadable: {}'.format(exception))
+        return None
+
+    records = {row[0]: row[1:] for row in rows}
+    uuids = sorted(
+        (item for item in _list_scene_uuids().items() if not
+         is_namespace_hidden(get_namespace(item[1]), hidden_namespaces)),
+        key=lambda x: x[1])
+    nconstraints = [DynamicConstraint(node) for _, node in uuids]
+    signatures = get_nconstraints_signatures(
+        dc.nodename for dc in nconstraints)
+    for (uuid, _), nconstraint in zip(uuids, nconstraints):
+        record = records.get(uuid)
+        if record is None or record[0] != nconstraint.nodename:
+            continue
+        if record[5] != signatures.get(nconstraint.nodename):
+            continue
+        nconstraint.set_cached_values(
+            constraint_type=record[1], nice_name=record[2],
+            nucleus=record[3], components=json.loads(record[4]))
+    return nconstraints
+
+
+def save_nconstraints(nconstraints, signatures=None):
+    '''
+    store the DynamicConstraint list for the current scene. Nothing is done
+    if the scene is unsaved or modified. The oldest scenes are removed from
+    the cache.
+    @signatures is the dict returned by get_nconstraints_signatures, it's
+    queried if it's None.
+    '''
+    key = get_scene_key()
+    if key is None:
+        return False
+    nconstraints = list(nconstraints)
+    if signatures is None:
+        signatures = get_nconstraints_signatures(
+            dc.nodename for dc in nconstraints)
+    uuids = {node: uuid for uuid, node in _list_scene_uuids().items()}
+    rows = []
+    for nconstraint in nconstraints:
+        node = nconstraint.nodename
+        uuid = uuids.get(nconstraint.fullpathname)
+        signature = signatures.get(node)
+        if uuid is None or signature is None:
+            continue
+        rows.append((
+            key, uuid, node, nconstraint.type, nconstraint.nice_name,
+            nconstraint.nucleus or '', json.dumps(nconstraint.components),
+            signature))
+    try:
+        with closing(_connect()) as connection, connection:
+            connection.execute('DELETE FROM nconstraints WHERE key=?', (key,))
+            connection.executemany(
+                'INSERT INTO nconstraints VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                rows)
+            connection.execute(
+                'INSERT OR REPLACE INTO scenes VALUES (?, ?, ?)',
+                (key, cmds.file(query=True, sceneName=True), time.time()))
+            _prune(connection)
+    except sqlite3.Error as exception:
+        logging.warning('nconstraint cache not saved: {}'.format(exception))
+        return False
+    return True
+
+
+def _prune(connection):
+    keys = connection.execute(
+        'SELECT key FROM scenes ORDER BY updated DESC LIMIT -1 OFFSET ?',
+        (MAXIMUM_CACHED_SCENES,)).fetchall()
+    connection.executemany('DELETE FROM scenes WHERE key=?', keys)
+    connection.executemany('DELETE FROM nconstraints WHERE key=?', keys)
+
+
+def clear_cache():
+    try:
+        with closing(_connect()) as connection, connection:
+            connection.execute('DELETE FROM scenes')
+            connection.execute('DELETE FROM nconstraints')
+    except sqlite3.Error as exception:
+        logging.warning('nconstraint cache not cleared: {}'.format(exception))
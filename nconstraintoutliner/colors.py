@@ -0,0 +1,178 @@
+"""
+This module reads and writes the viewport colors of the dynamic constraints
+in bulk, and colors them by rule. The colors are the override colors of the
+constraints transforms. The maya index palette is read once and cached.
+
+colors = read_nconstraints_colors(cmds.ls(type='dynamicConstraint'))
+colors['dynamicConstraintShape1'] -> (25, 25, 125)
+
+colors = color_by_rule(nconstraints, 'type')
+set_nconstraints_colors(colors)
+
+The rules are 'type', 'component', 'nucleus', 'cost' (it needs the costs
+measured by the profiler) and 'name', a palette color hashed from the
+transform name. All the colors are written with one modifier (one undo).
+"""
+
+import zlib
+
+from maya import cmds
+import maya.api.OpenMaya as om2
+
+from nconstraintoutliner.history import operation
+from nconstraintoutliner.modifier import commit
+
+
+DEFAULT_COLOR = 25, 25, 125
+PALETTE_SIZE = 32
+COLOR_RULES = 'type', 'component', 'nucleus', 'cost', 'name'
+# the palette indices used for the constraint types, same order as
+# DYNAMIC_CONTRAINT_TYPES
+TYPE_COLOR_INDICES = 3, 13, 14, 17, 18, 6, 9, 20
+COST_COLORS = (60, 200, 60), (220, 40, 40)
+# dark or grey palette entries, unreadable on the maya viewport
+_HASHED_IGNORED_INDICES = 0, 1, 2, 3, 11, 19
+_palette = []
+
+
+def get_index_palette():
+    '''
+    return the maya index colors as a list of 32 (r, g, b) tuples. The index
+    0 means no override color, it gets the default color.
+    '''
+    if not _palette:
+        _palette.append(DEFAULT_COLOR)
+        _palette.extend(
+            tuple(int(c * 255) for c in cmds.colorIndex(i, query=True))
+            for i in range(1, PALETTE_SIZE))
+    return list(_palette)
+
+
+def clear_palette_cache():
+    ''' the index colors can be edited with the maya color settings '''
+    del _palette[:]
+
+
+def get_palette_color(index):
+    return get_index_palette()[index]
+
+
+def _get_parent_plugs(nodes, attributes):
+    '''
+    return a list of plug lists, one by node: the plugs of the constraint
+    transform.
+    '''
+    selection = om2.MSelectionList()
+    for node in nodes:
+        selection.add(node)
+    plugs = []
+    for i in range(selection.length()):
+        dagpath = selection.getDagPath(i)
+        dagpath.pop()
+        fn = om2.MFnDependencyNode(dagpath.node())
+        plugs.append([fn.findPlug(name, False) for name in attributes])
+    return plugs
+
+
+def read_nconstraints_colors(nodes):
+    '''
+    return a dict {node: (r, g, b)} of the constraints viewport colors. It
+    works as a normal transform override color, except if the color is
+    undefined: it returns the default color.
+    '''
+    nodes = list(nodes)
+    if not nodes:
+        return {}
+    palette = get_index_palette()
+    attributes = (
+        'overrideEnabled', 'overrideRGBColors', 'overrideColorRGB',
+        'overrideColor')
+    colors = {}
+    for node, plugs in zip(nodes, _get_parent_plugs(nodes, attributes)):
+        enabled, rgb_mode, rgb, index = plugs
+        if not enabled.asBool():
+            colors[node] = DEFAULT_COLOR
+        elif rgb_mode.asBool():
+            colors[node] = tuple(
+                int(rgb.child(i).asFloat() * 255) for i in range(3))
+        else:
+            colors[node] = palette[index.asInt() % PALETTE_SIZE]
+    return colors
+
+
+def set_nconstraints_colors(colors):
+    '''
+    set the override colors given as {node: (r, g, b)} on the constraints
+    transforms, with one modifier (one undo).
+    '''
+    if not colors:
+        return
+    nodes = sorted(colors)
+    attributes = 'overrideEnabled', 'overrideRGBColors', 'overrideColorRGB'
+    modifier = om2.MDGModifier()
+    for node, plugs in zip(nodes, _get_parent_plugs(nodes, attributes)):
+        enabled, rgb_mode, rgb = plugs
+        modifier.newPlugValueBool(enabled, True)
+        modifier.newPlugValueBool(rgb_mode, True)
+        for i, value in enumerate(colors[node]):
+            modifier.newPlugValueFloat(rgb.child(i), value / 255.0)
+    with operation(nodes, 'set_colors'):
+        commit(modifier)
+
+
+def get_hashed_color(name):
+    '''
+    return a palette color picked from the name. It's stable between the
+    sessions (python hash() isn't).
+    '''
+    indices = [
+        i for i in range(PALETTE_SIZE) if i not in _HASHED_IGNORED_INDICES]
+    checksum = zlib.crc32(name.encode('utf-8')) & 0xffffffff
+    return get_palette_color(indices[checksum % len(indices)])
+
+
+def interpolate_color(start, end, ratio):
+    ratio = min(max(ratio, 0.0), 1.0)
+    return tuple(int(a + (b - a) * ratio) for a, b in zip(start, end))
+
+
+def color_by_rule(nconstraints, rule, costs=None):
+    '''
+    return a dict {node: (r, g, b)} for the DynamicConstraint list:
+    - type: a palette color by constraint type.
+    - component: a hashed color of the first component.
+    - nucleus: a hashed color of the nucleus.
+    - cost: a gradient from green to red on the costs {node: cost}, the
+      constraints without cost are ignored.
+    - name: a hashed color of the transform name.
+    '''
+    if rule not in COLOR_RULES:
+        raise ValueError('unknown color rule: {}'.format(rule))
+    colors = {}
+    if rule == 'cost':
+        costs = costs or {}
+        maximum = max(costs.values()) if costs else 0
+        for nconstraint in nconstraints:
+            cost = costs.get(nconstraint.nodename)
+            if cost is None:
+                continue
+            ratio = cost / maximum if maximum else 0.0
+            colors[nconstraint.nodename] = interpolate_color(
+                COST_COLORS[0], COST_COLORS[1], ratio)
+        return colors
+
+    for nconstraint in nconstraints:
+        if rule == 'type':
+            color = get_palette_color(TYPE_COLOR_INDICES[nconstraint.type])
+        elif rule == 'component':
+            components = nconstraint.components
+            color = (
+                get_hashed_color(components[0]) if components
+                else DEFAULT_COLOR)
+        elif rule == 'nucleus':
+            nucleus = nconstraint.nucleus
+            color = get_hashed_color(nucleus) if nucleus else DEFAULT_COLOR
+        else:
+            color = get_hashed_color(nconstraint.parent)
+        colors[nconstraint.nodename] = color
+    return colors
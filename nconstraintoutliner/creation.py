@@ -0,0 +1,245 @@
+"""
+This module creates many dynamic constraints at once, without selection and
+without the maya createNConstraint mel script. The constraints are described
+by specs: a constraint type and a list of members (mesh transform, vertex
+indices). The indices can be None to constraint the whole mesh. Like with
+createNConstraint, the last member of a point to surface or a slide on
+surface constraint is the surface: its indices are faces indices.
+
+specs = [
+    ConstraintSpec(DynamicConstraint.COMPONENT_TO_COMPONENT, [
+        ('shirt', [12, 13]), ('pants', [104, 105])])]
+create_nconstraints(specs)
+
+Specs can be generated by pairing the nearest vertices of two meshes:
+specs = pair_nearest_vertices('shirt', 'pants', max_distance=0.1)
+"""
+
+from collections import namedtuple
+
+from maya import cmds
+import maya.api.OpenMaya as om2
+
+from nconstraintoutliner.history import operation
+from nconstraintoutliner.maps import get_mesh_points
+from nconstraintoutliner.modifier import commit
+from nconstraintoutliner.nconstraint import (
+    TYPE_ATTR_NAME, DynamicConstraint, find_type_in_history,
+    format_nconstraint_nice_name, load_preset, resolve_name_collisions)
+from nconstraintoutliner.presets import create_type_attribute
+from nconstraintoutliner.spatial import nearest_neighbours
+
+
+# nComponent componentType values
+COMPONENT_TYPE_POINT = 2
+COMPONENT_TYPE_FACE = 4
+COMPONENT_TYPE_SURFACE = 6
+SURFACE_CONSTRAINT_TYPES = (
+    DynamicConstraint.POINT_TO_SURFACE, DynamicConstraint.SLIDE_ON_SURFACE)
+ELEMENTS_FROM_INDICES = 0
+ELEMENTS_ALL = 2
+ConstraintSpec = namedtuple('ConstraintSpec', ['constraint_type', 'members'])
+
+
+def get_mesh_nbase(mesh):
+    nbase = find_type_in_history(mesh, 'nBase')
+    if nbase is None:
+        raise ValueError('{} is not a nCloth or a nRigid'.format(mesh))
+    return nbase
+
+
+def get_nbase_nucleus(nbase):
+    nucleus = cmds.listConnections(nbase, type='nucleus')
+    if not nucleus:
+        raise ValueError('{} is not connected to a nucleus'.format(nbase))
+    return nucleus[0]
+
+
+def pair_nearest_vertices(
+        mesh_a, mesh_b, max_distance=None, indices_a=None,
+        constraint_type=DynamicConstraint.COMPONENT_TO_COMPONENT,
+        per_pair=True):
+    '''
+    return the specs constraining the vertices of mesh_a to their nearest
+    vertex on mesh_b. The pairs further than max_distance are skipped.
+    @indices_a restricts the mesh_a vertices used, all of them by default.
+    @per_pair create one constraint by vertices pair, else one constraint
+    for all the pairs. The surface constraints use the whole mesh_b surface.
+    '''
+    points_a = get_mesh_points(mesh_a)
+    points_b = get_mesh_points(mesh_b)
+    if indices_a is None:
+        indices_a = range(len(points_a))
+    indices_a = list(indices_a)
+    if not indices_a:
+        return []
+    indices_b, distances = nearest_neighbours(points_b, points_a[indices_a])
+
+    pairs = [
+        (a, int(b)) for a, b, distance in
+        zip(indices_a, indices_b, distances)
+        if max_distance is None or distance <= max_distance]
+    if not pairs:
+        return []
+    if constraint_type in SURFACE_CONSTRAINT_TYPES:
+        # the vertices slide on the whole mesh_b surface
+        members_a = [[a] for a, _ in pairs] if per_pair else [
+            sorted(set(a for a, _ in pairs))]
+        return [
+            ConstraintSpec(
+                constraint_type, [(mesh_a, indices), (mesh_b, None)])
+            for indices in members_a]
+    if per_pair:
+        return [
+            ConstraintSpec(constraint_type, [(mesh_a, [a]), (mesh_b, [b])])
+            for a, b in pairs]
+    return [ConstraintSpec(constraint_type, [
+        (mesh_a, sorted(set(a for a, _ in pairs))),
+        (mesh_b, sorted(set(b for _, b in pairs)))])]
+
+
+def _set_plug_value(modifier, plug, value):
+    if isinstance(value, bool):
+        modifier.newPlugValueBool(plug, value)
+    elif isinstance(value, int):
+        modifier.newPlugValueInt(plug, value)
+    else:
+        modifier.newPlugValueDouble(plug, float(value))
+
+
+def get_component_types(spec):
+    '''
+    return the nComponent componentType of each member of the spec. The
+    members are points, except the surface of the surface constraints (the
+    last member): faces, or the whole surface if its indices are None.
+    '''
+    types = [COMPONENT_TYPE_POINT] * len(spec.members)
+    if spec.constraint_type in SURFACE_CONSTRAINT_TYPES and len(types) > 1:
+        indices = spec.members[-1][1]
+        types[-1] = (
+            COMPONENT_TYPE_SURFACE if indices is None else COMPONENT_TYPE_FACE)
+    return types
+
+
+def _get_next_index(plug, reserved):
+    indices = plug.getExistingArrayAttributeIndices()
+    index = max(list(indices) + list(reserved) + [-1]) + 1
+    reserved.add(index)
+    return index
+
+
+def create_nconstraints(specs):
+    '''
+    create all the dynamic constraints described by the specs, tag their
+    types, apply their presets and give them a nice name. It's done with a
+    few modifiers and is one undo.
+    return the list of DynamicConstraint created.
+    '''
+    specs = list(specs)
+    if not specs:
+        return []
+    meshes = sorted(set(mesh for spec in specs for mesh, _ in spec.members))
+    nbases = {mesh: get_mesh_nbase(mesh) for mesh in meshes}
+    nucleus = {mesh: get_nbase_nucleus(nbases[mesh]) for mesh in meshes}
+
+    requests = [
+        ('', format_nconstraint_nice_name(
+            spec.constraint_type, sorted(set(m for m, _ in spec.members))))
+        for spec in specs]
+    names = resolve_name_collisions(requests, set(cmds.ls()))
+
+    with operation([], 'create_nconstraints'):
+        # nodes creation
+        dg_modifier = om2.MDGModifier()
+        ncomponents = [
+            [dg_modifier.createNode('nComponent') for _ in spec.members]
+            for spec in specs]
+        dag_modifier = om2.MDagModifier()
+        transforms, shapes = [], []
+        for name in names:
+            transform = dag_modifier.createNode('transform')
+            dag_modifier.renameNode(transform, name)
+            shape = dag_modifier.createNode('dynamicConstraint', transform)
+            dag_modifier.renameNode(shape, name + 'Shape')
+            transforms.append(transform)
+            shapes.append(shape)
+        commit(dg_modifier)
+        commit(dag_modifier)
+
+        modifier = om2.MDGModifier()
+        for shape in shapes:
+            modifier.addAttribute(shape, create_type_attribute())
+        commit(modifier)
+
+        # connections and attributes
+        modifier = om2.MDGModifier()
+        reserved_indices = {}
+        for spec, shape, spec_ncomponents in zip(specs, shapes, ncomponents):
+            fn_shape = om2.MFnDependencyNode(shape)
+            component_ids = fn_shape.findPlug('componentIds', False)
+            members = zip(
+                spec.members, spec_ncomponents, get_component_types(spec))
+            for index, ((mesh, indices), ncomponent, component_type) in (
+                    enumerate(members)):
+                _wire_ncomponent(
+                    modifier, ncomponent, nbases[mesh], indices,
+                    component_type,
+                    component_ids.elementByLogicalIndex(index))
+
+            nucleus_name = nucleus[spec.members[0][0]]
+            _wire_nucleus(
+                modifier, fn_shape, nucleus_name,
+                reserved_indices.setdefault(nucleus_name, set()))
+
+            plug = fn_shape.findPlug(TYPE_ATTR_NAME, False)
+            modifier.newPlugValueInt(plug, spec.constraint_type)
+            preset = load_preset(spec.constraint_type) or {}
+            for attribute, value in sorted(preset.items()):
+                if value is None or not fn_shape.hasAttribute(attribute):
+                    continue
+                _set_plug_value(
+                    modifier, fn_shape.findPlug(attribute, False), value)
+        commit(modifier)
+
+    nconstraints = []
+    for spec, shape in zip(specs, shapes):
+        nconstraint = DynamicConstraint(om2.MFnDagNode(shape).fullPathName())
+        nconstraint.set_cached_values(
+            constraint_type=spec.constraint_type,
+            components=sorted(set(m for m, _ in spec.members)))
+        nconstraints.append(nconstraint)
+    return nconstraints
+
+
+def _wire_ncomponent(
+        modifier, ncomponent, nbase, indices, component_type, component_id):
+    fn = om2.MFnDependencyNode(ncomponent)
+    fn_nbase = om2.MFnDependencyNode(
+        om2.MSelectionList().add(nbase).getDependNode(0))
+    modifier.connect(
+        fn_nbase.findPlug('nucleusId', False), fn.findPlug('objectId', False))
+    modifier.connect(fn.findPlug('outComponent', False), component_id)
+    plug = fn.findPlug('componentType', False)
+    modifier.newPlugValueInt(plug, component_type)
+    plug = fn.findPlug('elements', False)
+    if indices is None:
+        modifier.newPlugValueInt(plug, ELEMENTS_ALL)
+        return
+    modifier.newPlugValueInt(plug, ELEMENTS_FROM_INDICES)
+    data = om2.MFnIntArrayData().create(
+        om2.MIntArray([int(i) for i in indices]))
+    modifier.newPlugValue(fn.findPlug('componentIndices', False), data)
+
+
+def _wire_nucleus(modifier, fn_shape, nucleus, reserved_indices):
+    fn_nucleus = om2.MFnDependencyNode(
+        om2.MSelectionList().add(nucleus).getDependNode(0))
+    input_start = fn_nucleus.findPlug('inputStart', False)
+    index = _get_next_index(input_start, reserved_indices)
+    modifier.connect(
+        fn_shape.findPlug('evalStart', False).elementByLogicalIndex(0),
+        input_start.elementByLogicalIndex(index))
+    modifier.connect(
+        fn_shape.findPlug('evalCurrent', False).elementByLogicalIndex(0),
+        fn_nucleus.findPlug(
+            'inputCurrent', False).elementByLogicalIndex(index))
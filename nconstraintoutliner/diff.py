@@ -0,0 +1,279 @@
+"""
+This module compares the dynamic constraints of two scene versions. Each
+constraint gets a fingerprint: its type, its enable state, its members
+(sorted indices by mesh) and its key attributes, hashed in one digest. The
+fingerprints of the two versions are joined by node name in one pass.
+
+before = load_fingerprints('shot010_v003.json')
+after = extract_fingerprints()
+report = diff_fingerprints(before, after)
+report.added, report.removed, report.changed
+
+The scenes which aren't open are read by headless mayapy processes, both in
+parallel:
+report = diff_scenes('shot010_v003.ma', 'shot010_v004.ma')
+save_report(report, 'shot010_v003_v004.json')
+
+The open scene can be extracted while the processes are running:
+extraction = FingerprintsExtraction(['shot010_v003.ma'])
+after = extract_fingerprints()
+report = diff_fingerprints(extraction.wait()[0], after)
+
+The fingerprints can also be saved from a session and compared later:
+save_fingerprints(extract_fingerprints(), 'shot010_v004.json')
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+from maya import cmds
+
+from nconstraintoutliner.nconstraint import (
+    get_constraint_type, get_nconstraint_memberships)
+from nconstraintoutliner.snapshots import get_plugs, read_values
+
+
+FINGERPRINT_ATTRIBUTES = (
+    'enable', 'constraintMethod', 'constraintRelation', 'componentRelation',
+    'connectionMethod', 'connectWithinComponent', 'maxDistance',
+    'excludeCollisions', 'strength', 'tangentStrength', 'glueStrength')
+FINGERPRINT_PRECISION = 6
+# seconds between two checks of the extraction processes
+POLL_INTERVAL = 0.1
+Fingerprint = namedtuple('Fingerprint', ['digest', 'fields'])
+DiffReport = namedtuple(
+    'DiffReport', ['added', 'removed', 'changed', 'unchanged'])
+
+
+def compute_digest(fields):
+    ''' return the hash of the fields, independent of the keys order '''
+    text = json.dumps(fields, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def create_fingerprint(constraint_type, memberships, attributes):
+    '''
+    return a Fingerprint from the constraint values. The values are
+    normalized as json types, so a fingerprint loaded from a file is equal
+    to the one extracted from the scene.
+    '''
+    fields = {
+        'type': constraint_type,
+        'members': memberships,
+        'attributes': {
+            name: round(value, FINGERPRINT_PRECISION)
+            for name, value in attributes.items()}}
+    fields = json.loads(json.dumps(fields))
+    return Fingerprint(compute_digest(fields), fields)
+
+
+def extract_fingerprints(nodes=None):
+    '''
+    return a dict {node: Fingerprint} of the given dynamic constraints, all
+    the scene constraints if it's None.
+    '''
+    if nodes is None:
+        nodes = cmds.ls(type='dynamicConstraint')
+    nodes = list(nodes)
+    if not nodes:
+        return {}
+    values = read_values(get_plugs(nodes, FINGERPRINT_ATTRIBUTES))
+    fingerprints = {}
+    for node, row in zip(nodes, values.tolist()):
+        attributes = {
+            name: value for name, value in zip(FINGERPRINT_ATTRIBUTES, row)
+            if value == value}  # nan for the missing attributes
+        fingerprints[node] = create_fingerprint(
+            get_constraint_type(node), get_nconstraint_memberships(node),
+            attributes)
+    return fingerprints
+
+
+def get_changed_fields(fields, other_fields):
+    ''' return the names of the fields which are different '''
+    changed = [
+        key for key in ('type', 'members') if fields[key] != other_fields[key]]
+    attributes = fields['attributes']
+    other_attributes = other_fields['attributes']
+    changed.extend(
+        name for name in sorted(set(attributes) | set(other_attributes))
+        if attributes.get(name) != other_attributes.get(name))
+    return changed
+
+
+def diff_fingerprints(before, after):
+    '''
+    return a DiffReport of two dicts {node: Fingerprint}:
+    added: frozenset of nodes, the outliner tests each row against it
+    removed: sorted list of nodes
+    changed: dict {node: changed fields names}
+    unchanged: the number of identical constraints
+    Only the digests are compared, the fields of the changed constraints are
+    compared to report what changed.
+    '''
+    added = frozenset(node for node in after if node not in before)
+    removed = sorted(node for node in before if node not in after)
+    changed = {}
+    unchanged = 0
+    for node, fingerprint in after.items():
+        other = before.get(node)
+        if other is None:
+            continue
+        if other.digest == fingerprint.digest:
+            unchanged += 1
+            continue
+        changed[node] = get_changed_fields(other.fields, fingerprint.fields)
+    return DiffReport(added, removed, changed, unchanged)
+
+
+def save_fingerprints(fingerprints, filepath):
+    with open(filepath, 'w') as f:
+        json.dump(
+            {node: fp.fields for node, fp in fingerprints.items()}, f,
+            sort_keys=True)
+
+
+def load_fingerprints(filepath):
+    with open(filepath, 'r') as f:
+        fields_by_node = json.load(f)
+    return {
+        node: Fingerprint(compute_digest(fields), fields)
+        for node, fields in fields_by_node.items()}
+
+
+def save_report(report, filepath):
+    ''' write the DiffReport as json, it's the machine readable report '''
+    values = dict(report._asdict(), added=sorted(report.added))
+    with open(filepath, 'w') as f:
+        json.dump(values, f, indent=2, sort_keys=True)
+
+
+def get_mayapy_path():
+    executable = 'mayapy.exe' if sys.platform == 'win32' else 'mayapy'
+    return os.path.join(os.environ['MAYA_LOCATION'], 'bin', executable)
+
+
+def _start_extraction(scene, filepath, log_filepath, mayapy):
+    package_root = os.path.dirname(
+        os.path.dirname(os.path.realpath(__file__)))
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(
+        [package_root] + [environment.get('PYTHONPATH', '')])
+    command = [
+        mayapy, '-c',
+        'from nconstraintoutliner.diff import main; main()',
+        scene, filepath]
+    # the output goes to a file, a pipe could fill up while the processes
+    # are only polled
+    with open(log_filepath, 'wb') as log:
+        return subprocess.Popen(
+            command, env=environment, stdout=log, stderr=subprocess.STDOUT)
+
+
+class FingerprintsExtraction(object):
+    '''
+    extract the fingerprints of the scenes in headless mayapy processes, all
+    running in parallel. A scene can also be a fingerprints .json file, it's
+    then loaded directly. The processes run until wait returns or kill is
+    called, the open scene can be extracted meanwhile.
+    '''
+
+    def __init__(self, scenes, mayapy=None):
+        mayapy = mayapy or get_mayapy_path()
+        self.scenes = list(scenes)
+        self._directory = tempfile.mkdtemp(prefix='nconstraintoutliner_diff')
+        self._processes = []  # (scene, process, log filepath)
+        self._filepaths = []
+        try:
+            for i, scene in enumerate(self.scenes):
+                if scene.endswith('.json'):
+                    self._filepaths.append(scene)
+                    continue
+                filepath = os.path.join(self._directory, '{}.json'.format(i))
+                log_filepath = os.path.join(
+                    self._directory, '{}.log'.format(i))
+                self._processes.append((scene, _start_extraction(
+                    scene, filepath, log_filepath, mayapy), log_filepath))
+                self._filepaths.append(filepath)
+        except Exception:
+            self.kill()
+            raise
+
+    def poll(self):
+        ''' return True if all the processes are finished '''
+        return all(
+            process.poll() is not None for _, process, _ in self._processes)
+
+    def wait(self):
+        '''
+        return the fingerprints of the scenes in the same order. If an
+        extraction fails, the other processes are killed before the
+        RuntimeError is raised.
+        '''
+        try:
+            running = list(self._processes)
+            while running:
+                for scene, process, log_filepath in list(running):
+                    returncode = process.poll()
+                    if returncode is None:
+                        continue
+                    if returncode:
+                        with open(log_filepath, 'rb') as log:
+                            output = log.read().decode('utf-8', 'replace')
+                        raise RuntimeError(
+                            'fingerprints extraction failed: {}\n{}'.format(
+                                scene, output))
+                    running.remove((scene, process, log_filepath))
+                if running:
+                    time.sleep(POLL_INTERVAL)
+            return [load_fingerprints(path) for path in self._filepaths]
+        finally:
+            self.kill()
+
+    def kill(self):
+        '''
+        stop the running processes, then remove their temporary directory
+        '''
+        for _, process, _ in self._processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        self._processes = []
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+
+def extract_scenes_fingerprints(scenes, mayapy=None):
+    '''
+    open the scenes in headless mayapy processes, all in parallel, and
+    return their fingerprints in the same order, see FingerprintsExtraction
+    '''
+    return FingerprintsExtraction(scenes, mayapy).wait()
+
+
+def diff_scenes(before_scene, after_scene, mayapy=None):
+    ''' return the DiffReport of two scenes or fingerprints files '''
+    before, after = extract_scenes_fingerprints(
+        [before_scene, after_scene], mayapy)
+    return diff_fingerprints(before, after)
+
+
+def main():
+    '''
+    mayapy entry point: open the scene given as first argument and save its
+    fingerprints in the json file given as second argument.
+    '''
+    import maya.standalone
+    maya.standalone.initialize()
+    try:
+        scene, filepath = sys.argv[-2:]
+        cmds.file(scene, open=True, force=True)
+        save_fingerprints(extract_fingerprints(), filepath)
+    finally:
+        maya.standalone.uninitialize()
@@ -0,0 +1,157 @@
+"""
+This module finds the redundant dynamic constraints: the exact duplicates
+(same type and same members) and the constraints whose members are included
+in another enabled constraint of the same type on the same components. The
+duplicates are grouped by key in one pass, the supersets are found with an
+inverted index of the members. An enabled constraint is always kept, so
+disabling the redundant constraints never removes a constraint entirely.
+
+report = find_redundant_nconstraints(list_nconstraints())
+set_nconstraints_enabled(report.redundant, False)
+"""
+
+from collections import namedtuple
+
+
+RedundancyReport = namedtuple(
+    'RedundancyReport', ['duplicates', 'overlaps', 'redundant'])
+
+
+def get_membership_key(constraint_type, memberships):
+    '''
+    return a hashable canonical key of a constraint. Two constraints with the
+    same key are duplicates.
+    '''
+    return constraint_type, memberships
+
+
+def find_duplicates(keys):
+    '''
+    group the nodes by key in one pass.
+    @keys is a dict {node: key}
+    return the list of groups containing more than one node. Each group is
+    sorted.
+    '''
+    groups = {}
+    for node, key in keys.items():
+        groups.setdefault(key, []).append(node)
+    return sorted(sorted(g) for g in groups.values() if len(g) > 1)
+
+
+class _MembershipIndex(object):
+    '''
+    inverted index of a group of constraints on the same components: a
+    bitset of the constraints containing each member (column, index). The
+    supersets of a constraint are the intersection of the bitsets of its
+    members.
+    '''
+
+    def __init__(self, memberships_list):
+        self._columns = len(memberships_list[0])
+        self._all = [0] * self._columns  # the 'all' memberships
+        self._lists = [0] * self._columns  # the indices lists memberships
+        self._postings = {}
+        for bit, memberships in enumerate(memberships_list):
+            mask = 1 << bit
+            for column, (_, _, indices) in enumerate(memberships):
+                if indices == 'all':
+                    self._all[column] |= mask
+                elif isinstance(indices, str):
+                    key = column, indices
+                    self._postings[key] = self._postings.get(key, 0) | mask
+                else:
+                    self._lists[column] |= mask
+                    for index in indices:
+                        key = column, index
+                        self._postings[key] = (
+                            self._postings.get(key, 0) | mask)
+
+    def find_supersets(self, memberships, candidates):
+        '''
+        return the bitset of the @candidates (a bitset) containing all the
+        members, the constraint itself included
+        '''
+        for column, (_, _, indices) in enumerate(memberships):
+            everything = self._all[column]
+            if indices == 'all':
+                candidates &= everything
+            elif isinstance(indices, str):
+                candidates &= (
+                    self._postings.get((column, indices), 0) | everything)
+            else:
+                candidates &= self._lists[column] | everything
+                for index in indices:
+                    if not candidates:
+                        return 0
+                    candidates &= (
+                        self._postings.get((column, index), 0) | everything)
+        return candidates
+
+
+def find_overlaps(keys, enabled=None):
+    '''
+    find the constraints included in another enabled one with the same type
+    and the same components. The supersets are found with an inverted index
+    by group of constraints on the same components.
+    @keys is a dict {node: (type, memberships)}, the exact duplicates must
+    have been removed.
+    @enabled is the set of the enabled nodes, all the nodes if it's None.
+    return a sorted list of (subset node, superset node) tuples, the
+    superset is the smallest enabled one.
+    '''
+    groups = {}
+    for node, (constraint_type, memberships) in keys.items():
+        components = tuple(m[:2] for m in memberships)
+        groups.setdefault((constraint_type, components), []).append(node)
+
+    overlaps = []
+    for nodes in groups.values():
+        if len(nodes) < 2:
+            continue
+        # the bits are ordered by size, the lowest bit is the smallest node
+        nodes = sorted(nodes, key=lambda n: (_count(keys[n][1]), n))
+        index = _MembershipIndex([keys[node][1] for node in nodes])
+        enabled_mask = sum(
+            1 << bit for bit, node in enumerate(nodes)
+            if enabled is None or node in enabled)
+        for bit, node in enumerate(nodes):
+            candidates = enabled_mask & ~(1 << bit)
+            supersets = index.find_supersets(keys[node][1], candidates)
+            if supersets:
+                lowest_bit = (supersets & -supersets).bit_length() - 1
+                overlaps.append((node, nodes[lowest_bit]))
+    return sorted(overlaps)
+
+
+def _count(memberships):
+    return sum(
+        float('inf') if indices == 'all' else
+        0 if isinstance(indices, str) else len(indices)
+        for _, _, indices in memberships)
+
+
+def find_redundant_nconstraints(nconstraints):
+    '''
+    return a RedundancyReport for the given DynamicConstraint list:
+    duplicates: list of nodes groups with the same type and members
+    overlaps: list of (subset node, enabled superset node)
+    redundant: sorted list of the nodes which can be disabled or deleted, all
+    the duplicates except one of each group, enabled if possible, and the
+    subsets of an enabled constraint. An active constraint always remains.
+    '''
+    keys = {}
+    enabled = set()
+    for dc in nconstraints:
+        keys[dc.nodename] = get_membership_key(dc.type, dc.memberships)
+        if dc.enable:
+            enabled.add(dc.nodename)
+    duplicates = find_duplicates(keys)
+    redundant = set()
+    for group in duplicates:
+        # the first enabled node is kept
+        kept = min(group, key=lambda n: (n not in enabled, n))
+        redundant.update(node for node in group if node != kept)
+    keys = {n: k for n, k in keys.items() if n not in redundant}
+    overlaps = find_overlaps(keys, enabled)
+    redundant.update(subset for subset, _ in overlaps)
+    return RedundancyReport(duplicates, overlaps, sorted(redundant))
@@ -0,0 +1,68 @@
+"""
+This module records the nodes touched by the tool operations. Each operation
+is executed in an undo chunk with a unique name. After an undo or a redo, the
+name of the undone operation is enough to know which nodes have to be
+refreshed, without rescanning the scene.
+
+with operation(['dynamicConstraintShape1'], 'set_type'):
+    cmds.setAttr('dynamicConstraintShape1.constraintType', 2)
+...
+cmds.undo()
+get_undone_nodes() -> ['dynamicConstraintShape1']
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from itertools import count
+
+from maya import cmds
+
+from nconstraintoutliner.modifier import undo_chunk
+
+
+OPERATION_PREFIX = 'nconstraintoutliner'
+MAXIMUM_RECORDED_OPERATIONS = 1000
+_operations = OrderedDict()
+_counter = count()
+
+
+@contextmanager
+def operation(nodes, label='operation'):
+    '''
+    execute the context as one undo and record the nodes it touches
+    '''
+    name = '{}_{}_{}'.format(OPERATION_PREFIX, label, next(_counter))
+    _operations[name] = list(nodes)
+    while len(_operations) > MAXIMUM_RECORDED_OPERATIONS:
+        _operations.popitem(last=False)
+    with undo_chunk(name):
+        yield
+
+
+def recorded_operation(func):
+    '''
+    this decorator record the DynamicConstraint method as an operation
+    touching the instance node.
+    '''
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with operation([self.nodename], func.__name__):
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+def get_undone_nodes():
+    '''
+    return the nodes touched by the operation which was just undone. Return
+    None if the last undo isn't a recorded operation.
+    '''
+    return _operations.get(cmds.undoInfo(query=True, redoName=True))
+
+
+def get_redone_nodes():
+    '''
+    return the nodes touched by the operation which was just redone. Return
+    None if the last redo isn't a recorded operation.
+    '''
+    return _operations.get(cmds.undoInfo(query=True, undoName=True))
@@ -0,0 +1,210 @@
+"""
+This module contains an index of the scene dynamic constraints and their
+relations to the nucleus and to the component transforms. It's built once
+and then updated node by node, from the maya callbacks.
+
+index = SceneIndex()
+index.build()
+for nucleus in index.list_nucleus():
+    for component in index.list_components(nucleus):
+        nconstraints = index.list_nconstraints(nucleus, component)
+
+The constraints are also partitioned by reference node and namespace, a
+reference change only updates the nodes it loads:
+for node in list_reference_nconstraints('characterRN'):
+    index.add(node)
+"""
+
+from maya import cmds
+
+from nconstraintoutliner.nconstraint import DynamicConstraint
+
+
+NO_NUCLEUS = ''  # nucleus key of the constraints which are not connected
+NO_REFERENCE = ''  # reference key of the constraints created in the scene
+ROOT_NAMESPACE = ':'
+
+
+def get_namespace(node):
+    ''' return the namespace of a node name, without query '''
+    namespace = node.split('|')[-1].rpartition(':')[0]
+    return namespace or ROOT_NAMESPACE
+
+
+def is_namespace_hidden(namespace, hidden_namespaces):
+    ''' the nested namespaces are hidden with their parent namespace '''
+    while namespace:
+        if namespace in hidden_namespaces:
+            return True
+        namespace = namespace.rpartition(':')[0]
+    return False
+
+
+def list_reference_nconstraints(reference):
+    ''' return the dynamic constraints loaded by the given reference node '''
+    if not cmds.referenceQuery(reference, isLoaded=True):
+        return []
+    nodes = cmds.referenceQuery(reference, nodes=True, dagPath=True)
+    if not nodes:  # cmds.ls would return all the scene nodes
+        return []
+    return cmds.ls(nodes, type='dynamicConstraint', long=True)
+
+
+def list_reference_children(reference):
+    ''' return the reference nodes nested in the reference, recursively '''
+    children = cmds.referenceQuery(
+        reference, child=True, referenceNode=True) or []
+    for child in list(children):
+        children.extend(list_reference_children(child))
+    return children
+
+
+def get_nconstraints_references():
+    '''
+    return a dict {node long name: reference node} of the referenced dynamic
+    constraints. The nodes created in the scene are not in the dict.
+    '''
+    references = {}
+    for reference in cmds.ls(type='reference'):
+        if reference == 'sharedReferenceNode':
+            continue
+        try:
+            nodes = list_reference_nconstraints(reference)
+        except RuntimeError:  # reference node without file
+            continue
+        references.update((node, reference) for node in nodes)
+    return references
+
+
+class SceneIndex(object):
+
+    def __init__(self):
+        self.nconstraints = {}
+        self.nucleus = {}
+        # the components the nodes were indexed with, the DynamicConstraint
+        # cached ones can be already invalidated
+        self.components = {}
+        self._nodes_by_nucleus = {}
+        self._nodes_by_component = {}
+
+    def __contains__(self, node):
+        return node in self.nconstraints
+
+    def __len__(self):
+        return len(self.nconstraints)
+
+    def build(self, nconstraints=None):
+        '''
+        index the given DynamicConstraint list, all the scene constraints
+        if it's None
+        '''
+        self.clear()
+        if nconstraints is None:
+            nconstraints = cmds.ls(type='dynamicConstraint')
+        for nconstraint in nconstraints:
+            if isinstance(nconstraint, DynamicConstraint):
+                self.add(nconstraint.nodename, nconstraint)
+            else:
+                self.add(nconstraint)
+
+    def clear(self):
+        self.nconstraints = {}
+        self.nucleus = {}
+        self.components = {}
+        self._nodes_by_nucleus = {}
+        self._nodes_by_component = {}
+
+    def add(self, node, nconstraint=None):
+        '''
+        index the node and return its DynamicConstraint
+        '''
+        if node in self.nconstraints:
+            self.remove(node)
+        nconstraint = nconstraint or DynamicConstraint(node)
+        nucleus = nconstraint.nucleus or NO_NUCLEUS
+        self.nconstraints[node] = nconstraint
+        self.nucleus[node] = nucleus
+        self.components[node] = tuple(nconstraint.components)
+        self._nodes_by_nucleus.setdefault(nucleus, set()).add(node)
+        for component in self.components[node]:
+            self._nodes_by_component.setdefault(component, set()).add(node)
+        return nconstraint
+
+    def remove(self, node):
+        '''
+        remove the node from the index and return its DynamicConstraint
+        '''
+        nconstraint = self.nconstraints.pop(node, None)
+        if nconstraint is None:
+            return None
+        nucleus = self.nucleus.pop(node)
+        _discard(self._nodes_by_nucleus, nucleus, node)
+        for component in self.components.pop(node):
+            _discard(self._nodes_by_component, component, node)
+        return nconstraint
+
+    def rename(self, previous_name, name):
+        '''
+        move a renamed node to its new name, the cached values are kept.
+        Return its DynamicConstraint, None if it isn't indexed.
+        '''
+        nconstraint = self.nconstraints.pop(previous_name, None)
+        if nconstraint is None:
+            return None
+        nucleus = self.nucleus.pop(previous_name)
+        components = self.components.pop(previous_name)
+        self.nconstraints[name] = nconstraint
+        self.nucleus[name] = nucleus
+        self.components[name] = components
+        nodes_sets = [self._nodes_by_nucleus[nucleus]] + [
+            self._nodes_by_component[c] for c in components]
+        for nodes in nodes_sets:
+            nodes.discard(previous_name)
+            nodes.add(name)
+        return nconstraint
+
+    def update(self, node):
+        '''
+        reindex a node after a change of its components or its nucleus
+        '''
+        nconstraint = self.remove(node)
+        if nconstraint is not None:
+            nconstraint.invalidate()
+        return self.add(node, nconstraint)
+
+    def list_nucleus(self):
+        return sorted(self._nodes_by_nucleus)
+
+    def list_components(self, nucleus=None):
+        if nucleus is None:
+            return sorted(self._nodes_by_component)
+        nodes = self._nodes_by_nucleus.get(nucleus, set())
+        return sorted(set(
+            component for node in nodes
+            for component in self.components[node]))
+
+    def list_nodes(self, nucleus=None, component=None):
+        if nucleus is None and component is None:
+            return sorted(self.nconstraints)
+        nodes = None
+        if nucleus is not None:
+            nodes = self._nodes_by_nucleus.get(nucleus, set())
+        if component is not None:
+            component_nodes = self._nodes_by_component.get(component, set())
+            nodes = (
+                component_nodes if nodes is None else nodes & component_nodes)
+        return sorted(nodes)
+
+    def list_nconstraints(self, nucleus=None, component=None):
+        return [
+            self.nconstraints[node] for node in
+            self.list_nodes(nucleus, component)]
+
+
+def _discard(nodes_by_key, key, node):
+    nodes = nodes_by_key.get(key)
+    if nodes is None:
+        return
+    nodes.discard(node)
+    if not nodes:
+        del nodes_by_key[key]
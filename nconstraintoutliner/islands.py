@@ -0,0 +1,183 @@
+"""
+This module finds the islands of the dynamic constraints: the groups of
+component transforms (cloth meshes) coupled together by constraints. Two
+islands don't share any constraint, they could be simulated by separate
+nucleus solvers.
+
+graph = ConstraintGraph()
+graph.build((dc.nodename, dc.components) for dc in list_nconstraints())
+for island in graph.list_islands():
+    island.components, island.nodes
+
+The graph is updated node by node with add and remove. The islands are
+found with a union-find on the components, a removal only rebuilds the
+island of the removed constraint.
+The collisions between the meshes are ignored, only the constraints are
+considered as couplings: an island split from the others can still collide
+with them on the same nucleus.
+"""
+
+from collections import namedtuple
+
+
+Island = namedtuple('Island', ['components', 'nodes'])
+
+
+class UnionFind(object):
+    '''
+    disjoint sets of hashable keys, with the union by size and the path
+    halving. The keys of each set are kept by root.
+    '''
+
+    def __init__(self):
+        self._parents = {}
+        self._members = {}
+
+    def __contains__(self, key):
+        return key in self._parents
+
+    def add(self, key):
+        if key not in self._parents:
+            self._parents[key] = key
+            self._members[key] = set([key])
+
+    def find(self, key):
+        parents = self._parents
+        while parents[key] != key:
+            parents[key] = parents[parents[key]]
+            key = parents[key]
+        return key
+
+    def union(self, key, other_key):
+        root, other_root = self.find(key), self.find(other_key)
+        if root == other_root:
+            return root
+        if len(self._members[root]) < len(self._members[other_root]):
+            root, other_root = other_root, root
+        self._parents[other_root] = root
+        self._members[root] |= self._members.pop(other_root)
+        return root
+
+    def members(self, key):
+        return self._members[self.find(key)]
+
+    def discard_set(self, key):
+        ''' remove the whole set containing the key, return its keys '''
+        members = self._members.pop(self.find(key))
+        for member in members:
+            del self._parents[member]
+        return members
+
+    def roots(self):
+        return list(self._members)
+
+
+class ConstraintGraph(object):
+    '''
+    bipartite graph of the constraints and their components, with the
+    islands maintained by a union-find on the components. The constraints
+    without components are islands on their own.
+    '''
+
+    def __init__(self):
+        self._components_by_node = {}
+        self._nodes_by_component = {}
+        self._sets = UnionFind()
+
+    def __contains__(self, node):
+        return node in self._components_by_node
+
+    def __len__(self):
+        return len(self._components_by_node)
+
+    def clear(self):
+        self._components_by_node = {}
+        self._nodes_by_component = {}
+        self._sets = UnionFind()
+
+    def build(self, edges):
+        ''' @edges is an iterable of (node, components) '''
+        self.clear()
+        for node, components in edges:
+            self.add(node, components)
+
+    def add(self, node, components):
+        if node in self._components_by_node:
+            self.remove(node)
+        components = tuple(components)
+        self._components_by_node[node] = components
+        for component in components:
+            self._nodes_by_component.setdefault(component, set()).add(node)
+            self._sets.add(component)
+            self._sets.union(components[0], component)
+
+    def remove(self, node):
+        '''
+        remove the constraint and split its island again if it was the only
+        link between some of its components.
+        '''
+        components = self._components_by_node.pop(node, None)
+        if not components:
+            return
+        for component in components:
+            nodes = self._nodes_by_component[component]
+            nodes.discard(node)
+            if not nodes:
+                del self._nodes_by_component[component]
+        # union-find can't split a set, the island is rebuilt
+        island_components = self._sets.discard_set(components[0])
+        island_nodes = set()
+        for component in island_components:
+            island_nodes.update(self._nodes_by_component.get(component, ()))
+        for island_node in island_nodes:
+            node_components = self._components_by_node[island_node]
+            for component in node_components:
+                self._sets.add(component)
+                self._sets.union(node_components[0], component)
+
+    def get_island(self, node):
+        ''' return the Island containing the constraint '''
+        components = self._components_by_node[node]
+        if not components:
+            return Island((), (node, ))
+        return self._build_island(self._sets.members(components[0]))
+
+    def _build_island(self, components):
+        nodes = set()
+        for component in components:
+            nodes.update(self._nodes_by_component.get(component, ()))
+        return Island(tuple(sorted(components)), tuple(sorted(nodes)))
+
+    def list_islands(self):
+        '''
+        return the islands sorted by size, the biggest first. The islands
+        are sorted by their components names when they have the same size.
+        '''
+        islands = [
+            self._build_island(self._sets.members(root))
+            for root in self._sets.roots()]
+        islands.extend(
+            Island((), (node, ))
+            for node, components in self._components_by_node.items()
+            if not components)
+        return sorted(
+            islands, key=lambda i: (-len(i.components), -len(i.nodes), i))
+
+
+def find_splittable_nucleus(islands, nucleus_by_node):
+    '''
+    return a dict {nucleus: islands} of the nucleus solving more than one
+    island, their islands could move to separate nucleus. The islands
+    without components aren't counted.
+    @nucleus_by_node is a dict {node: nucleus}
+    '''
+    islands_by_nucleus = {}
+    for island in islands:
+        if not island.components:
+            continue
+        nucleus = set(nucleus_by_node.get(node) for node in island.nodes)
+        for name in nucleus:
+            islands_by_nucleus.setdefault(name, []).append(island)
+    return {
+        nucleus: islands for nucleus, islands in islands_by_nucleus.items()
+        if len(islands) > 1}
@@ -0,0 +1,193 @@
+"""
+This module reads and writes the nComponent per-vertex maps (strength,
+weight and glue strength) as numpy arrays. It's the scripted alternative to
+the artisan painting, made for bulk edits on many constraints:
+
+maps = get_vertex_maps(nconstraint.ncomponents, 'strength')
+maps = {c: smooth_map(m, get_ncomponent_edges(c)) for c, m in maps.items()}
+set_vertex_maps(maps, 'strength')
+
+Every set is one plug write by nComponent, all done in one undo.
+"""
+
+import numpy as np
+from maya import cmds
+import maya.api.OpenMaya as om2
+
+from nconstraintoutliner.history import operation
+from nconstraintoutliner.modifier import commit
+from nconstraintoutliner.nconstraint import get_component_transform
+from nconstraintoutliner.spatial import nearest_neighbours, polygons_edges
+
+
+MAP_NAMES = 'strength', 'weight', 'glueStrength'
+MAP_TYPE_PER_VERTEX = 1
+
+
+def get_ncomponent_mesh(ncomponent):
+    '''
+    return the om2.MDagPath of the mesh linked to the nComponent.
+    '''
+    transform = get_component_transform(ncomponent)
+    if not transform or not cmds.listRelatives(transform, type='mesh'):
+        raise ValueError('{} is not linked to a mesh'.format(ncomponent))
+    return get_mesh_dagpath(transform)
+
+
+def get_mesh_dagpath(mesh):
+    dagpath = om2.MSelectionList().add(mesh).getDagPath(0)
+    return dagpath.extendToShape()
+
+
+def get_mesh_points(mesh):
+    ''' return the mesh vertices positions as an (n, 3) array '''
+    if not isinstance(mesh, om2.MDagPath):
+        mesh = get_mesh_dagpath(mesh)
+    points = om2.MFnMesh(mesh).getPoints(om2.MSpace.kWorld)
+    return np.array([(p.x, p.y, p.z) for p in points], dtype=np.float64)
+
+
+def get_ncomponent_points(ncomponent):
+    return get_mesh_points(get_ncomponent_mesh(ncomponent))
+
+
+def get_ncomponent_edges(ncomponent):
+    ''' return the mesh edges as an (n, 2) array of vertex indices '''
+    mesh = om2.MFnMesh(get_ncomponent_mesh(ncomponent))
+    counts, vertices = mesh.getVertices()
+    return polygons_edges(counts, vertices)
+
+
+def get_ncomponent_vertex_count(ncomponent):
+    return om2.MFnMesh(get_ncomponent_mesh(ncomponent)).numVertices
+
+
+def _get_map_plug(ncomponent, map_name, suffix):
+    if map_name not in MAP_NAMES:
+        raise ValueError('unknown map: {}'.format(map_name))
+    mobject = om2.MSelectionList().add(ncomponent).getDependNode(0)
+    return om2.MFnDependencyNode(mobject).findPlug(map_name + suffix, False)
+
+
+def get_vertex_map(ncomponent, map_name='strength'):
+    '''
+    return the per-vertex map of an nComponent as an array. A map which was
+    never painted is returned as an array of ones.
+    '''
+    plug = _get_map_plug(ncomponent, map_name, 'PerVertex')
+    try:
+        values = om2.MFnDoubleArrayData(plug.asMObject()).array()
+    except RuntimeError:  # the data were never set
+        values = []
+    if len(values):
+        return np.array(values, dtype=np.float64)
+    return np.ones(get_ncomponent_vertex_count(ncomponent), dtype=np.float64)
+
+
+def get_vertex_maps(ncomponents, map_name='strength'):
+    ''' return a dict {ncomponent: array} '''
+    return {c: get_vertex_map(c, map_name) for c in ncomponents}
+
+
+def set_vertex_maps(maps, map_name='strength'):
+    '''
+    write the maps given as {ncomponent: array} and switch the map type to
+    per-vertex. All the writes are done in one modifier.
+    '''
+    modifier = om2.MDGModifier()
+    for ncomponent, values in maps.items():
+        values = np.asarray(values, dtype=np.float64)
+        data = om2.MFnDoubleArrayData().create(
+            om2.MDoubleArray(values.tolist()))
+        plug = _get_map_plug(ncomponent, map_name, 'PerVertex')
+        modifier.newPlugValue(plug, data)
+        plug = _get_map_plug(ncomponent, map_name, 'MapType')
+        modifier.newPlugValueInt(plug, MAP_TYPE_PER_VERTEX)
+    with operation(list_ncomponents_constraints(maps), 'set_maps'):
+        commit(modifier)
+
+
+def list_ncomponents_constraints(ncomponents):
+    ''' return the dynamic constraints using the given nComponents '''
+    if not ncomponents:
+        return []
+    constraints = cmds.listConnections(
+        list(ncomponents), type='dynamicConstraint', shapes=True) or []
+    return sorted(set(constraints))
+
+
+def reset_vertex_maps(ncomponents, value=1.0, map_name='strength'):
+    set_vertex_maps({
+        c: np.full(get_ncomponent_vertex_count(c), value)
+        for c in ncomponents}, map_name)
+
+
+def copy_vertex_maps(source, targets, map_name='strength'):
+    '''
+    copy the map of the source nComponent on the targets. If a target mesh
+    has a different topology, the values are transferred by nearest vertex.
+    '''
+    values = get_vertex_map(source, map_name)
+    points = None
+    maps = {}
+    for target in targets:
+        if get_ncomponent_vertex_count(target) == len(values):
+            maps[target] = values
+            continue
+        if points is None:
+            points = get_ncomponent_points(source)
+        maps[target] = transfer_map(
+            values, points, get_ncomponent_points(target))
+    set_vertex_maps(maps, map_name)
+
+
+def transfer_map(values, source_points, target_points):
+    ''' return the values of the nearest source vertex for each target '''
+    indices, _ = nearest_neighbours(source_points, target_points)
+    return np.asarray(values)[indices]
+
+
+def mirror_map(values, points, axis=0, positive_to_negative=True):
+    '''
+    return the map mirrored on the given axis (0, 1 or 2). The values of a
+    side are copied on the other side using the nearest mirrored vertex.
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64)
+    mirrored = points.copy()
+    mirrored[:, axis] *= -1
+    indices, _ = nearest_neighbours(points, mirrored)
+    side = points[:, axis] < 0 if positive_to_negative else points[:, axis] > 0
+    result = values.copy()
+    result[side] = values[indices[side]]
+    return result
+
+
+def smooth_map(values, edges, iterations=1, factor=0.5):
+    '''
+    return the map smoothed by mesh adjacency: each value is blended with the
+    average of its neighbours.
+    '''
+    values = np.array(values, dtype=np.float64)
+    degrees = np.bincount(edges.ravel(), minlength=len(values))
+    connected = degrees > 0
+    for _ in range(iterations):
+        sums = np.zeros_like(values)
+        np.add.at(sums, edges[:, 0], values[edges[:, 1]])
+        np.add.at(sums, edges[:, 1], values[edges[:, 0]])
+        averages = values.copy()
+        averages[connected] = sums[connected] / degrees[connected]
+        values += (averages - values) * factor
+    return values
+
+
+def falloff_map(points, center, radius, inner_value=1.0, outer_value=0.0):
+    '''
+    return a map remapped by distance to center, with a smooth falloff from
+    inner_value at the center to outer_value at the radius.
+    '''
+    distances = np.linalg.norm(
+        np.asarray(points) - np.asarray(center, dtype=np.float64), axis=1)
+    ratios = np.clip(distances / float(radius), 0.0, 1.0)
+    smooth = ratios * ratios * (3 - 2 * ratios)
+    return inner_value + (outer_value - inner_value) * smooth
@@ -0,0 +1,103 @@
+"""
+This module make the maya.api.OpenMaya modifiers undoable. An api modifier
+executed from a script is not registered in the maya undo queue. So this file
+is also a tiny plugin declaring a command which execute a modifier and keep it
+for the undo and the redo.
+
+modifier = om2.MDagModifier()
+modifier.renameNode(mobject, 'new_name')
+commit(modifier)
+"""
+
+import os
+from contextlib import contextmanager
+
+from maya import cmds
+import maya.api.OpenMaya as om2
+
+
+COMMAND_NAME = 'nConstraintOutlinerCommitModifier'
+_pending_modifiers = []
+
+
+def maya_useNewAPI():
+    '''
+    tell maya the plugin is using the python api 2.0
+    '''
+    pass
+
+
+class CommitModifierCommand(om2.MPxCommand):
+
+    def __init__(self):
+        super(CommitModifierCommand, self).__init__()
+        self._modifier = None
+
+    def doIt(self, unused_args):
+        # when maya load this file as plugin, it create a new module object.
+        # The modifiers are pushed in the one imported by the package.
+        from nconstraintoutliner import modifier
+        self._modifier = modifier._pending_modifiers.pop(0)
+        self.redoIt()
+
+    def redoIt(self):
+        self._modifier.doIt()
+
+    def undoIt(self):
+        self._modifier.undoIt()
+
+    def isUndoable(self):
+        return True
+
+    @staticmethod
+    def creator():
+        return CommitModifierCommand()
+
+
+def initializePlugin(mobject):
+    plugin = om2.MFnPlugin(mobject)
+    plugin.registerCommand(COMMAND_NAME, CommitModifierCommand.creator)
+
+
+def uninitializePlugin(mobject):
+    plugin = om2.MFnPlugin(mobject)
+    plugin.deregisterCommand(COMMAND_NAME)
+
+
+def load_plugin():
+    if hasattr(cmds, COMMAND_NAME):
+        return
+    # __file__ can be the compiled file, maya needs the source
+    path = os.path.splitext(os.path.realpath(__file__))[0] + '.py'
+    cmds.loadPlugin(path, quiet=True)
+
+
+def commit(modifier):
+    '''
+    execute the given om2.MDGModifier or om2.MDagModifier as one undoable
+    operation.
+    '''
+    load_plugin()
+    _pending_modifiers.append(modifier)
+    try:
+        getattr(cmds, COMMAND_NAME)()
+    finally:
+        # if the command failed before consuming the modifier, it must not
+        # be executed by the next commit
+        if modifier in _pending_modifiers:
+            _pending_modifiers.remove(modifier)
+
+
+@contextmanager
+def undo_chunk(name=None):
+    '''
+    group all the maya commands executed in the context in one undo
+    '''
+    if name:
+        cmds.undoInfo(openChunk=True, chunkName=name)
+    else:
+        cmds.undoInfo(openChunk=True)
+    try:
+        yield
+    finally:
+        cmds.undoInfo(closeChunk=True)
@@ -1,4 +1,3 @@
-
 """
 This module containing tools to create Dynamic Constraint : nConstraint
 It's useful to remember the constaint's creation preset (saving in a custom
@@ -14,8 +13,14 @@ from itertools import cycle
 from maya import cmds, mel
 import maya.api.OpenMaya as om2
 
+from nconstraintoutliner.colors import (
+    read_nconstraints_colors, set_nconstraints_colors)
+from nconstraintoutliner.history import operation, recorded_operation
+from nconstraintoutliner.modifier import commit
+from nconstraintoutliner.records import ConstraintRecords
 from nconstraintoutliner.selection import (
-    MayaSelectionManager, preserve_selection, selection_required)
+    REPLACE, MayaSelectionManager, preserve_selection, select_memberships,
+    selection_required)
 
 
 TYPE_ATTR_NAME = 'constraintType'
@@ -71,6 +76,12 @@ DYNAMIC_CONTRAINT_TYPES = [
         'preset_file': 'disable_collision.json'
     },
 ]
+NCOMPONENT_ELEMENTS = 'indices', 'borders', 'all'
+# prefix of the temporary names used by rename_nconstraints
+RENAME_TEMPORARY_PREFIX = '__nconstraint_rename_'
+_presets_cache = {}
+# cached values of all the DynamicConstraint, see the records module
+_records = ConstraintRecords()
 
 
 class DynamicConstraint(object):
@@ -82,6 +93,10 @@ class DynamicConstraint(object):
     nconstraint = DynamicConstraint(nodename='existing_nConstraintShape')
     or instancied creating a new constraint node in maya:
     nconstraint = DynamicConstraint.create(DynamicConstraint.TRANSFORM)
+
+    the cached values (type, components, nice name, nucleus, color) are
+    stored in a row of the records module column store, the instance only
+    holds the node and the row.
     """
     UNDEFINED = 0
     TRANSFORM = 1
@@ -91,15 +106,21 @@ class DynamicConstraint(object):
     WELD = 5
     EXCLUDE_COLLIDE = 6
     DISABLE_COLLIDE = 7
+    __slots__ = '_dagnode', '_row', '_components_iterator', '_members'
 
     def __init__(self, nodename):
         self._dagnode = om2.MFnDagNode(
             om2.MSelectionList().add(nodename).getDependNode(0))
-        self._components = None
+        self._row = _records.allocate()
         self._components_iterator = None
         self._members = None
-        self._type = None
-        self._nice_name = None
+
+    def __del__(self):
+        # the row isn't allocated if the node doesn't exist and the module
+        # globals can be already cleared at the interpreter exit
+        row = getattr(self, '_row', None)
+        if row is not None and _records is not None:
+            _records.release(row)
 
     @staticmethod
     @selection_required
@@ -115,7 +136,58 @@ class DynamicConstraint(object):
 
     @property
     def color(self):
-        return get_nconstraint_color(self.nodename)
+        '''
+        the override color is cached, a color changed outside the outliner
+        (attribute editor, script) is read again only after an undo, a
+        refresh or a rebuild of the index.
+        '''
+        color = _records.get_color(self._row)
+        if color is None:
+            color = get_nconstraint_color(self.nodename)
+            _records.set_color(self._row, color)
+        return color
+
+    @property
+    def cached_color(self):
+        ''' return the cached color without query, None if not cached '''
+        return _records.get_color(self._row)
+
+    def invalidate(self):
+        '''
+        clear the cached values, they are queried again when needed
+        '''
+        _records.clear(self._row)
+        self._components_iterator = None
+        self._members = None
+
+    def invalidate_components(self):
+        '''
+        clear the cached values depending on the components names, after a
+        component transform rename
+        '''
+        _records.clear(self._row, ('components', 'nice_names'))
+        self._components_iterator = None
+        self._members = None
+
+    def set_cached_values(
+            self, constraint_type=None, components=None, nice_name=None,
+            nucleus=None, color=None):
+        '''
+        fill the cached values already known, by the creation, the disk
+        cache or a bulk query. The values left to None are queried when
+        needed.
+        '''
+        if constraint_type is not None:
+            _records.set_type(self._row, constraint_type)
+        if components is not None:
+            _records.set_components(self._row, components)
+            self._components_iterator = None
+        if nice_name is not None:
+            _records.set_nice_name(self._row, nice_name)
+        if nucleus is not None:
+            _records.set_nucleus(self._row, nucleus)
+        if color is not None:
+            _records.set_color(self._row, color)
 
     @property
     def components_iterator(self):
@@ -125,37 +197,67 @@ class DynamicConstraint(object):
 
     @property
     def components(self):
-        ''' return objects members parent's '''
-        if self._components is None:
-            self._components = get_nconstraint_components(self.nodename)
+        ''' return objects members parent's as a tuple '''
+        components = _records.get_components(self._row)
+        if components is None:
+            _records.set_components(
+                self._row, get_nconstraint_components(self.nodename))
+            components = _records.get_components(self._row)
             self._components_iterator = None
-        return self._components
+        return components
+
+    @property
+    def memberships(self):
+        ''' return the members as canonical tuples, see get_memberships '''
+        if self._members is None:
+            self._members = get_nconstraint_memberships(self.nodename)
+        return self._members
+
+    @property
+    def ncomponents(self):
+        ''' return the nComponent nodes linked to the constraint '''
+        return get_nconstraint_ncomponents(self.nodename)
+
+    @property
+    def nucleus(self):
+        nucleus = _records.get_nucleus(self._row)
+        if nucleus is None:
+            nucleus = get_nconstraint_nucleus(self.nodename) or ''
+            _records.set_nucleus(self._row, nucleus)
+        return nucleus or None
 
     @property
     def nodename(self):
         return self._dagnode.name()
 
+    @property
+    def fullpathname(self):
+        return self._dagnode.fullPathName()
+
     @property
     def enable(self):
         return cmds.getAttr(self.nodename + '.enable')
 
+    @property
+    def drifted_attributes(self):
+        ''' return the attributes tweaked since the preset was applied '''
+        # local import, the presets module depends on this one
+        from nconstraintoutliner.presets import list_drifted_attributes
+        drifts = list_drifted_attributes([self.nodename], [self.type])
+        return drifts.get(self.nodename, [])
+
     @property
     def is_well_named(self):
-        #  this loop remove digit at the end of the parent name to compare
-        #  with the canonic nice name
-        n = 0
-        for letter in self.parent[::-1]:  # magic trick to reverse string
-            if letter.isdigit():
-                n += 1
-            else:
-                break
-        return self.parent[:-n] if n else self.parent == self.nice_name
+        return is_nice_name_variant(self.parent, self.nice_name)
 
     @property
     def nice_name(self):
-        if self._nice_name is None:
-            self._nice_name = get_nconstraint_nice_name(self.nodename)
-        return self._nice_name
+        nice_name = _records.get_nice_name(self._row)
+        if nice_name is None:
+            nice_name = format_nconstraint_nice_name(
+                self.type, self.components)
+            _records.set_nice_name(self._row, nice_name)
+        return nice_name
 
     @property
     def node(self):
@@ -165,23 +267,31 @@ class DynamicConstraint(object):
     def parent(self):
         return cmds.listRelatives(self.nodename, parent=True)[0]
 
+    @property
+    def parent_mobject(self):
+        return self._dagnode.parent(0)
+
     @property
     def type(self):
-        if self._type is None:
-            self._type = get_constraint_type(self.nodename)
-        return self._type
+        constraint_type = _records.get_type(self._row)
+        if constraint_type is None:
+            constraint_type = get_constraint_type(self.nodename)
+            _records.set_type(self._row, constraint_type)
+        return constraint_type
 
     @property
     def type_name(self):
         return DYNAMIC_CONTRAINT_TYPES[self.type]['name']
 
+    @recorded_operation
     @preserve_selection
     @selection_required
     def add_selection_to_members(self):
         cmds.select([self.nodename] + cmds.ls(sl=True))
         mel.eval('dynamicConstraintMembership "add";')
-        self._components = None
+        _records.clear(self._row, ('components', ))
         self._components_iterator = None
+        self._members = None
 
     def paint_constraint_strength_map_on_components(self):
         component = self.components_iterator.next()
@@ -191,27 +301,49 @@ class DynamicConstraint(object):
             'artAttrNComponentToolScript 4 strength;')
         mel.eval(cmd)
 
-    def select_members(self):
-        cmds.select(self.nodename)
-        mel.eval('dynamicConstraintMembership "select";')
+    def get_vertex_maps(self, map_name='strength'):
+        '''
+        return the per-vertex maps as numpy arrays: {ncomponent: array}.
+        map_name can be 'strength', 'weight' or 'glueStrength'
+        '''
+        # local import, the maps module depends on this one
+        from nconstraintoutliner.maps import get_vertex_maps
+        return get_vertex_maps(self.ncomponents, map_name)
 
+    def set_vertex_maps(self, maps, map_name='strength'):
+        '''
+        set the per-vertex maps from a dict {ncomponent: array} or from a
+        single value applied on all the components.
+        '''
+        from nconstraintoutliner.maps import reset_vertex_maps, set_vertex_maps
+        if isinstance(maps, dict):
+            return set_vertex_maps(maps, map_name)
+        reset_vertex_maps(self.ncomponents, maps, map_name)
+
+    def select_members(self, mode=REPLACE):
+        select_memberships(self.memberships, mode)
+
+    @recorded_operation
     @preserve_selection
     @selection_required
     def remove_selection_to_members(self):
         cmds.select([self.nodename] + cmds.ls(sl=True))
         mel.eval('dynamicConstraintMembership "remove";')
-        self._components = None
+        _records.clear(self._row, ('components', ))
         self._components_iterator = None
+        self._members = None
 
     def rename_node_from_components(self):
-        cmds.rename(self.parent, self.nice_name)
-        self._nice_name = None
+        rename_nconstraints([self])
+        _records.clear(self._row, ('nice_names', ))
 
     def select(self, add=True):
         cmds.select(self.nodename)
 
+    @recorded_operation
     def set_color(self, r, g, b):
         set_nconstraint_color(self.nodename, r, g ,b)
+        _records.set_color(self._row, (r, g, b))
 
     def set_color_from_dialogbox(self):
         cmds.colorEditor(rgb=[c / 255.0 for c in self.color])
@@ -221,39 +353,60 @@ class DynamicConstraint(object):
             int(c * 255) for c in cmds.colorEditor(query=True, rgb=True)]
         self.set_color(r, g, b)
 
+    @recorded_operation
     def set_type(self, constraint_type):
         attribute = self.nodename + '.' + TYPE_ATTR_NAME
         old_type = self.type
+        if not cmds.attributeQuery(
+                TYPE_ATTR_NAME, node=self.nodename, exists=True):
+            add_and_set_constraint_type_attribute(
+                self.nodename, constraint_type)
         cmds.setAttr(attribute, constraint_type)
-        self._type = constraint_type
+        _records.set_type(self._row, constraint_type)
+        _records.clear(self._row, ('nice_names', ))
         # if the constraint if undefined, it's not changing the preset
         # to avoid a change from a tweaked constraint done with the maya tools
         if old_type == DynamicConstraint.UNDEFINED:
             return
         apply_presets_on_nconstraint(self.nodename, constraint_type)
 
+    @recorded_operation
     def switch(self):
         cmds.setAttr(self.nodename + '.enable', not self.enable)
         return self.enable
 
 
-def apply_presets_on_nconstraint(constraint_shape, constraint_type):
+def load_preset(constraint_type):
     """
-    this method opening the json file linked to the constraint type
-    it applying the presets
+    return the preset dict linked to the constraint type. The json files are
+    read once and kept in memory.
     """
+    if constraint_type in _presets_cache:
+        return _presets_cache[constraint_type]
+
     filename = DYNAMIC_CONTRAINT_TYPES[constraint_type]['preset_file']
     if filename is None:
-        return logging.info(
-            'No preset file available, applying presets skipped')
+        return None
 
     filepath = os.path.join(
         os.path.dirname(os.path.realpath(__file__)), PRESETS_FOLDER, filename)
 
     with open(filepath, 'r') as preset_file:
-        attributes = json.load(preset_file)
+        _presets_cache[constraint_type] = json.load(preset_file)
+    return _presets_cache[constraint_type]
+
 
-    for k, v in attributes.iteritems():
+def apply_presets_on_nconstraint(constraint_shape, constraint_type):
+    """
+    this method opening the json file linked to the constraint type
+    it applying the presets
+    """
+    attributes = load_preset(constraint_type)
+    if attributes is None:
+        return logging.info(
+            'No preset file available, applying presets skipped')
+
+    for k, v in attributes.items():
         if v is not None:
             cmds.setAttr(constraint_shape + '.' + k, v)
 
@@ -339,35 +492,70 @@ def get_nconstraint_color(constraint_shape):
     '''
     smart function who return the nconstraint viewport color.
     It working as a normal transform override color except if color is
-    undefined, it returns 25, 25, 125 
+    undefined, it returns 25, 25, 125. To read many constraints, use
+    colors.read_nconstraints_colors.
     '''
-    parent = cmds.listRelatives(constraint_shape, parent=True)[0]
-
-    if not cmds.getAttr(parent + '.overrideEnabled'):
-        return 25, 25, 125
-
-    if cmds.getAttr(parent + '.overrideRGBColors'):
-        return [
-            int(c * 255) for c in
-            cmds.getAttr(parent + '.overrideColorRGB')[0]]
-
-    color_index = cmds.getAttr(parent + '.overrideColor')
-    if color_index > 0:
-        return [
-            int(c * 255) for c in
-            cmds.colorIndex(color_index, query=True)]
-    else:
-        return 25, 25, 125
+    return read_nconstraints_colors([constraint_shape])[constraint_shape]
 
 
 def get_nconstraint_components(constraint_shape):
     '''
     return the nconstraint components list as list of strings.
     '''
-    components = list(set([
+    components = set([
         get_component_transform(component) for component in
-        cmds.listConnections(constraint_shape, type='nComponent')]))
-    return [c for c in components if c]
+        cmds.listConnections(constraint_shape, type='nComponent') or []])
+    # sorted to keep the nice names stable
+    return sorted(c for c in components if c)
+
+
+def get_nconstraint_ncomponents(constraint_shape):
+    '''
+    return the nComponent nodes connected to the constraint
+    '''
+    ncomponents = cmds.listConnections(
+        constraint_shape, type='nComponent') or []
+    return sorted(set(ncomponents))
+
+
+def get_nconstraint_memberships(constraint_shape):
+    '''
+    return the constraint members as a sorted tuple of canonical tuples:
+    (component transform, component type, indices). The indices are a sorted
+    tuple of the component indices, or 'borders' or 'all' when the nComponent
+    doesn't use an indices list.
+    '''
+    indices = {}
+    elements = {}
+    for ncomponent in get_nconstraint_ncomponents(constraint_shape):
+        transform = get_component_transform(ncomponent)
+        if not transform:
+            continue
+        key = transform, cmds.getAttr(ncomponent + '.componentType')
+        element = NCOMPONENT_ELEMENTS[cmds.getAttr(ncomponent + '.elements')]
+        elements.setdefault(key, set()).add(element)
+        if element == 'indices':
+            indices.setdefault(key, set()).update(
+                cmds.getAttr(ncomponent + '.componentIndices') or [])
+
+    memberships = []
+    for key, key_elements in elements.items():
+        if 'all' in key_elements:
+            memberships.append(key + ('all',))
+        elif 'borders' in key_elements:
+            memberships.append(key + ('borders',))
+        else:
+            memberships.append(key + (tuple(sorted(indices[key])),))
+    return tuple(sorted(memberships))
+
+
+def get_nconstraint_nucleus(constraint_shape):
+    '''
+    return the nucleus solving the constraint, None if it isn't connected
+    '''
+    nucleus = cmds.listConnections(
+        constraint_shape + '.evalStart', type='nucleus')
+    return nucleus[0] if nucleus else None
 
 
 def get_nconstraint_nice_name(constraint_shape):
@@ -375,9 +563,17 @@ def get_nconstraint_nice_name(constraint_shape):
     this is construct a name for a constraint transform based
     on is components names
     '''
-    constraint_type = get_constraint_type(constraint_shape)
+    return format_nconstraint_nice_name(
+        get_constraint_type(constraint_shape),
+        get_nconstraint_components(constraint_shape))
+
+
+def format_nconstraint_nice_name(constraint_type, components):
+    '''
+    build the nice name from an already known type and components list. It
+    doesn't query maya.
+    '''
     type_name = DYNAMIC_CONTRAINT_TYPES[constraint_type]['short']
-    components = get_nconstraint_components(constraint_shape)
     if len(components) > 1:
         name = type_name + '_' + '_to_'.join(components)
     elif len(components) == 1:
@@ -388,6 +584,89 @@ def get_nconstraint_nice_name(constraint_shape):
     return name
 
 
+def strip_trailing_digits(name):
+    '''
+    remove digits at the end of a name: 'CTC_a_to_b_DNC12' -> 'CTC_a_to_b_DNC'
+    '''
+    return name.rstrip('0123456789')
+
+
+def is_nice_name_variant(name, nice_name):
+    '''
+    a node name is considered as well named if it is the nice name with
+    eventually digits appended by maya to avoid a name clash.
+    '''
+    return strip_trailing_digits(name) == nice_name
+
+
+def resolve_name_collisions(requests, existing_names):
+    '''
+    compute unique names in memory, for a list of (current_name, nice_name)
+    tuples. It returns the unique names in the same order.
+    @existing_names is a set of names which can't be used. The current names
+    listed in requests are released before resolution.
+    A well named node keeps its name, the other ones take the nice name or the
+    nice name suffixed by the smallest free number, as maya does. The result
+    is deterministic, it doesn't depend on the requests order.
+    '''
+    taken = set(existing_names) - set(name for name, _ in requests)
+    results = [None] * len(requests)
+    order = sorted(range(len(requests)), key=lambda i: requests[i])
+
+    for i in order:
+        name, nice_name = requests[i]
+        if is_nice_name_variant(name, nice_name) and name not in taken:
+            results[i] = name
+            taken.add(name)
+
+    counters = {}
+    for i in order:
+        if results[i] is not None:
+            continue
+        nice_name = requests[i][1]
+        name = nice_name
+        number = counters.get(nice_name, 0)
+        while name in taken:
+            number += 1
+            name = nice_name + str(number)
+        counters[nice_name] = number
+        results[i] = name
+        taken.add(name)
+    return results
+
+
+def rename_nconstraints(nconstraints):
+    '''
+    rename all the given DynamicConstraint parents with their nice names.
+    The names are computed from the nconstraints cached type and components,
+    the collisions are resolved in memory and all the renames are done in one
+    modifier. So it's one undo.
+    return the number of renamed nodes
+    '''
+    nconstraints = [dc for dc in nconstraints]
+    requests = [(dc.parent, dc.nice_name) for dc in nconstraints]
+    names = resolve_name_collisions(requests, set(cmds.ls()))
+
+    renames = [
+        (dc, name) for dc, (old_name, _), name in
+        zip(nconstraints, requests, names) if name != old_name]
+    if not renames:
+        return 0
+
+    modifier = om2.MDagModifier()
+    # rename in two steps to avoid maya solving temporary clashes between
+    # two renamed nodes by itself.
+    parents = [dc.parent_mobject for dc, _ in renames]
+    for i, parent in enumerate(parents):
+        modifier.renameNode(
+            parent, '{}{}'.format(RENAME_TEMPORARY_PREFIX, i))
+    for parent, (_, name) in zip(parents, renames):
+        modifier.renameNode(parent, name)
+    with operation([dc.nodename for dc, _ in renames], 'rename'):
+        commit(modifier)
+    return len(renames)
+
+
 def get_constraint_type(constraint_shape):
     '''
     return an index corresponding to DYNAMIC_CONTRAINT_TYPES index
@@ -395,8 +674,10 @@ def get_constraint_type(constraint_shape):
     '''
     if not cmds.attributeQuery(
             TYPE_ATTR_NAME, node=constraint_shape, exists=True):
-        add_and_set_constraint_type_attribute(
-            constraint_shape, DynamicConstraint.UNDEFINED)
+        # the constraints created with the maya tools are not tagged. The
+        # attribute is created on demand by set_type or by the presets module
+        # classification, not by a query.
+        return DynamicConstraint.UNDEFINED
 
     attribute = constraint_shape + '.' + TYPE_ATTR_NAME
     return cmds.getAttr(attribute)
@@ -406,12 +687,60 @@ def set_nconstraint_color(constraint_shape, r=0, g=0, b=0):
     '''
     this method is setting the overide color on the constraint parent
     '''
-    r, g, b = [c / 255.0 for c in (r, g, b)]
-    parent = cmds.listRelatives(constraint_shape, parent=True)[0]
+    set_nconstraints_colors({constraint_shape: (r, g, b)})
+
+
+def set_nconstraints_enabled(constraint_shapes, state):
+    '''
+    enable or disable all the given constraints in one modifier (one undo)
+    '''
+    if not constraint_shapes:
+        return
+    modifier = om2.MDGModifier()
+    selection = om2.MSelectionList()
+    for constraint_shape in constraint_shapes:
+        selection.add(constraint_shape)
+    for i in range(selection.length()):
+        fn = om2.MFnDependencyNode(selection.getDependNode(i))
+        modifier.newPlugValueBool(fn.findPlug('enable', False), bool(state))
+    with operation(constraint_shapes, 'set_enabled'):
+        commit(modifier)
+
+
+def list_exclusive_ncomponents(constraint_shapes):
+    '''
+    return the nComponents connected only to the given constraints, they are
+    useless once the constraints are deleted
+    '''
+    constraint_shapes = set(cmds.ls(constraint_shapes, long=True))
+    ncomponents = set()
+    for constraint_shape in constraint_shapes:
+        ncomponents.update(get_nconstraint_ncomponents(constraint_shape))
+    return [
+        ncomponent for ncomponent in sorted(ncomponents) if
+        constraint_shapes.issuperset(cmds.ls(cmds.listConnections(
+            ncomponent, type='dynamicConstraint', shapes=True), long=True))]
+
 
-    cmds.setAttr(parent + '.overrideEnabled', True)
-    cmds.setAttr(parent + '.overrideRGBColors', True)
-    cmds.setAttr(parent + '.overrideColorRGB', r, g, b)
+def delete_nconstraints(constraint_shapes):
+    '''
+    delete the constraints with their transform and the nComponents only used
+    by them, in one modifier (one undo)
+    '''
+    if not constraint_shapes:
+        return
+    constraint_shapes = set(cmds.ls(constraint_shapes, long=True))
+    ncomponents = list_exclusive_ncomponents(constraint_shapes)
+
+    modifier = om2.MDagModifier()
+    selection = om2.MSelectionList()
+    for node in ncomponents + cmds.listRelatives(
+            list(constraint_shapes), parent=True, fullPath=True):
+        selection.add(node)
+    for i in range(selection.length()):
+        modifier.deleteNode(selection.getDependNode(i))
+    with operation([], 'delete'):
+        commit(modifier)
 
 
 def list_nconstraints(types=None, components=None):
@@ -6,27 +6,73 @@ paint components, etc ...
 
 import os
 import sys
+from bisect import bisect
+from functools import partial
 
+import numpy as np
 from PySide2 import QtWidgets, QtCore, QtGui
 from maya import cmds
 import maya.OpenMaya as om
-
+import maya.OpenMayaAnim as oma
+
+from nconstraintoutliner.colors import (
+    COLOR_RULES, color_by_rule, read_nconstraints_colors,
+    set_nconstraints_colors)
+from nconstraintoutliner.creation import (
+    create_nconstraints, pair_nearest_vertices)
+from nconstraintoutliner.diff import (
+    FingerprintsExtraction, diff_fingerprints, extract_fingerprints,
+    save_fingerprints, save_report)
+from nconstraintoutliner.duplicates import find_redundant_nconstraints
+from nconstraintoutliner.history import get_redone_nodes, get_undone_nodes
+from nconstraintoutliner.index import (
+    NO_NUCLEUS, NO_REFERENCE, SceneIndex, get_namespace)
+from nconstraintoutliner.islands import (
+    ConstraintGraph, find_splittable_nucleus)
 from nconstraintoutliner.nconstraint import (
-    DYNAMIC_CONTRAINT_TYPES, list_nconstraints,
-    DynamicConstraint, list_nconstraints_components)
-
-
-FULL_UPDATE_REQUIRED_EVENTS = (
-    om.MSceneMessage.kAfterNew,
-    om.MSceneMessage.kAfterImport,
-    om.MSceneMessage.kAfterOpen,
-    om.MSceneMessage.kAfterRemoveReference,
-    om.MSceneMessage.kAfterUnloadReference,
-    om.MSceneMessage.kAfterCreateReference)
+    DYNAMIC_CONTRAINT_TYPES, DynamicConstraint, rename_nconstraints,
+    delete_nconstraints, is_nice_name_variant, set_nconstraints_enabled)
+from nconstraintoutliner.playback import PlaybackGuard, suspendable
+from nconstraintoutliner.pipeline import (
+    RefreshWorker, extract_facts, index_facts, unindex_facts)
+from nconstraintoutliner.presets import (
+    classify_untagged_nconstraints, get_drift_attributes,
+    list_drifted_attributes)
+from nconstraintoutliner.profiler import (
+    NucleusEvaluator, profile_nconstraints)
+from nconstraintoutliner.search import TrigramIndex
+from nconstraintoutliner.selection import (
+    ADD, REPLACE, TOGGLE, select_memberships, select_nodes)
+from nconstraintoutliner.service import get_nconstraint_index
+from nconstraintoutliner.snapshots import (
+    capture_snapshot, get_snapshot, list_snapshots, load_snapshot,
+    restore_snapshot, save_snapshot, store_snapshot)
+from nconstraintoutliner.sweeper import (
+    clean_sweep, format_sweep_report, sweep_scene)
+from nconstraintoutliner.timeline import (
+    CurvesCache, compute_activities, evaluate_nconstraints,
+    get_active_ranges)
+
+
+DRIFT_COLOR = 120, 80, 20
+DIFF_ADDED_COLOR = 40, 110, 40
+DIFF_CHANGED_COLOR = 40, 80, 130
+MAXIMUM_ISLANDS_IN_MENU = 30
+TIMELINE_COLOR = 90, 160, 90
 ICONPATH = os.path.join(
     os.path.dirname(os.path.realpath(__file__)), 'icons')
 
 
+def get_selection_mode():
+    ''' shift adds to the maya selection and ctrl toggles, like in maya '''
+    modifiers = QtWidgets.QApplication.keyboardModifiers()
+    if modifiers & QtCore.Qt.ShiftModifier:
+        return ADD
+    if modifiers & QtCore.Qt.ControlModifier:
+        return TOGGLE
+    return REPLACE
+
+
 class NConstraintOutliner(QtWidgets.QWidget):
     BUTTON_SIZE = QtCore.QSize(24, 24)
     ICON_SIZE = QtCore.QSize(24, 24)
@@ -35,21 +81,76 @@ class NConstraintOutliner(QtWidgets.QWidget):
         super(NConstraintOutliner, self).__init__(parent, QtCore.Qt.Tool)
         self.setWindowTitle('Dynamic Constraint Outliner')
         self._callbacks = []
+        self._index = get_nconstraint_index()
+        self._index_token = None
+        self._drift_callbacks = {}  # {node: callback id}
+        self._drift_attributes = set(get_drift_attributes())
+        self.playback_guard = PlaybackGuard(self)
+        self.playback_guard.suspended_changed.connect(self._playback_suspended)
+        self.playback_guard.resumed.connect(self._playback_resumed)
 
         self._table_view = DynamicConstraintTableView()
+        self._table_view.playback_guard = self.playback_guard
         self._table_model = DynamicConstraintTableModel()
         self._table_view.set_model(self._table_model)
+        self._table_view.setColumnHidden(
+            DynamicConstraintTableModel.COST_COLUMN, True)
+        self._table_view.setItemDelegateForColumn(
+            DynamicConstraintTableModel.TIMELINE_COLUMN,
+            TimelineDelegate(self._table_view))
+        self._table_view.setColumnHidden(
+            DynamicConstraintTableModel.TIMELINE_COLUMN, True)
+        self._curves_cache = CurvesCache()
         self._item_delegate = DynamicConstraintDelegate(self._table_view)
         self._item_delegate.switched.connect(self.switch_selected_constraints)
+        self._item_delegate.members_selection_requested.connect(
+            self.select_members)
         self._table_view.set_item_delegate(self._item_delegate)
 
+        self._scene_index = SceneIndex()
+        self._tree_model = None
+        self._tree_view = DynamicConstraintTreeView()
+        self._tree_view.hide()
+
+        self._nconstraints = []
+        self._partitions = {}
+        self._filtered_nconstraints = []
+        self._search_index = TrigramIndex()
+        self._refresh_worker = RefreshWorker(self)
+        self._refresh_worker.finished.connect(self._apply_refresh_result)
+        self._extraction = None
+        self._extraction_after = None
+        self._extraction_timer = QtCore.QTimer(self)
+        self._extraction_timer.setInterval(250)
+        self._extraction_timer.timeout.connect(self._check_extraction)
+        self._component_counts = {}
+        self._indexed_facts = {}
+        self._graph = ConstraintGraph()
+        self._island_node = None
+
+        self._search_field = QtWidgets.QLineEdit()
+        self._search_field.setPlaceholderText('search')
+        self._search_field.setFixedWidth(200)
+        self._search_field.textChanged.connect(self.apply_search)
+
         self._filter_component_label = QtWidgets.QLabel('filter by component:')
-        self._filter_component_combobox = QtWidgets.QComboBox()
-        self._filter_component_combobox.setFixedWidth(250)
-        method = self.update_nconstraints_components
-        self._filter_component_combobox.currentIndexChanged.connect(method)
-        method = self.update_nconstraints
-        self._filter_component_combobox.currentIndexChanged.connect(method)
+        self._components_model = QtCore.QStringListModel()
+        self._filter_component_completer = QtWidgets.QCompleter(
+            self._components_model)
+        self._filter_component_completer.setCaseSensitivity(
+            QtCore.Qt.CaseInsensitive)
+        self._filter_component_completer.setFilterMode(
+            QtCore.Qt.MatchContains)
+        self._filter_component_field = QtWidgets.QLineEdit()
+        self._filter_component_field.setPlaceholderText('all')
+        self._filter_component_field.setFixedWidth(250)
+        self._filter_component_field.setCompleter(
+            self._filter_component_completer)
+        self._filter_component_field.editingFinished.connect(
+            self._component_filter_changed)
+        self._filter_component_completer.activated.connect(
+            self._component_filter_changed)
+        self._component_filter = ''
 
         self._select_constraints_button = QtWidgets.QPushButton()
         tooltip = 'select Dynamic Constraints'
@@ -75,7 +176,7 @@ class NConstraintOutliner(QtWidgets.QWidget):
             self._create_constraint_button.showMenu)
 
         self._filter_constraint_type_menu = FilterDynamicConstraintMenu()
-        method = self.update_nconstraints
+        method = self.apply_filters
         self._filter_constraint_type_menu.stateChanged.connect(method)
         self._filter_constraint_type_button = QtWidgets.QPushButton()
         tooltip = 'filter Dynamic Constraints by types'
@@ -90,95 +191,935 @@ class NConstraintOutliner(QtWidgets.QWidget):
         self._filter_constraint_type_button.released.connect(
             self._filter_constraint_type_button.showMenu)
 
+        self._rename_menu = QtWidgets.QMenu()
+        action = self._rename_menu.addAction('rename selected')
+        action.triggered.connect(self.rename_selected_constraints)
+        action = self._rename_menu.addAction('rename all')
+        action.triggered.connect(self.rename_all_constraints)
+        self._rename_button = QtWidgets.QPushButton()
+        self._rename_button.setToolTip('give nice names')
+        icon = QtGui.QIcon(os.path.join(ICONPATH, 'rename.png'))
+        self._rename_button.setIcon(icon)
+        self._rename_button.setIconSize(self.ICON_SIZE)
+        self._rename_button.setFixedSize(self.BUTTON_SIZE)
+        self._rename_button.setContentsMargins(0, 0, 0, 0)
+        self._rename_button.setMenu(self._rename_menu)
+        self._rename_button.released.connect(self._rename_button.showMenu)
+
+        self._tools_menu = QtWidgets.QMenu()
+        action = self._tools_menu.addAction('classify untagged constraints')
+        action.triggered.connect(self.classify_untagged_constraints)
+        action = self._tools_menu.addAction(
+            'constraint nearest vertices of two selected meshes')
+        action.triggered.connect(self.create_nearest_vertices_constraints)
+        self._tools_menu.addSeparator()
+        self._highlight_drift_action = self._tools_menu.addAction(
+            'highlight preset drift')
+        self._highlight_drift_action.setCheckable(True)
+        self._highlight_drift_action.toggled.connect(self.apply_filters)
+        self._drifted_only_action = self._tools_menu.addAction(
+            'show drifted constraints only')
+        self._drifted_only_action.setCheckable(True)
+        self._drifted_only_action.toggled.connect(self.apply_filters)
+        self._tools_menu.addSeparator()
+        self._tree_mode_action = self._tools_menu.addAction(
+            'group by nucleus')
+        self._tree_mode_action.setCheckable(True)
+        self._tree_mode_action.toggled.connect(self.set_tree_mode)
+        self._namespaces_menu = self._tools_menu.addMenu('visible namespaces')
+        self._namespaces_menu.aboutToShow.connect(self._fill_namespaces_menu)
+        self._tools_menu.addSeparator()
+        self._redundant_only_action = self._tools_menu.addAction(
+            'show redundant constraints only')
+        self._redundant_only_action.setCheckable(True)
+        self._redundant_only_action.toggled.connect(self.apply_filters)
+        action = self._tools_menu.addAction('disable redundant constraints')
+        action.triggered.connect(self.disable_redundant_constraints)
+        action = self._tools_menu.addAction('delete redundant constraints')
+        action.triggered.connect(self.delete_redundant_constraints)
+        action = self._tools_menu.addAction('sweep broken constraints')
+        action.triggered.connect(self.sweep_broken_constraints)
+        self._tools_menu.addSeparator()
+        action = self._tools_menu.addAction('suspend during playback')
+        action.setCheckable(True)
+        action.setChecked(True)
+        action.toggled.connect(self._set_playback_guard_enabled)
+        action = self._tools_menu.addAction('show playback statistics')
+        action.triggered.connect(self.show_playback_statistics)
+        self._tools_menu.addSeparator()
+        action = self._tools_menu.addAction('profile solve cost')
+        action.triggered.connect(self.profile_constraints_cost)
+        action = self._tools_menu.addAction('clear solve cost')
+        action.triggered.connect(lambda: self.set_costs({}))
+        self._timeline_action = self._tools_menu.addAction(
+            'show enable timeline')
+        self._timeline_action.setCheckable(True)
+        self._timeline_action.toggled.connect(self.set_timeline_visible)
+        self._snapshots_menu = self._tools_menu.addMenu('snapshots')
+        self._islands_menu = self._tools_menu.addMenu('islands')
+        self._islands_menu.aboutToShow.connect(self._fill_islands_menu)
+        self._diff_menu = self._tools_menu.addMenu('scene diff')
+        action = self._diff_menu.addAction('compare with scene version')
+        action.triggered.connect(self.compare_with_scene)
+        action = self._diff_menu.addAction('save fingerprints')
+        action.triggered.connect(self.save_fingerprints_file)
+        action = self._diff_menu.addAction('save last diff report')
+        action.triggered.connect(self.save_diff_report)
+        action = self._diff_menu.addAction('clear scene diff')
+        action.triggered.connect(lambda: self.set_diff_report(None))
+        self._colors_menu = self._tools_menu.addMenu('color by')
+        for rule in COLOR_RULES:
+            action = self._colors_menu.addAction(rule)
+            action.triggered.connect(partial(self.color_constraints, rule))
+        self._snapshots_menu.aboutToShow.connect(self._fill_snapshots_menu)
+        self._tools_button = QtWidgets.QPushButton()
+        self._tools_button.setToolTip('scene tools')
+        icon = QtGui.QIcon(os.path.join(ICONPATH, 'components.png'))
+        self._tools_button.setIcon(icon)
+        self._tools_button.setIconSize(self.ICON_SIZE)
+        self._tools_button.setFixedSize(self.BUTTON_SIZE)
+        self._tools_button.setContentsMargins(0, 0, 0, 0)
+        self._tools_button.setMenu(self._tools_menu)
+        self._tools_button.released.connect(self._tools_button.showMenu)
+
         self._refresh = QtWidgets.QPushButton()
         icon = QtGui.QIcon(os.path.join(ICONPATH, 'refresh.png'))
         self._refresh.setIcon(icon)
         self._refresh.setIconSize(self.ICON_SIZE)
         self._refresh.setFixedSize(self.BUTTON_SIZE)
-        self._refresh.clicked.connect(self.update_nconstraints_components)
-        self._refresh.clicked.connect(self.update_nconstraints)
+        self._refresh.setToolTip('rescan the scene')
+        self._refresh.clicked.connect(self._index.rebuild)
 
         self._buttons_layout = QtWidgets.QHBoxLayout()
         self._buttons_layout.setSpacing(4)
+        self._buttons_layout.addWidget(self._search_field)
         self._buttons_layout.addStretch()
         self._buttons_layout.addWidget(self._filter_component_label)
-        self._buttons_layout.addWidget(self._filter_component_combobox)
+        self._buttons_layout.addWidget(self._filter_component_field)
         self._buttons_layout.addWidget(self._select_constraints_button)
         self._buttons_layout.addWidget(self._create_constraint_button)
         self._buttons_layout.addWidget(self._filter_constraint_type_button)
+        self._buttons_layout.addWidget(self._rename_button)
+        self._buttons_layout.addWidget(self._tools_button)
         self._buttons_layout.addWidget(self._refresh)
 
         self._layout = QtWidgets.QVBoxLayout(self)
         self._layout.addLayout(self._buttons_layout)
         self._layout.addWidget(self._table_view)
+        self._layout.addWidget(self._tree_view)
 
-        self.update_nconstraints()
+    def update_nconstraints(self, *unused_callbacks_args):
+        '''
+        read the constraints from the shared index, rebuild the search index
+        and apply the filters. The scene is scanned by the index, see
+        service.NConstraintIndex. The search index and the names are
+        computed on a worker thread, see _apply_refresh_result.
+        '''
+        self._partitions = {}
+        # the hidden namespaces are already skipped by the index
+        for nconstraint in self._index.list_nconstraints():
+            reference = self._index.get_reference(nconstraint)
+            self._partitions.setdefault(reference, []).append(nconstraint)
+        self._nconstraints = [
+            dc for partition in self._partitions.values() for dc in partition]
+        self._cache_colors(self._nconstraints)
+
+        self._refresh_worker.submit(extract_facts(self._nconstraints))
+        if self._tree_model is not None:
+            self._scene_index.build(self._nconstraints)
+            self._tree_model.reset()
+
+    def _apply_refresh_result(self, result):
+        nconstraints = {dc.nodename: dc for dc in self._nconstraints}
+        for facts in result.facts:
+            nconstraint = nconstraints.get(facts.node)
+            # the type can be changed while the worker is running
+            if nconstraint is not None and nconstraint.type == facts.type:
+                nconstraint.set_cached_values(
+                    nice_name=result.nice_names[facts.node])
+        # the sorted order of the worker, the nodes created while it was
+        # running come last
+        order = {facts.node: i for i, facts in enumerate(result.facts)}
+        self._nconstraints.sort(
+            key=lambda dc: order.get(dc.nodename, len(order)))
+        self._table_model.set_parents({
+            facts.node: facts.parent for facts in result.facts
+            if facts.node in nconstraints})
+        self._search_index = result.search_index
+        self._component_counts = result.component_counts
+        self._indexed_facts = {facts.node: facts for facts in result.facts}
+        self._graph.build(
+            (facts.node, facts.components) for facts in result.facts
+            if facts.node in nconstraints)
+        # nodes created or deleted while the worker was running
+        for facts in result.facts:
+            if facts.node not in nconstraints:
+                self._unindex_nconstraint(facts.node)
+        for node, nconstraint in nconstraints.items():
+            if node not in self._search_index:
+                self._index_nconstraint(nconstraint)
         self.update_nconstraints_components()
+        self.apply_filters()
 
-    def update_nconstraints(self, *unused_callbacks_args):
-        types = self._filter_constraint_type_menu.filters
-        component = self._filter_component_combobox.currentText()
-        components = [component] if component else None
+    def _add_nconstraints(self, nconstraints, reference=NO_REFERENCE):
+        '''
+        index a partition of constraints, the ones already indexed are
+        skipped
+        '''
+        nconstraints = [
+            dc for dc in nconstraints if dc.nodename not in self._search_index]
+        if not nconstraints:
+            return
+        self._partitions.setdefault(reference, []).extend(nconstraints)
+        self._nconstraints.extend(nconstraints)
+        for nconstraint in nconstraints:
+            self._index_nconstraint(nconstraint)
+            if self._tree_model is not None:
+                self._tree_model.insert_node(
+                    nconstraint.nodename, nconstraint)
+        self.update_nconstraints_components()
+        self.apply_filters()
+
+    def _drop_nconstraints(self, nconstraints):
+        '''
+        remove a partition of constraints from the indexes. It must be
+        called while the nodes still exist.
+        '''
+        dropped = set(nconstraints)
+        if not dropped:
+            return
+        for reference, partition in list(self._partitions.items()):
+            partition[:] = [dc for dc in partition if dc not in dropped]
+            if not partition:
+                del self._partitions[reference]
+        self._nconstraints = [
+            dc for dc in self._nconstraints if dc not in dropped]
+        for nconstraint in dropped:
+            self._unindex_nconstraint(nconstraint.nodename)
+            if self._tree_model is not None:
+                self._tree_model.remove_node(nconstraint.nodename)
+        self.update_nconstraints_components()
+        self.apply_filters()
+
+    def set_namespace_visible(self, namespace, state):
+        '''
+        show or hide the constraints of a namespace and of its nested
+        namespaces. The hidden constraints are skipped by the shared index,
+        they are not queried at all. The index publishes the change by
+        partition, see _index_changed.
+        '''
+        self._index.set_namespace_hidden(namespace, not state)
+
+    def _fill_namespaces_menu(self):
+        self._namespaces_menu.clear()
+        hidden_namespaces = self._index.hidden_namespaces
+        namespaces = set(
+            get_namespace(dc.nodename) for dc in
+            self._index.list_nconstraints())
+        for namespace in sorted(namespaces | hidden_namespaces):
+            action = self._namespaces_menu.addAction(namespace)
+            action.setCheckable(True)
+            action.setChecked(namespace not in hidden_namespaces)
+            action.toggled.connect(
+                partial(self.set_namespace_visible, namespace))
 
-        self._table_model.set_nconstraints(
-            list_nconstraints(types=types, components=components))
+    def apply_filters(self, *unused_signal_args):
+        types = self._filter_constraint_type_menu.filters
+        component = self._component_filter
+        nconstraints = [
+            dc for dc in self._nconstraints if dc.type in types and
+            (not component or component in dc.components)]
+
+        highlight_drift = self._highlight_drift_action.isChecked()
+        drifted_only = self._drifted_only_action.isChecked()
+        drifts = {}
+        if highlight_drift or drifted_only:
+            drifts = list_drifted_attributes(
+                [dc.nodename for dc in nconstraints],
+                [dc.type for dc in nconstraints])
+        if drifted_only:
+            nconstraints = [dc for dc in nconstraints if dc.nodename in drifts]
+        if self._island_node is not None:
+            if self._island_node in self._graph:
+                island = set(self._graph.get_island(self._island_node).nodes)
+                nconstraints = [
+                    dc for dc in nconstraints if dc.nodename in island]
+            else:  # the island was deleted
+                self._island_node = None
+        if self._redundant_only_action.isChecked():
+            redundant = set(
+                find_redundant_nconstraints(nconstraints).redundant)
+            nconstraints = [
+                dc for dc in nconstraints if dc.nodename in redundant]
+
+        self._filtered_nconstraints = nconstraints
+        self._table_model.highlight_drift = highlight_drift
+        self._table_model.drifted_only = drifted_only
+        self._table_model.set_drifts(drifts)
+        self._update_drift_callbacks()
+        self.apply_search()
+
+    def apply_search(self, *unused_signal_args):
+        '''
+        filter the rows with the search field text. It's only using the
+        search index, there's no maya query.
+        '''
+        text = self._search_field.text()
+        nconstraints = self._filtered_nconstraints
+        if text:
+            keys = self._search_index.search(text)
+            if not keys:
+                keys = self._search_index.search(text, fuzzy=True)
+            nconstraints = [dc for dc in nconstraints if dc.nodename in keys]
+        self._table_model.set_nconstraints(nconstraints)
+
+    def _component_filter_changed(self):
+        component = self._filter_component_field.text()
+        if component == self._component_filter:
+            return
+        self._component_filter = component
+        self.apply_filters()
+
+    def _index_nconstraint(self, nconstraint):
+        '''
+        add the constraint to the search index and its components to the
+        component filter completer
+        '''
+        facts = extract_facts([nconstraint])[0]
+        index_facts(facts, self._search_index, self._component_counts)
+        self._indexed_facts[facts.node] = facts
+        self._graph.add(facts.node, facts.components)
+        if self._drift_callbacks_required:
+            self._add_drift_callback(facts.node)
+
+    def _unindex_nconstraint(self, node):
+        '''
+        remove a node with the values it was indexed with, the shared
+        DynamicConstraint can be already invalidated
+        '''
+        self._remove_drift_callback(node)
+        facts = self._indexed_facts.pop(node, None)
+        if facts is None:
+            return
+        unindex_facts(facts, self._search_index, self._component_counts)
+        self._graph.remove(node)
+        self._table_model.forget_parents([node])
+
+    def set_tree_mode(self, state):
+        if state and self._tree_model is None:
+            self._scene_index.build(self._nconstraints)
+            self._tree_model = DynamicConstraintTreeModel(self._scene_index)
+            self._tree_view.setModel(self._tree_model)
+        elif not state:
+            self._tree_model = None
+            self._tree_view.setModel(None)
+            self._scene_index.clear()
+        self._tree_view.setVisible(state)
+        self._table_view.setVisible(not state)
 
     def update_nconstraints_components(self):
-        components = ['All'] + list_nconstraints_components()
-        current_component = self._filter_component_combobox.currentText()
-
-        self._filter_component_combobox.blockSignals(True)
-        self._filter_component_combobox.clear()
-        self._filter_component_combobox.addItems(components)
-
-        for index in range(self._filter_component_combobox.count()):
-            component = self._filter_component_combobox.itemText(index)
-            if component == current_component:
-                self._filter_component_combobox.setCurrentIndex(index)
-                break
-        self._filter_component_combobox.blockSignals(False)
+        '''
+        synchronize the component completer with the indexed components. The
+        rows are inserted and removed one by one, the model is never reset.
+        '''
+        components = sorted(self._component_counts)
+        current = self._components_model.stringList()
+        if current == components:
+            return
+        for row in reversed(range(len(current))):
+            if current[row] not in self._component_counts:
+                self._components_model.removeRows(row, 1)
+                current.pop(row)
+        for component in components:
+            if component in current:
+                continue
+            row = bisect(current, component)
+            self._components_model.insertRows(row, 1)
+            index = self._components_model.index(row)
+            self._components_model.setData(index, component)
+            current.insert(row, component)
 
     def select_constraints(self):
         nconstraints = self._table_view.selected_constraints
         if not nconstraints:
             return
-        nodes = [dc.parent for dc in nconstraints]
-        cmds.select(nodes)
+        nodes = [dc.fullpathname for dc in nconstraints]
+        select_nodes(nodes, get_selection_mode(), parents=True)
+
+    def select_members(self, nconstraint):
+        '''
+        select the members of the constraint, or of all the selected rows if
+        the constraint is one of them. It's one selection change.
+        '''
+        nconstraints = self._table_view.selected_constraints or []
+        if nconstraint not in nconstraints:
+            nconstraints = [nconstraint]
+        memberships = [m for dc in nconstraints for m in dc.memberships]
+        select_memberships(memberships, get_selection_mode())
+
+    def rename_selected_constraints(self):
+        nconstraints = self._table_view.selected_constraints
+        if not nconstraints:
+            return
+        rename_nconstraints(nconstraints)
+        self._table_model.layoutChanged.emit()
+
+    def rename_all_constraints(self):
+        rename_nconstraints(self._table_model.nconstraints)
+        self._table_model.layoutChanged.emit()
+
+    def classify_untagged_constraints(self):
+        results = classify_untagged_nconstraints()
+        cmds.inViewMessage(
+            assistMessage='{} constraints classified'.format(len(results)),
+            position='topCenter', fade=True)
+        # the shared constraints cached their previous type
+        self.refresh_nconstraints(sorted(results))
+        self.update_nconstraints()
+
+    def create_nearest_vertices_constraints(self):
+        meshes = cmds.ls(selection=True, transforms=True)
+        if len(meshes) != 2:
+            return cmds.warning('Select two nCloth meshes')
+        max_distance, result = QtWidgets.QInputDialog.getDouble(
+            self, 'Nearest vertices', 'maximum distance:', 0.1, 0, 1000, 3)
+        if not result:
+            return
+        specs = pair_nearest_vertices(
+            meshes[0], meshes[1], max_distance=max_distance)
+        create_nconstraints(specs)
+
+    def profile_constraints_cost(self):
+        '''
+        measure the solve cost of the selected rows, or of all the rows,
+        from the nucleus start frame and display it in the cost column
+        '''
+        nconstraints = (
+            self._table_view.selected_constraints or
+            self._table_model.nconstraints)
+        if not nconstraints:
+            return
+        # the solve starts at the nucleus start frame
+        evaluator = NucleusEvaluator()
+        frames, result = QtWidgets.QInputDialog.getInt(
+            self, 'Profile solve cost', 'frames evaluated:',
+            min(evaluator.end_frame - evaluator.start_frame + 1, 24), 1,
+            100000)
+        if not result:
+            return
+        evaluator.end_frame = evaluator.start_frame + frames - 1
+        nodes = [dc.nodename for dc in nconstraints]
+        costs = profile_nconstraints(nodes, evaluator)
+        driven = [node for node in nodes if node not in costs]
+        if driven:
+            cmds.warning(
+                '{} constraints not profiled, their enable is keyed or '
+                'driven: {}'.format(len(driven), ', '.join(driven)))
+        self.set_costs(costs)
+
+    def set_costs(self, costs):
+        self._table_model.set_costs(costs)
+        self._table_view.setColumnHidden(
+            DynamicConstraintTableModel.COST_COLUMN, not costs)
+        if costs:
+            self._table_view.sortByColumn(
+                DynamicConstraintTableModel.COST_COLUMN,
+                QtCore.Qt.DescendingOrder)
+
+    def set_timeline_visible(self, state):
+        self._table_view.setColumnHidden(
+            DynamicConstraintTableModel.TIMELINE_COLUMN, not state)
+        if state:
+            self.update_timeline()
+        else:
+            self._table_model.set_activities({})
+
+    def update_timeline(self, nodes=None):
+        '''
+        evaluate the activity of the constraints on the playback range. The
+        anim curves are evaluated in bulk and cached until they are edited.
+        '''
+        start = cmds.playbackOptions(query=True, minTime=True)
+        end = cmds.playbackOptions(query=True, maxTime=True)
+        frames = np.arange(start, end + 1)
+        if nodes is None:
+            self._table_model.activities = {}
+            nodes = [dc.nodename for dc in self._nconstraints]
+        values = evaluate_nconstraints(nodes, frames, self._curves_cache)
+        activities = dict(self._table_model.activities)
+        activities.update(compute_activities(values))
+        self._table_model.set_activities(activities)
+
+    def compare_with_scene(self):
+        '''
+        highlight the constraints added or changed since another version of
+        the scene. The other version is opened by a headless mayapy, or read
+        from a fingerprints file. The open scene is extracted while mayapy
+        runs, then the process is polled, maya stays usable meanwhile.
+        '''
+        if self._extraction is not None:
+            return cmds.warning('A scene comparison is already running')
+        filepath, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, 'Compare with scene version', '',
+            'Maya scene or fingerprints (*.ma *.mb *.json)')
+        if not filepath:
+            return
+        self._extraction = FingerprintsExtraction([filepath])
+        self._extraction_after = extract_fingerprints()
+        om.MGlobal.displayInfo('extracting ' + filepath)
+        self._extraction_timer.start()
+        self._check_extraction()
+
+    def _check_extraction(self):
+        if self._extraction is None or not self._extraction.poll():
+            return
+        self._extraction_timer.stop()
+        extraction, self._extraction = self._extraction, None
+        try:
+            before = extraction.wait()[0]
+        except RuntimeError as exception:
+            return cmds.warning(str(exception))
+        report = diff_fingerprints(before, self._extraction_after)
+        om.MGlobal.displayInfo(
+            '{} constraints added, {} removed, {} changed since {}'.format(
+                len(report.added), len(report.removed), len(report.changed),
+                os.path.basename(extraction.scenes[0])))
+        for node in report.removed:
+            om.MGlobal.displayInfo('removed: ' + node)
+        self.set_diff_report(report)
+
+    def cancel_scene_comparison(self):
+        self._extraction_timer.stop()
+        if self._extraction is not None:
+            self._extraction.kill()
+            self._extraction = None
+
+    def set_diff_report(self, report):
+        self._table_model.set_diff_report(report)
+
+    def save_fingerprints_file(self):
+        filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Save fingerprints', '', 'Fingerprints (*.json)')
+        if filepath:
+            save_fingerprints(extract_fingerprints(), filepath)
+
+    def save_diff_report(self):
+        report = self._table_model.diff_report
+        if report is None:
+            return cmds.warning('Compare with a scene version first')
+        filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Save diff report', '', 'Diff report (*.json)')
+        if filepath:
+            save_report(report, filepath)
+
+    def _fill_islands_menu(self):
+        self._islands_menu.clear()
+        action = self._islands_menu.addAction('report splittable nucleus')
+        action.triggered.connect(self.report_islands)
+        self._islands_menu.addSeparator()
+        action = self._islands_menu.addAction('show all islands')
+        action.setCheckable(True)
+        action.setChecked(self._island_node is None)
+        action.triggered.connect(partial(self.set_island_filter, None))
+        current = None
+        if self._island_node in self._graph:
+            current = self._graph.get_island(self._island_node)
+        islands = self._graph.list_islands()
+        for island in islands[:MAXIMUM_ISLANDS_IN_MENU]:
+            names = ', '.join(island.components[:3]) or island.nodes[0]
+            if len(island.components) > 3:
+                names += ', ...'
+            action = self._islands_menu.addAction(
+                '{} ({} constraints)'.format(names, len(island.nodes)))
+            action.setCheckable(True)
+            action.setChecked(island == current)
+            action.triggered.connect(
+                partial(self.set_island_filter, island.nodes[0]))
+        if len(islands) > MAXIMUM_ISLANDS_IN_MENU:
+            self._islands_menu.addAction(
+                '{} more islands'.format(
+                    len(islands) - MAXIMUM_ISLANDS_IN_MENU)).setEnabled(False)
+
+    def set_island_filter(self, node, *unused_signal_args):
+        '''
+        show only the constraints coupled with the given one. It follows the
+        island when constraints are added or removed. None shows all.
+        '''
+        self._island_node = node
+        self.apply_filters()
+
+    def report_islands(self):
+        '''
+        print the nucleus solving several independent islands, they could
+        be split on separate nucleus
+        '''
+        nucleus_by_node = {
+            dc.nodename: dc.nucleus or NO_NUCLEUS
+            for dc in self._nconstraints}
+        islands = self._graph.list_islands()
+        splittable = find_splittable_nucleus(islands, nucleus_by_node)
+        om.MGlobal.displayInfo(
+            '{} islands, {} nucleus could be split'.format(
+                len(islands), len(splittable)))
+        for nucleus, nucleus_islands in sorted(splittable.items()):
+            for island in nucleus_islands:
+                om.MGlobal.displayInfo('{}: {} ({} constraints)'.format(
+                    nucleus or 'no nucleus', ', '.join(island.components),
+                    len(island.nodes)))
+
+    def _cache_colors(self, nconstraints):
+        ''' read the missing swatch colors in bulk instead of by paint '''
+        nconstraints = [dc for dc in nconstraints if dc.cached_color is None]
+        colors = read_nconstraints_colors([dc.nodename for dc in nconstraints])
+        for nconstraint in nconstraints:
+            nconstraint.set_cached_values(color=colors[nconstraint.nodename])
+
+    def color_constraints(self, rule):
+        '''
+        color the selected rows, or all the rows, with a rule. See
+        colors.color_by_rule.
+        '''
+        nconstraints = (
+            self._table_view.selected_constraints or
+            self._table_model.nconstraints)
+        costs = self._table_model.costs
+        if rule == 'cost' and not costs:
+            return cmds.warning('Profile the solve cost first')
+        colors = color_by_rule(nconstraints, rule, costs=costs)
+        set_nconstraints_colors(colors)
+        for nconstraint in nconstraints:
+            if nconstraint.nodename in colors:
+                nconstraint.set_cached_values(
+                    color=colors[nconstraint.nodename])
+        self._table_model.update_colors()
+
+    def _fill_snapshots_menu(self):
+        self._snapshots_menu.clear()
+        action = self._snapshots_menu.addAction('capture snapshot')
+        action.triggered.connect(self.capture_snapshot)
+        action = self._snapshots_menu.addAction('load snapshot file')
+        action.triggered.connect(self.load_snapshot_file)
+        names = list_snapshots()
+        if not names:
+            return
+        self._snapshots_menu.addSeparator()
+        for name in names:
+            action = self._snapshots_menu.addAction('restore ' + name)
+            action.triggered.connect(partial(self.restore_snapshot, name))
+        self._snapshots_menu.addSeparator()
+        for name in names:
+            action = self._snapshots_menu.addAction('save {} as'.format(name))
+            action.triggered.connect(partial(self.save_snapshot_file, name))
+
+    def capture_snapshot(self):
+        '''
+        capture the selected rows, or all the rows, in a named snapshot
+        '''
+        nconstraints = (
+            self._table_view.selected_constraints or
+            self._table_model.nconstraints)
+        if not nconstraints:
+            return
+        default = 'snapshot{}'.format(len(list_snapshots()) + 1)
+        name, result = QtWidgets.QInputDialog.getText(
+            self, 'Capture snapshot', 'name:', text=default)
+        if not result or not name:
+            return
+        nodes = [dc.nodename for dc in nconstraints]
+        store_snapshot(name, capture_snapshot(nodes))
+
+    def restore_snapshot(self, name):
+        nodes = restore_snapshot(get_snapshot(name))
+        om.MGlobal.displayInfo(
+            'snapshot {}: {} constraints changed'.format(name, len(nodes)))
+        self.refresh_nconstraints(nodes)
+
+    def save_snapshot_file(self, name):
+        filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Save snapshot', name + '.npz', 'Snapshot (*.npz)')
+        if filepath:
+            save_snapshot(get_snapshot(name), filepath)
+
+    def load_snapshot_file(self):
+        filepath, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, 'Load snapshot', '', 'Snapshot (*.npz)')
+        if not filepath:
+            return
+        name = os.path.splitext(os.path.basename(filepath))[0]
+        store_snapshot(name, load_snapshot(filepath))
+
+    def _find_redundant_constraints(self):
+        report = find_redundant_nconstraints(self._index.list_nconstraints())
+        om.MGlobal.displayInfo(
+            '{} duplicates groups, {} constraints included in another one, '
+            '{} redundant constraints'.format(
+                len(report.duplicates), len(report.overlaps),
+                len(report.redundant)))
+        return report.redundant
+
+    def disable_redundant_constraints(self):
+        redundant = self._find_redundant_constraints()
+        set_nconstraints_enabled(redundant, False)
+        self.refresh_nconstraints(redundant)
+
+    def delete_redundant_constraints(self):
+        ''' delete the redundant constraints after a confirmation '''
+        redundant = self._find_redundant_constraints()
+        if not redundant:
+            return
+        result = QtWidgets.QMessageBox.question(
+            self, 'Delete redundant constraints',
+            'Delete {} redundant constraints?'.format(len(redundant)))
+        if result == QtWidgets.QMessageBox.Yes:
+            delete_nconstraints(redundant)
+
+    def sweep_broken_constraints(self):
+        '''
+        report the broken constraints and the dead nComponents, then delete
+        them in one undo after a confirmation
+        '''
+        report = sweep_scene()
+        text = format_sweep_report(report)
+        for line in text.split('\n'):
+            om.MGlobal.displayInfo(line)
+        if not any((
+                report.dangling_ncomponents, report.orphan_ncomponents,
+                report.empty_nconstraints)):
+            return
+        result = QtWidgets.QMessageBox.question(
+            self, 'Sweep broken constraints',
+            text + '\n\nDelete the dangling and orphan nComponents and the '
+            'empty constraints?')
+        if result == QtWidgets.QMessageBox.Yes:
+            clean_sweep(report)
 
     def switch_selected_constraints(self, state):
-        for dc in self._table_view.selected_constraints:
-            if dc.enable == state:
-                dc.switch()
+        switched = [
+            dc for dc in self._table_view.selected_constraints
+            if dc.enable == state]
+        for dc in switched:
+            dc.switch()
+        if switched and self._tree_model is not None:
+            self._tree_model.refresh_nodes([dc.nodename for dc in switched])
 
     def register_callbacks(self):
-        method = self._remove_node_callback
-        cb = om.MDGMessage.addNodeRemovedCallback(method, "dynamicConstraint")
+        if self._index_token is not None:
+            return
+        self._index_token = self._index.subscribe(self._index_changed)
+        self.update_nconstraints()
+        cb = oma.MAnimMessage.addAnimCurveEditedCallback(
+            self._anim_curves_edited_callback)
+        self._callbacks.append(cb)
+        cb = om.MEventMessage.addEventCallback('Undo', self._undo_callback)
         self._callbacks.append(cb)
-        method = self._created_node_callback
-        cb = om.MDGMessage.addNodeAddedCallback(method, "dynamicConstraint")
+        cb = om.MEventMessage.addEventCallback('Redo', self._redo_callback)
         self._callbacks.append(cb)
-        method = self.update_nconstraints
-        for event in FULL_UPDATE_REQUIRED_EVENTS:
-            cb = om.MSceneMessage.addCallback(event, method)
+        # the diff report describes the scene it was computed on
+        for event in (om.MSceneMessage.kAfterNew, om.MSceneMessage.kAfterOpen):
+            cb = om.MSceneMessage.addCallback(event, self._scene_callback)
             self._callbacks.append(cb)
+        self.playback_guard.register_callbacks()
+        self._update_drift_callbacks()
 
     def unregister_callbacks(self):
+        if self._index_token is not None:
+            self._index.unsubscribe(self._index_token)
+            self._index_token = None
         for callback in self._callbacks:
             om.MMessage.removeCallback(callback)
         self._callbacks = []
+        self.playback_guard.unregister_callbacks()
+        self._unregister_drift_callbacks()
 
-    def _remove_node_callback(self, mobject, *unused_callbacks_args):
-        node = om.MFnDagNode(mobject).name()
-        nconstraints = [
-            n for n in self._table_model.nconstraints if n.nodename == node]
-        if not nconstraints:
+    def _set_playback_guard_enabled(self, state):
+        self.playback_guard.enabled = state
+        if not state:
+            self.playback_guard.resume()
+
+    def _playback_suspended(self, state):
+        self._table_view.setUpdatesEnabled(not state)
+
+    def _playback_resumed(self, resync_required):
+        if resync_required:
+            self.update_nconstraints()
+
+    def show_playback_statistics(self):
+        statistics = self.playback_guard.statistics
+        om.MGlobal.displayInfo(
+            'last playback: {frames} frames, {frame_time:.2f} ms by frame, '
+            'outliner {outliner_time:.2f} ms by frame, {skipped_calls} '
+            'suspended calls'.format(**statistics))
+
+    @property
+    def _drift_callbacks_required(self):
+        return bool(self._callbacks) and self._table_model.drift_required
+
+    def _update_drift_callbacks(self):
+        '''
+        the drift is recomputed for one constraint when one of its attributes
+        change. This needs one callback by indexed constraint, registered
+        when the drift is displayed. A callback lives as long as its
+        constraint is indexed, the filters and the search don't change them.
+        '''
+        if not self._drift_callbacks_required:
+            return self._unregister_drift_callbacks()
+        for node in list(self._drift_callbacks):
+            if node not in self._indexed_facts:
+                self._remove_drift_callback(node)
+        for node in self._indexed_facts:
+            if node not in self._drift_callbacks:
+                self._add_drift_callback(node)
+
+    def _add_drift_callback(self, node):
+        selection = om.MSelectionList()
+        selection.add(node)
+        mobject = om.MObject()
+        selection.getDependNode(0, mobject)
+        self._drift_callbacks[node] = (
+            om.MNodeMessage.addAttributeChangedCallback(
+                mobject, self._attribute_changed_callback))
+
+    def _remove_drift_callback(self, node):
+        callback = self._drift_callbacks.pop(node, None)
+        if callback is not None:
+            om.MMessage.removeCallback(callback)
+
+    def _unregister_drift_callbacks(self):
+        for callback in self._drift_callbacks.values():
+            om.MMessage.removeCallback(callback)
+        self._drift_callbacks = {}
+
+    def _attribute_changed_callback(self, message, plug, *unused_args):
+        if not message & om.MNodeMessage.kAttributeSet:
+            return
+        attribute = om.MFnAttribute(plug.attribute()).name()
+        if attribute not in self._drift_attributes:
             return
+        self._update_drift(om.MFnDependencyNode(plug.node()).name())
+
+    @suspendable
+    def _update_drift(self, node):
+        drifts = list_drifted_attributes([node])
+        self._table_model.update_drift(node, drifts.get(node, []))
+
+    def _scene_callback(self, *unused_callbacks_args):
+        self.cancel_scene_comparison()
+        self.set_diff_report(None)
+
+    def _undo_callback(self, *unused_callbacks_args):
+        # the nodes are read now, the refresh can be deferred by the guard
+        self._refresh_history_nodes(get_undone_nodes())
+
+    def _redo_callback(self, *unused_callbacks_args):
+        self._refresh_history_nodes(get_redone_nodes())
+
+    @suspendable
+    def _refresh_history_nodes(self, nodes):
+        self.refresh_nconstraints(nodes)
+
+    def refresh_nconstraints(self, nodes=None):
+        '''
+        clear the cached values of the given nodes and repaint their rows.
+        If nodes is None, the change is unknown and all the rows are
+        refreshed, but the scene is not rescanned.
+        '''
+        self._table_model.refresh_nconstraints(nodes)
+        if self._tree_model is not None:
+            self._tree_model.refresh_nodes(nodes)
+        self._cache_colors([
+            dc for dc in self._table_model.nconstraints
+            if nodes is None or dc.nodename in nodes])
+        if not self._table_model.drift_required:
+            return
+        nodes = [
+            dc.nodename for dc in self._table_model.nconstraints
+            if nodes is None or dc.nodename in nodes]
+        drifts = list_drifted_attributes(nodes)
+        for node in nodes:
+            self._table_model.update_drift(node, drifts.get(node, []))
+
+    @suspendable
+    def _index_changed(self, delta):
+        '''
+        apply a change of the shared index, see service.IndexDelta. The
+        references are handled by partition, not node by node.
+        '''
+        if delta.reset:
+            return self.update_nconstraints()
+        if delta.reference is not None:
+            self._drop_nconstraints(delta.removed)
+            self._add_nconstraints(delta.added, delta.reference)
+        else:
+            self._remove_nconstraints(delta.removed)
+            self._insert_nconstraints(delta.added)
+        if delta.changed:
+            self._reindex_nconstraints(delta.changed)
+
+    def _remove_nconstraints(self, nconstraints):
         for nconstraint in nconstraints:
-            self._table_model.remove_nconstraint(nconstraint)
+            if nconstraint not in self._nconstraints:
+                continue
+            self._nconstraints.remove(nconstraint)
+            for partition in self._partitions.values():
+                if nconstraint in partition:
+                    partition.remove(nconstraint)
+            self._unindex_nconstraint(nconstraint.nodename)
+            if nconstraint in self._filtered_nconstraints:
+                self._filtered_nconstraints.remove(nconstraint)
+            if nconstraint in self._table_model.nconstraints:
+                self._table_model.remove_nconstraint(nconstraint)
+            if self._tree_model is not None:
+                self._tree_model.remove_node(nconstraint.nodename)
+        self.update_nconstraints_components()
 
-    def _created_node_callback(self, mobject, *unused_callbacks_args):
-        node = DynamicConstraint(om.MFnDagNode(mobject).name())
-        self._table_model.insert_nconstraint(node)
+    def _insert_nconstraints(self, nconstraints):
+        '''
+        add the constraints created in the scene, without applying the
+        filters: a new constraint is always displayed.
+        '''
+        for nconstraint in nconstraints:
+            self._nconstraints.append(nconstraint)
+            self._partitions.setdefault(NO_REFERENCE, []).append(nconstraint)
+            self._filtered_nconstraints.append(nconstraint)
+            self._table_model.insert_nconstraint(nconstraint)
+            self._index_nconstraint(nconstraint)
+            if self._tree_model is not None:
+                self._tree_model.insert_node(
+                    nconstraint.nodename, nconstraint)
+        if nconstraints:
+            self.update_nconstraints_components()
+
+    def _reindex_nconstraints(self, nconstraints_by_previous_name):
+        '''
+        index again the renamed constraints, see IndexDelta.changed. Their
+        cached values are kept by the shared index, only the parent names
+        are read again.
+        '''
+        displayed = set(self._nconstraints)
+        for node, nconstraint in nconstraints_by_previous_name.items():
+            self._unindex_nconstraint(node)
+            if nconstraint in displayed:
+                self._index_nconstraint(nconstraint)
+                if self._tree_model is not None:
+                    self._tree_model.rename_node(node, nconstraint)
+        self._table_model.update_nconstraints(
+            nconstraints_by_previous_name.values())
+        self.update_nconstraints_components()
+
+    def _anim_curves_edited_callback(self, curves, *unused_callbacks_args):
+        self._anim_curves_edited([
+            om.MFnDependencyNode(curves[i]).name()
+            for i in range(curves.length())])
+
+    @suspendable
+    def _anim_curves_edited(self, curves):
+        self._curves_cache.invalidate(curves)
+        if not curves or not self._timeline_action.isChecked():
+            return
+        nodes = cmds.listConnections(
+            curves, type='dynamicConstraint', shapes=True)
+        if nodes:
+            self.update_timeline(sorted(set(nodes)))
 
     def show(self):
         self.register_callbacks()
@@ -186,6 +1127,8 @@ class NConstraintOutliner(QtWidgets.QWidget):
 
     def closeEvent(self, event):
         self.unregister_callbacks()
+        self._refresh_worker.shutdown()
+        self.cancel_scene_comparison()
         return super(NConstraintOutliner, self).closeEvent(event)
 
 
@@ -291,6 +1234,7 @@ class OnOffLabel(QtWidgets.QWidget):
 
 class DynamicConstraintDelegate(QtWidgets.QAbstractItemDelegate):
     switched = QtCore.Signal(bool)
+    members_selection_requested = QtCore.Signal(object)
 
     SELECT_MEMBERS_ICON = None
     ADD_MEMBERS_ICON = None
@@ -334,7 +1278,7 @@ class DynamicConstraintDelegate(QtWidgets.QAbstractItemDelegate):
             return
 
         if column == 2:
-            if nconstraint.is_well_named:
+            if self._model.is_well_named(nconstraint):
                 color = QtGui.QPalette().color(QtGui.QPalette.WindowText)
             else:
                 color = QtGui.QColor('red')
@@ -342,7 +1286,7 @@ class DynamicConstraintDelegate(QtWidgets.QAbstractItemDelegate):
                 option.rect.left() + 5,
                 (option.rect.height() / 2 + option.rect.top() + 3))
             painter.setPen(color)
-            painter.drawText(point, nconstraint.parent)
+            painter.drawText(point, self._model.get_parent(nconstraint))
             return
 
         elif column == 3:
@@ -403,7 +1347,8 @@ class DynamicConstraintDelegate(QtWidgets.QAbstractItemDelegate):
         elif column == 4:
             editor = QtWidgets.QPushButton(
                 self.SELECT_MEMBERS_ICON, '', parent)
-            editor.clicked.connect(nconstraint.select_members)
+            editor.clicked.connect(
+                partial(self.members_selection_requested.emit, nconstraint))
             editor.click()
             editor.setIconSize(self.ICON_SIZE)
             return editor
@@ -489,24 +1434,40 @@ class DynamicConstraintDelegate(QtWidgets.QAbstractItemDelegate):
 
 
 class DynamicConstraintTableModel(QtCore.QAbstractTableModel):
-    HEADERS = ['', '', 'name', 'type', '', '', '', '', '']
+    HEADERS = [
+        '', '', 'name', 'type', '', '', '', '', '', 'cost', 'timeline']
     TOOLTIPS = [
         '', '', '', '',
         'select members',
         'add members from selection',
         'remove selection from members',
         'paint components',
-        'give a nice name']
+        'give a nice name',
+        'evaluation time saved by disabling the constraint',
+        'active frames on the playback range']
+    COST_COLUMN = 9
+    TIMELINE_COLUMN = 10
 
     def __init__(self, parent=None):
         super(DynamicConstraintTableModel, self).__init__(parent)
         self.nconstraints = []
+        self.drifts = {}
+        self.costs = {}
+        self.activities = {}
+        self.diff_report = None
+        self.highlight_drift = False
+        self.drifted_only = False
+        self.parents = {}  # {node: transform name}, see get_parent
+
+    @property
+    def drift_required(self):
+        return self.highlight_drift or self.drifted_only
 
     def rowCount(self, index):
         return len(self.nconstraints)
 
     def columnCount(self, index):
-        return 9
+        return 11
 
     def remove_nconstraint(self, nconstraint):
         self.layoutAboutToBeChanged.emit()
@@ -529,11 +1490,16 @@ class DynamicConstraintTableModel(QtCore.QAbstractTableModel):
         if column == 2:
             self.nconstraints = sorted(
                 self.nconstraints,
-                key=lambda dc: dc.parent, reverse=reverse)
+                key=self.get_parent, reverse=reverse)
         elif column == 3:
             self.nconstraints = sorted(
                 self.nconstraints,
                 key=lambda dc: dc.type, reverse=reverse)
+        elif column == self.COST_COLUMN:
+            self.nconstraints = sorted(
+                self.nconstraints,
+                key=lambda dc: self.costs.get(dc.nodename, -1),
+                reverse=reverse)
         self.layoutChanged.emit()
 
     def data(self, index, role):
@@ -543,20 +1509,42 @@ class DynamicConstraintTableModel(QtCore.QAbstractTableModel):
             return nconstraint
 
         elif role == QtCore.Qt.DisplayRole:
-            return nconstraint.parent
+            if col == self.COST_COLUMN:
+                cost = self.costs.get(nconstraint.nodename)
+                return '' if cost is None else '{:.1f} ms'.format(cost * 1000)
+            return self.get_parent(nconstraint)
 
         elif role == QtCore.Qt.TextColorRole:
-            if nconstraint.is_well_named:
+            if self.is_well_named(nconstraint):
                 return QtGui.QPalette().color(QtGui.QPalette.WindowText)
             else:
                 return QtGui.QColor('grey')
 
+        elif role == QtCore.Qt.BackgroundRole:
+            if self.highlight_drift and nconstraint.nodename in self.drifts:
+                return QtGui.QColor(*DRIFT_COLOR)
+            if self.diff_report is not None:
+                if nconstraint.nodename in self.diff_report.changed:
+                    return QtGui.QColor(*DIFF_CHANGED_COLOR)
+                if nconstraint.nodename in self.diff_report.added:
+                    return QtGui.QColor(*DIFF_ADDED_COLOR)
+
         if role == QtCore.Qt.ToolTipRole:
+            drifts = self.drifts.get(nconstraint.nodename)
+            if col == 2 and drifts:
+                return 'drifted from preset: ' + ', '.join(drifts)
+            if col == 2 and self.diff_report is not None:
+                changes = self.diff_report.changed.get(nconstraint.nodename)
+                if changes:
+                    return 'changed: ' + ', '.join(changes)
+                if nconstraint.nodename in self.diff_report.added:
+                    return 'added'
             return self.TOOLTIPS[col]
 
     def flags(self, index):
         flags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
-        if index.column() != 2:
+        readonly_columns = 2, self.COST_COLUMN, self.TIMELINE_COLUMN
+        if index.column() not in readonly_columns:
             flags |= QtCore.Qt.ItemIsEditable
         return flags
 
@@ -565,6 +1553,91 @@ class DynamicConstraintTableModel(QtCore.QAbstractTableModel):
         self.nconstraints = nconstraints
         self.layoutChanged.emit()
 
+    def set_parents(self, parents):
+        ''' replace the cached transforms names by {node: parent} '''
+        self.parents = dict(parents)
+
+    def forget_parents(self, nodenames):
+        for nodename in nodenames:
+            self.parents.pop(nodename, None)
+
+    def get_parent(self, nconstraint):
+        '''
+        return the transform name, it's queried once by node, not at each
+        paint. The outliner forgets the renamed nodes.
+        '''
+        parent = self.parents.get(nconstraint.nodename)
+        if parent is None:
+            parent = nconstraint.parent
+            self.parents[nconstraint.nodename] = parent
+        return parent
+
+    def is_well_named(self, nconstraint):
+        return is_nice_name_variant(
+            self.get_parent(nconstraint), nconstraint.nice_name)
+
+    def refresh_nconstraints(self, nodenames=None):
+        for row, nconstraint in enumerate(self.nconstraints):
+            if nodenames is not None and nconstraint.nodename not in nodenames:
+                continue
+            nconstraint.invalidate()
+            self.parents.pop(nconstraint.nodename, None)
+            last_column = self.columnCount(None) - 1
+            self.dataChanged.emit(
+                self.index(row, 0), self.index(row, last_column))
+
+    def update_nconstraints(self, nconstraints):
+        ''' repaint the rows of the constraints, their values are kept '''
+        nconstraints = set(nconstraints)
+        last_column = self.columnCount(None) - 1
+        for row, nconstraint in enumerate(self.nconstraints):
+            if nconstraint in nconstraints:
+                self.dataChanged.emit(
+                    self.index(row, 0), self.index(row, last_column))
+
+    def update_colors(self):
+        if self.nconstraints:
+            self.dataChanged.emit(
+                self.index(0, 1), self.index(len(self.nconstraints) - 1, 1))
+
+    def set_diff_report(self, report):
+        self.diff_report = report
+        if self.nconstraints:
+            self.dataChanged.emit(
+                self.index(0, 0),
+                self.index(
+                    len(self.nconstraints) - 1, self.columnCount(None) - 1))
+
+    def set_costs(self, costs):
+        self.costs = costs
+        if self.nconstraints:
+            self.dataChanged.emit(
+                self.index(0, self.COST_COLUMN),
+                self.index(len(self.nconstraints) - 1, self.COST_COLUMN))
+
+    def set_activities(self, activities):
+        self.activities = activities
+        if self.nconstraints:
+            self.dataChanged.emit(
+                self.index(0, self.TIMELINE_COLUMN),
+                self.index(len(self.nconstraints) - 1, self.TIMELINE_COLUMN))
+
+    def set_drifts(self, drifts):
+        self.drifts = drifts
+        if self.nconstraints:
+            self.dataChanged.emit(
+                self.index(0, 2), self.index(len(self.nconstraints) - 1, 2))
+
+    def update_drift(self, nodename, attributes):
+        if attributes:
+            self.drifts[nodename] = attributes
+        else:
+            self.drifts.pop(nodename, None)
+        for row, nconstraint in enumerate(self.nconstraints):
+            if nconstraint.nodename == nodename:
+                index = self.index(row, 2)
+                self.dataChanged.emit(index, index)
+
     def headerData(self, section, orientation, role):
         if orientation == QtCore.Qt.Vertical:
             return super(DynamicConstraintTableModel, self).headerData(
@@ -574,6 +1647,30 @@ class DynamicConstraintTableModel(QtCore.QAbstractTableModel):
             return self.HEADERS[section]
 
 
+class TimelineDelegate(QtWidgets.QStyledItemDelegate):
+    ''' draw the active frames of the constraint as bars '''
+
+    def paint(self, painter, option, index):
+        model = index.model()
+        nconstraint = model.data(index, QtCore.Qt.UserRole)
+        activity = model.activities.get(nconstraint.nodename)
+        if activity is None or not len(activity):
+            return
+        rect = option.rect.adjusted(2, 4, -2, -4)
+        ratio = rect.width() / float(len(activity))
+        painter.save()
+        painter.setPen(QtCore.Qt.NoPen)
+        painter.setBrush(QtGui.QColor(*TIMELINE_COLOR))
+        for start, end in get_active_ranges(activity):
+            painter.drawRect(QtCore.QRectF(
+                rect.left() + start * ratio, rect.top(),
+                max((end - start) * ratio, 1), rect.height()))
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(200, 15)
+
+
 class DynamicConstraintTableView(QtWidgets.QTableView):
 
     def __init__(self, parent=None):
@@ -581,6 +1678,7 @@ class DynamicConstraintTableView(QtWidgets.QTableView):
         self.configure()
         self._selection_model = None
         self._model = None
+        self.playback_guard = None
 
     def configure(self):
         self.setMinimumWidth(500)
@@ -612,6 +1710,12 @@ class DynamicConstraintTableView(QtWidgets.QTableView):
     def resizeEvent(self, event):
         return super(DynamicConstraintTableView, self).resizeEvent(event)
 
+    def paintEvent(self, event):
+        if self.playback_guard is None:
+            return super(DynamicConstraintTableView, self).paintEvent(event)
+        with self.playback_guard.measure():
+            return super(DynamicConstraintTableView, self).paintEvent(event)
+
     def set_model(self, model):
         self.setModel(model)
         self._model = model
@@ -622,3 +1726,361 @@ class DynamicConstraintTableView(QtWidgets.QTableView):
             if index == 2:
                 continue
             self.setItemDelegateForColumn(index, item_delegate)
+
+
+class TreeItem(object):
+    ROOT = 0
+    NUCLEUS = 1
+    COMPONENT = 2
+    CONSTRAINT = 3
+    __slots__ = (
+        'kind', 'name', 'parent', 'nconstraint', 'children', 'fetched',
+        'count', 'enabled', 'histogram')
+
+    def __init__(self, kind, name, parent=None, nconstraint=None):
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        self.nconstraint = nconstraint
+        self.children = []
+        self.fetched = kind == TreeItem.CONSTRAINT
+        self.count = 0
+        self.enabled = 0
+        self.histogram = {}
+
+    def row(self):
+        return self.parent.children.index(self)
+
+    def child(self, name):
+        for child in self.children:
+            if child.name == name:
+                return child
+
+    def add_contribution(self, constraint_type, enabled, sign=1):
+        self.count += sign
+        self.enabled += sign * int(bool(enabled))
+        count = self.histogram.get(constraint_type, 0) + sign
+        if count:
+            self.histogram[constraint_type] = count
+        else:
+            self.histogram.pop(constraint_type, None)
+
+    @property
+    def display_name(self):
+        if self.kind == TreeItem.NUCLEUS and self.name == NO_NUCLEUS:
+            return '(no nucleus)'
+        return self.name
+
+    @property
+    def histogram_text(self):
+        return ', '.join(
+            '{} {}'.format(DYNAMIC_CONTRAINT_TYPES[t]['short'], count)
+            for t, count in sorted(self.histogram.items()))
+
+
+class DynamicConstraintTreeModel(QtCore.QAbstractItemModel):
+    '''
+    This model show the constraints grouped by nucleus and by component
+    transform. The children are created when a group is expanded and the
+    groups statistics are updated incrementally.
+    '''
+    HEADERS = ['name', 'constraints', 'enabled', 'types']
+
+    def __init__(self, scene_index, parent=None):
+        super(DynamicConstraintTreeModel, self).__init__(parent)
+        self._scene_index = scene_index
+        self._contributions = {}
+        self._root = TreeItem(TreeItem.ROOT, '')
+        self.reset()
+
+    def reset(self):
+        self.beginResetModel()
+        self._root = TreeItem(TreeItem.ROOT, '')
+        self._root.fetched = True
+        self._contributions = {}
+        for nucleus in self._scene_index.list_nucleus():
+            item = TreeItem(TreeItem.NUCLEUS, nucleus, self._root)
+            self._root.children.append(item)
+            for node in self._scene_index.list_nodes(nucleus=nucleus):
+                item.add_contribution(*self._contribution(node))
+        self.endResetModel()
+
+    def _contribution(self, node):
+        if node not in self._contributions:
+            nconstraint = self._scene_index.nconstraints[node]
+            self._contributions[node] = nconstraint.type, nconstraint.enable
+        return self._contributions[node]
+
+    def item(self, index):
+        if index.isValid():
+            return index.internalPointer()
+        return self._root
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, self.item(parent).children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self._root:
+            return QtCore.QModelIndex()
+        return self.createIndex(parent.row(), 0, parent)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.item(parent).children)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.HEADERS)
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        item = self.item(parent)
+        if item.kind == TreeItem.CONSTRAINT:
+            return False
+        return not item.fetched or bool(item.children)
+
+    def canFetchMore(self, parent):
+        return not self.item(parent).fetched
+
+    def fetchMore(self, parent):
+        item = self.item(parent)
+        if item.fetched:
+            return
+        children = self._create_children(item)
+        item.fetched = True
+        if not children:
+            return
+        self.beginInsertRows(parent, 0, len(children) - 1)
+        item.children = children
+        self.endInsertRows()
+
+    def _create_children(self, item):
+        children = []
+        if item.kind == TreeItem.NUCLEUS:
+            for component in self._scene_index.list_components(item.name):
+                child = TreeItem(TreeItem.COMPONENT, component, item)
+                nodes = self._scene_index.list_nodes(item.name, component)
+                for node in nodes:
+                    child.add_contribution(*self._contribution(node))
+                children.append(child)
+        elif item.kind == TreeItem.COMPONENT:
+            nodes = self._scene_index.list_nodes(item.parent.name, item.name)
+            for node in nodes:
+                children.append(self._create_constraint_item(node, item))
+        return children
+
+    def _create_constraint_item(self, node, parent):
+        nconstraint = self._scene_index.nconstraints[node]
+        child = TreeItem(
+            TreeItem.CONSTRAINT, node, parent, nconstraint=nconstraint)
+        child.add_contribution(*self._contribution(node))
+        return child
+
+    def data(self, index, role):
+        item = self.item(index)
+        column = index.column()
+        if role == QtCore.Qt.UserRole:
+            return item
+
+        if role != QtCore.Qt.DisplayRole:
+            return None
+
+        if column == 0:
+            if item.kind == TreeItem.CONSTRAINT:
+                return item.nconstraint.parent
+            return item.display_name
+        if column == 1 and item.kind != TreeItem.CONSTRAINT:
+            return item.count
+        if column == 2:
+            if item.kind == TreeItem.CONSTRAINT:
+                return 'on' if item.enabled else 'off'
+            return item.enabled
+        if column == 3:
+            return item.histogram_text
+
+    def headerData(self, section, orientation, role):
+        if orientation == QtCore.Qt.Horizontal and \
+                role == QtCore.Qt.DisplayRole:
+            return self.HEADERS[section]
+
+    def list_nodes(self, items):
+        '''
+        return all the constraints nodes contained by the items, even if the
+        items children are not fetched yet.
+        '''
+        nodes = set()
+        for item in items:
+            if item.kind == TreeItem.NUCLEUS:
+                nodes.update(self._scene_index.list_nodes(nucleus=item.name))
+            elif item.kind == TreeItem.COMPONENT:
+                nodes.update(self._scene_index.list_nodes(
+                    item.parent.name, item.name))
+            elif item.kind == TreeItem.CONSTRAINT:
+                nodes.add(item.name)
+        return sorted(nodes)
+
+    def _items_for_node(self, node):
+        '''
+        return the existing items containing the node
+        '''
+        nucleus_item = self._root.child(self._scene_index.nucleus[node])
+        if nucleus_item is None:
+            return []
+        items = [nucleus_item]
+        for component in self._scene_index.components[node]:
+            component_item = nucleus_item.child(component)
+            if component_item is None:
+                continue
+            items.append(component_item)
+            constraint_item = component_item.child(node)
+            if constraint_item is not None:
+                items.append(constraint_item)
+        return items
+
+    def _emit_items_changed(self, items):
+        for item in items:
+            if item.parent is None:
+                continue
+            row = item.row()
+            self.dataChanged.emit(
+                self.createIndex(row, 1, item), self.createIndex(row, 3, item))
+
+    def set_enabled(self, items, state):
+        '''
+        enable or disable all the constraints contained by the items in one
+        batched write
+        '''
+        nodes = self.list_nodes(items)
+        contributions = {node: self._contribution(node) for node in nodes}
+        set_nconstraints_enabled(nodes, state)
+        for node in nodes:
+            constraint_type, enabled = contributions[node]
+            if bool(enabled) == bool(state):
+                continue
+            items = self._items_for_node(node)
+            for item in items:
+                item.add_contribution(constraint_type, enabled, -1)
+                item.add_contribution(constraint_type, state)
+            self._contributions[node] = constraint_type, state
+            self._emit_items_changed(items)
+
+    def insert_node(self, node, nconstraint=None):
+        self._scene_index.add(node, nconstraint)
+        nucleus = self._scene_index.nucleus[node]
+        nucleus_item = self._root.child(nucleus)
+        if nucleus_item is None:
+            nucleus_item = self._insert_item(
+                self._root, TreeItem(TreeItem.NUCLEUS, nucleus, self._root))
+        nucleus_item.add_contribution(*self._contribution(node))
+        self._emit_items_changed([nucleus_item])
+        if not nucleus_item.fetched:
+            return
+
+        for component in self._scene_index.components[node]:
+            component_item = nucleus_item.child(component)
+            if component_item is None:
+                item = TreeItem(TreeItem.COMPONENT, component, nucleus_item)
+                component_item = self._insert_item(nucleus_item, item)
+            component_item.add_contribution(*self._contribution(node))
+            self._emit_items_changed([component_item])
+            if component_item.fetched:
+                item = self._create_constraint_item(node, component_item)
+                self._insert_item(component_item, item)
+
+    def remove_node(self, node):
+        if node not in self._scene_index:
+            return
+        constraint_type, enabled = self._contribution(node)
+        for item in reversed(self._items_for_node(node)):
+            item.add_contribution(constraint_type, enabled, -1)
+            if item.count:
+                self._emit_items_changed([item])
+                continue
+            parent = item.parent
+            row = item.row()
+            parent_index = QtCore.QModelIndex()
+            if parent is not self._root:
+                parent_index = self.createIndex(parent.row(), 0, parent)
+            self.beginRemoveRows(parent_index, row, row)
+            parent.children.pop(row)
+            self.endRemoveRows()
+        self._scene_index.remove(node)
+        self._contributions.pop(node, None)
+
+    def refresh_nodes(self, nodes=None):
+        '''
+        read again the type and the enabled state of the nodes, all of them
+        if nodes is None, and update the groups statistics they count in
+        '''
+        if nodes is None:
+            nodes = self._scene_index.list_nodes()
+        for node in nodes:
+            if node not in self._scene_index:
+                continue
+            previous = self._contributions.pop(node, None)
+            self._scene_index.nconstraints[node].invalidate()
+            current = self._contribution(node)
+            if previous is None or previous == current:
+                continue
+            items = self._items_for_node(node)
+            for item in items:
+                item.add_contribution(*previous, sign=-1)
+                item.add_contribution(*current)
+            self._emit_items_changed(items)
+
+    def rename_node(self, previous_name, nconstraint):
+        '''
+        move a constraint renamed, or whose components were renamed, see
+        IndexDelta.changed
+        '''
+        self.remove_node(previous_name)
+        self.insert_node(nconstraint.nodename, nconstraint)
+
+    def _insert_item(self, parent, item):
+        names = [child.name for child in parent.children]
+        row = len([name for name in names if name < item.name])
+        parent_index = QtCore.QModelIndex()
+        if parent is not self._root:
+            parent_index = self.createIndex(parent.row(), 0, parent)
+        self.beginInsertRows(parent_index, row, row)
+        parent.children.insert(row, item)
+        self.endInsertRows()
+        return item
+
+
+class DynamicConstraintTreeView(QtWidgets.QTreeView):
+
+    def __init__(self, parent=None):
+        super(DynamicConstraintTreeView, self).__init__(parent)
+        self.setMinimumWidth(500)
+        self.setAlternatingRowColors(True)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self._show_context_menu)
+
+    @property
+    def selected_items(self):
+        indexes = [
+            i for i in self.selectionModel().selectedIndexes()
+            if i.column() == 0]
+        return [self.model().data(i, QtCore.Qt.UserRole) for i in indexes]
+
+    def _show_context_menu(self, position):
+        items = self.selected_items
+        if not items:
+            return
+        menu = QtWidgets.QMenu(self)
+        action = menu.addAction('enable')
+        action.triggered.connect(lambda: self.model().set_enabled(items, True))
+        action = menu.addAction('disable')
+        action.triggered.connect(
+            lambda: self.model().set_enabled(items, False))
+        action = menu.addAction('select constraints')
+        action.triggered.connect(lambda: select_nodes(
+            self.model().list_nodes(items), get_selection_mode(),
+            parents=True))
+        menu.exec_(self.viewport().mapToGlobal(position))
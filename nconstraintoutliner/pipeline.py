@@ -0,0 +1,137 @@
+"""
+This module splits the outliner refresh in two stages:
+- the extraction, on the main thread: the scene facts needed by the
+  outliner are read from maya in immutable records (ConstraintFacts).
+- the computation, on a worker thread: the nice names, the sorting and the
+  search index are computed from the records only, without any maya call.
+  The outliner adopts the sorted order and the transforms names of the
+  records, the table doesn't query them at each paint.
+
+worker = RefreshWorker()
+worker.finished.connect(on_refresh_finished)
+worker.submit(extract_facts(nconstraints))
+
+The result comes back through a queued signal, so it's received on the main
+thread. Without concurrent.futures (python 2), the computation is done
+synchronously.
+"""
+
+import logging
+from collections import namedtuple
+from functools import partial
+
+from PySide2 import QtCore
+
+from nconstraintoutliner.nconstraint import (
+    DYNAMIC_CONTRAINT_TYPES, format_nconstraint_nice_name)
+from nconstraintoutliner.search import TrigramIndex
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:  # python 2 without the futures backport
+    ThreadPoolExecutor = None
+
+
+ConstraintFacts = namedtuple(
+    'ConstraintFacts', ['node', 'parent', 'type', 'components'])
+RefreshResult = namedtuple(
+    'RefreshResult', [
+        'facts', 'nice_names', 'search_index', 'component_counts'])
+
+
+def extract_facts(nconstraints):
+    '''
+    read the scene values of the DynamicConstraint list. It's the only stage
+    calling maya, it must run on the main thread.
+    '''
+    return tuple(
+        ConstraintFacts(
+            dc.nodename, dc.parent, dc.type, tuple(dc.components))
+        for dc in nconstraints)
+
+
+def index_facts(facts, search_index, component_counts):
+    '''
+    add a constraint to the search index and to the components counts.
+    '''
+    nice_name = format_nconstraint_nice_name(facts.type, facts.components)
+    search_index.add(facts.node, [
+        facts.parent, nice_name, DYNAMIC_CONTRAINT_TYPES[facts.type]['name']
+    ] + list(facts.components))
+    for component in facts.components:
+        component_counts[component] = component_counts.get(component, 0) + 1
+    return nice_name
+
+
+def unindex_facts(facts, search_index, component_counts):
+    ''' remove a constraint indexed with index_facts '''
+    search_index.remove(facts.node)
+    for component in facts.components:
+        count = component_counts.get(component, 0) - 1
+        if count > 0:
+            component_counts[component] = count
+        else:
+            component_counts.pop(component, None)
+
+
+def compute_refresh(facts):
+    '''
+    compute the derived data from the facts, it doesn't call maya. The facts
+    of the result are sorted by node name.
+    '''
+    facts = sorted(facts, key=lambda f: f.node)
+    search_index = TrigramIndex()
+    component_counts = {}
+    nice_names = {}
+    for constraint_facts in facts:
+        nice_names[constraint_facts.node] = index_facts(
+            constraint_facts, search_index, component_counts)
+    return RefreshResult(
+        tuple(facts), nice_names, search_index, component_counts)
+
+
+class RefreshWorker(QtCore.QObject):
+    '''
+    run compute_refresh on a worker thread. The result is emitted by the
+    finished signal on the main thread, only for the last submission: the
+    older ones are dropped.
+    '''
+    finished = QtCore.Signal(object)
+    _computed = QtCore.Signal(int, object)
+
+    def __init__(self, parent=None):
+        super(RefreshWorker, self).__init__(parent)
+        self._executor = None
+        self._generation = 0
+        self._computed.connect(self._deliver, QtCore.Qt.QueuedConnection)
+
+    def submit(self, facts):
+        self._generation += 1
+        if ThreadPoolExecutor is None:
+            self.finished.emit(compute_refresh(facts))
+            return
+        if self._executor is None:
+            # created on demand, the worker can be submitted again after a
+            # shutdown
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        future = self._executor.submit(compute_refresh, facts)
+        future.add_done_callback(partial(self._future_done, self._generation))
+
+    def _future_done(self, generation, future):
+        # called from the worker thread, the signal is queued
+        try:
+            result = future.result()
+        except Exception:
+            return logging.exception('nconstraint outliner refresh failed')
+        self._computed.emit(generation, result)
+
+    def _deliver(self, generation, result):
+        if generation == self._generation:
+            self.finished.emit(result)
+
+    def shutdown(self):
+        ''' stop the thread, the pending results are dropped '''
+        self._generation += 1
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
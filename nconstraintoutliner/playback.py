@@ -0,0 +1,193 @@
+"""
+This module contains a guard which detect when maya is playing back or when
+the time slider is scrubbed. During this time, the outliner repaints are
+suspended and its callbacks are deferred: they are replayed in order when
+the playback stops. A single time change (a frame step, a script setting the
+time) doesn't suspend anything. It also measure the time spent by the
+outliner during the playback to know its overhead on the frame time.
+
+guard = PlaybackGuard()
+guard.resumed.connect(outliner.resync)
+guard.register_callbacks()
+"""
+
+import logging
+from contextlib import contextmanager
+from functools import partial, wraps
+from timeit import default_timer
+
+from PySide2 import QtCore
+from maya import cmds, mel
+import maya.OpenMaya as om
+
+
+SCRUB_TIMEOUT = 250  # milliseconds without time change to consider it stopped
+# above this count, the deferred calls are dropped for a full resync
+MAXIMUM_DEFERRED_CALLS = 1000
+
+
+def is_scrubbing():
+    ''' return True while the mouse is pressed on the time slider '''
+    try:
+        slider = mel.eval('$nconstraintoutliner_tmp = $gPlayBackSlider')
+        return bool(cmds.timeControl(slider, query=True, pressed=True))
+    except RuntimeError:  # no time slider without interface
+        return False
+
+
+class PlaybackGuard(QtCore.QObject):
+    suspended_changed = QtCore.Signal(bool)
+    resumed = QtCore.Signal(bool)  # True if a resync is required
+
+    def __init__(self, parent=None):
+        super(PlaybackGuard, self).__init__(parent)
+        self.enabled = True
+        self.suspended = False
+        self.resync_required = False
+        self._deferred_calls = []
+        self._playing_back = False
+        self._callbacks = []
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(SCRUB_TIMEOUT)
+        self._timer.timeout.connect(self._time_stopped)
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        self.frames = 0
+        self.frames_time = 0.0
+        self.outliner_time = 0.0
+        self.skipped_calls = 0
+        self._last_time_change = None
+
+    @property
+    def statistics(self):
+        '''
+        return a dict with the averages measured since the last reset, in
+        milliseconds by frame
+        '''
+        frames = max(self.frames, 1)
+        return {
+            'frames': self.frames,
+            'frame_time': self.frames_time * 1000 / frames,
+            'outliner_time': self.outliner_time * 1000 / frames,
+            'skipped_calls': self.skipped_calls}
+
+    @contextmanager
+    def measure(self):
+        '''
+        measure the time spent in the context if maya is playing back
+        '''
+        if not self._playing_back and not self._timer.isActive():
+            yield
+            return
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.outliner_time += default_timer() - start
+
+    def register_callbacks(self):
+        cb = om.MConditionMessage.addConditionCallback(
+            'playingBack', self._playing_back_changed)
+        self._callbacks.append(cb)
+        cb = om.MEventMessage.addEventCallback(
+            'timeChanged', self._time_changed)
+        self._callbacks.append(cb)
+
+    def unregister_callbacks(self):
+        for callback in self._callbacks:
+            om.MMessage.removeCallback(callback)
+        self._callbacks = []
+        self._timer.stop()
+        self._playing_back = False
+        # the deferred calls target the callbacks which are removed
+        self._deferred_calls = []
+        self.resync_required = False
+        self.resume()
+
+    def suspend(self):
+        if self.suspended or not self.enabled:
+            return
+        self.suspended = True
+        self.suspended_changed.emit(True)
+
+    def defer(self, func, *args, **kwargs):
+        '''
+        record a call skipped during the suspension, it's replayed when the
+        guard resumes. Too many calls are replaced by a full resync.
+        '''
+        self.skipped_calls += 1
+        if self.resync_required:
+            return
+        if len(self._deferred_calls) >= MAXIMUM_DEFERRED_CALLS:
+            self._deferred_calls = []
+            self.resync_required = True
+            return
+        self._deferred_calls.append(partial(func, *args, **kwargs))
+
+    def resume(self):
+        if not self.suspended:
+            return
+        self.suspended = False
+        resync_required = self.resync_required
+        self.resync_required = False
+        calls, self._deferred_calls = self._deferred_calls, []
+        self.suspended_changed.emit(False)
+        for call in calls:
+            try:
+                call()
+            except Exception:
+                logging.exception('nconstraint outliner deferred call failed')
+        self.resumed.emit(resync_required)
+
+    def _playing_back_changed(self, state, *unused_callbacks_args):
+        self._playing_back = state
+        if state:
+            self.reset_statistics()
+            self.suspend()
+            return
+        self._last_time_change = None
+        self.resume()
+        logging.info(
+            'nconstraint outliner playback statistics: {}'.format(
+                self.statistics))
+
+    def _time_changed(self, *unused_callbacks_args):
+        now = default_timer()
+        if self._last_time_change is not None:
+            self.frames += 1
+            self.frames_time += now - self._last_time_change
+        self._last_time_change = now
+        if self._playing_back or not is_scrubbing():
+            return
+        # there's no scrubbing condition, the scrub is considered as stopped
+        # when the slider is released and the time doesn't change anymore.
+        self.suspend()
+        self._timer.start()
+
+    def _time_stopped(self):
+        if self._playing_back:
+            return
+        if is_scrubbing():
+            return self._timer.start()
+        self._last_time_change = None
+        self.resume()
+
+
+def suspendable(func):
+    '''
+    this decorator is made for the methods called by maya callbacks on an
+    object having a playback_guard attribute. When the guard is suspended,
+    the call is deferred until the playback is stopped. The arguments are
+    kept, they must stay valid: python values, not the maya objects given to
+    the callbacks. The time spent in the method during playback is measured.
+    '''
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        guard = self.playback_guard
+        if guard.suspended:
+            return guard.defer(wrapper, self, *args, **kwargs)
+        with guard.measure():
+            return func(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,273 @@
+"""
+This module compares the dynamic constraints attributes with the presets
+saved in the presets folder, for all the constraints at once. The attributes
+are read in a numpy matrix (one row by constraint, one column by attribute)
+and compared with the presets matrix (one row by constraint type).
+
+It's used to find the type of constraints created with the maya tools, which
+don't have the custom type attribute:
+types, confidences = infer_nconstraint_types(cmds.ls(type='dynamicConstraint'))
+and to find the constraints tweaked since their creation:
+drifts = list_drifted_attributes(cmds.ls(type='dynamicConstraint'))
+"""
+
+import numpy as np
+from maya import cmds
+import maya.api.OpenMaya as om2
+
+from nconstraintoutliner.history import operation
+from nconstraintoutliner.modifier import commit
+from nconstraintoutliner.nconstraint import (
+    DYNAMIC_CONTRAINT_TYPES, TYPE_ATTR_NAME, TYPE_ATTR_LONGNAME,
+    DynamicConstraint, load_preset)
+
+
+DRIFT_IGNORED_ATTRIBUTES = (
+    'enable', 'visibility', 'isHistoricallyInteresting', 'boundingBoxCenterZ')
+
+
+def get_mobjects(nodes):
+    selection = om2.MSelectionList()
+    for node in nodes:
+        selection.add(node)
+    return [selection.getDependNode(i) for i in range(selection.length())]
+
+
+def read_attributes_matrix(nodes, attributes):
+    '''
+    return a numpy matrix of the attributes values. Shape is
+    (len(nodes), len(attributes)). Booleans and enums are read as float.
+    '''
+    matrix = np.zeros((len(nodes), len(attributes)), dtype=np.float64)
+    for row, mobject in enumerate(get_mobjects(nodes)):
+        fn = om2.MFnDependencyNode(mobject)
+        for column, attribute in enumerate(attributes):
+            matrix[row, column] = fn.findPlug(attribute, False).asDouble()
+    return matrix
+
+
+def list_preset_types():
+    '''
+    return the constraint types having a preset file, ordered as
+    DYNAMIC_CONTRAINT_TYPES
+    '''
+    return [
+        index for index, dc_type in enumerate(DYNAMIC_CONTRAINT_TYPES)
+        if dc_type['preset_file'] is not None]
+
+
+def get_discriminant_attributes():
+    '''
+    return the preset attributes which have different values through the
+    presets files. The other ones can't help to find a type.
+    '''
+    presets = [load_preset(t) for t in list_preset_types()]
+    attributes = set(k for preset in presets for k in preset)
+    return sorted(
+        attribute for attribute in attributes
+        if None not in [p.get(attribute) for p in presets] and
+        len(set(p[attribute] for p in presets)) > 1)
+
+
+def get_presets_matrix(attributes, constraint_types=None):
+    '''
+    return a numpy matrix of the presets values. One row by constraint type
+    and one column by attribute. The presets not containing an attribute get
+    nan.
+    '''
+    constraint_types = constraint_types or list_preset_types()
+    matrix = np.full(
+        (len(constraint_types), len(attributes)), np.nan, dtype=np.float64)
+    for row, constraint_type in enumerate(constraint_types):
+        preset = load_preset(constraint_type)
+        for column, attribute in enumerate(attributes):
+            value = preset.get(attribute)
+            if value is not None:
+                matrix[row, column] = float(value)
+    return matrix
+
+
+def get_categorical_mask(attributes):
+    '''
+    return a boolean array which is True for the booleans and enums
+    attributes. Those are compared by equality instead of distance.
+    '''
+    presets = [load_preset(t) for t in list_preset_types()]
+    return np.array([
+        all(isinstance(p.get(a), (bool, int)) for p in presets if a in p)
+        for a in attributes])
+
+
+def compute_presets_distances(values, presets, categorical):
+    '''
+    return a (constraints, presets) matrix of normalized distances between 0
+    (identical) and 1 (everything is different).
+    The continuous attributes difference is divided by the range of the
+    attribute through the presets and clamped to 1.
+    '''
+    difference = np.abs(values[:, np.newaxis, :] - presets[np.newaxis, :, :])
+    ranges = np.nanmax(presets, axis=0) - np.nanmin(presets, axis=0)
+    ranges[ranges == 0] = 1.0
+    distances = np.where(
+        categorical, difference > 1e-6, np.minimum(difference / ranges, 1.0))
+    distances = np.where(np.isnan(difference), 0, distances)
+    return distances.mean(axis=2)
+
+
+def infer_nconstraint_types(nodes):
+    '''
+    return the nearest preset type of each dynamic constraint with a
+    confidence score between 0 and 1. The confidence is 1 when the
+    constraint match exactly a preset and 0 when two presets are as near.
+    '''
+    constraint_types = list_preset_types()
+    if not nodes:
+        return [], []
+    attributes = get_discriminant_attributes()
+    values = read_attributes_matrix(nodes, attributes)
+    presets = get_presets_matrix(attributes, constraint_types)
+    distances = compute_presets_distances(
+        values, presets, get_categorical_mask(attributes))
+
+    order = np.argsort(distances, axis=1)
+    rows = np.arange(len(nodes))
+    nearest = distances[rows, order[:, 0]]
+    second = distances[rows, order[:, 1]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        confidences = np.where(second > 0, 1.0 - nearest / second, 0.0)
+    types = [constraint_types[i] for i in order[:, 0]]
+    return types, confidences.tolist()
+
+
+def create_type_attribute(constraint_type=DynamicConstraint.UNDEFINED):
+    fn = om2.MFnEnumAttribute()
+    attribute = fn.create(
+        TYPE_ATTR_NAME, TYPE_ATTR_NAME, constraint_type)
+    for index, dc_type in enumerate(DYNAMIC_CONTRAINT_TYPES):
+        fn.addField(dc_type['name'], index)
+    fn.setNiceNameOverride(TYPE_ATTR_LONGNAME)
+    fn.keyable = True
+    return attribute
+
+
+def tag_nconstraint_types(nodes, constraint_types):
+    '''
+    set the constraint type attribute on all the given nodes. The attribute is
+    created where it doesn't exist. The whole tagging is one undo.
+    '''
+    mobjects = get_mobjects(nodes)
+    untagged = [
+        mobject for mobject in mobjects if not
+        om2.MFnDependencyNode(mobject).hasAttribute(TYPE_ATTR_NAME)]
+
+    with operation(nodes, 'tag_types'):
+        if untagged:
+            modifier = om2.MDGModifier()
+            for mobject in untagged:
+                modifier.addAttribute(mobject, create_type_attribute())
+            commit(modifier)
+
+        modifier = om2.MDGModifier()
+        for mobject, constraint_type in zip(mobjects, constraint_types):
+            plug = om2.MFnDependencyNode(mobject).findPlug(
+                TYPE_ATTR_NAME, False)
+            modifier.newPlugValueInt(plug, constraint_type)
+        commit(modifier)
+
+
+def list_untagged_nconstraints():
+    '''
+    return the dynamic constraints without type attribute or with an
+    undefined type
+    '''
+    return [
+        node for node in cmds.ls(type='dynamicConstraint') if
+        get_constraint_type_value(node) == DynamicConstraint.UNDEFINED]
+
+
+def get_constraint_type_value(node):
+    fn = om2.MFnDependencyNode(get_mobjects([node])[0])
+    if not fn.hasAttribute(TYPE_ATTR_NAME):
+        return DynamicConstraint.UNDEFINED
+    return fn.findPlug(TYPE_ATTR_NAME, False).asInt()
+
+
+def classify_untagged_nconstraints(minimum_confidence=0.5):
+    '''
+    infer and tag the type of every untagged dynamic constraint in the scene.
+    The constraints with a confidence lower than minimum_confidence are left
+    undefined. e.g. the weld and disable collision presets are identical, the
+    confidence of a constraint matching them is 0.
+    return a dict {node: (type, confidence)} of the tagged constraints.
+    '''
+    nodes = list_untagged_nconstraints()
+    types, confidences = infer_nconstraint_types(nodes)
+    results = {
+        node: (constraint_type, confidence) for node, constraint_type,
+        confidence in zip(nodes, types, confidences)
+        if confidence >= minimum_confidence}
+    if results:
+        nodes = sorted(results)
+        tag_nconstraint_types(nodes, [results[n][0] for n in nodes])
+    return results
+
+
+def get_drift_attributes():
+    '''
+    return the attributes compared to detect the drift of a constraint from
+    its preset. It's all the attributes with a value in the presets files,
+    except the ones changed during a normal usage.
+    '''
+    presets = [load_preset(t) for t in list_preset_types()]
+    attributes = set(
+        k for preset in presets for k, v in preset.items() if v is not None)
+    return sorted(attributes - set(DRIFT_IGNORED_ATTRIBUTES))
+
+
+def compute_drift_masks(values, presets, tolerance=1e-4):
+    '''
+    return a boolean matrix which is True where the values are different from
+    the preset values. The nan presets (undefined types or attributes not in
+    the preset) are never considered as drifted.
+    '''
+    difference = np.abs(values - presets)
+    scale = np.maximum(np.abs(presets), 1.0)
+    # nan > tolerance is False
+    with np.errstate(invalid='ignore'):
+        return difference / scale > tolerance
+
+
+def get_nconstraints_drift(nodes, constraint_types=None):
+    '''
+    return the attributes names list and a (nodes, attributes) boolean matrix
+    masking the attributes which drifted from the constraints types presets.
+    @constraint_types is the list of the nodes types, it's read from the nodes
+    if it's not specified.
+    '''
+    attributes = get_drift_attributes()
+    if not nodes:
+        return attributes, np.zeros((0, len(attributes)), dtype=bool)
+    if constraint_types is None:
+        constraint_types = [get_constraint_type_value(n) for n in nodes]
+
+    preset_types = list_preset_types()
+    presets = get_presets_matrix(attributes, preset_types)
+    # add a nan row used by the undefined constraint types
+    presets = np.vstack([presets, np.full(len(attributes), np.nan)])
+    rows = [
+        preset_types.index(t) if t in preset_types else len(preset_types)
+        for t in constraint_types]
+
+    values = read_attributes_matrix(nodes, attributes)
+    return attributes, compute_drift_masks(values, presets[rows])
+
+
+def list_drifted_attributes(nodes, constraint_types=None):
+    '''
+    return a dict {node: [drifted attributes]} containing the drifted nodes
+    '''
+    attributes, masks = get_nconstraints_drift(nodes, constraint_types)
+    attributes = np.array(attributes)
+    return {
+        node: attributes[mask].tolist() for node, mask in zip(nodes, masks)
+        if mask.any()}
@@ -0,0 +1,189 @@
+"""
+This module measures the solve cost of the dynamic constraints. The cost of
+a constraint is the evaluation time saved when it's disabled. The
+constraints are disabled by groups, and a group is split in two halves only
+if its cost is above the noise floor, so the expensive constraints are found
+in a few evaluations (bisection) and the cheap groups are pruned. Only the
+first half of a group is measured, the cost of the second half is the rest
+of the group cost.
+
+evaluator = NucleusEvaluator(end_frame=50)
+costs = profile_nconstraints(cmds.ls(type='dynamicConstraint'), evaluator)
+
+The noise floor is the spread of the repeated baseline solves, the groups
+under it cost 0. The evaluator can be replaced by a FakeEvaluator, the
+profiler then runs without maya (maya is only imported by the
+NucleusEvaluator). The costs aren't always additive: two constraints on the
+same vertices can cost less together than separately.
+
+A keyed or driven enable attribute can't be toggled by the profiler, these
+constraints aren't profiled and are missing from the result.
+"""
+
+import random
+from timeit import default_timer
+
+
+# the measured costs under this multiple of the baseline spread are noise
+NOISE_FACTOR = 3.0
+MINIMUM_BASELINE_SOLVES = 5
+
+
+class NucleusEvaluator(object):
+    '''
+    evaluate the nucleus solvers from the start frame to the end frame and
+    return the duration. The simulation starts at the nucleus start frame
+    by default, and ends at the playback end.
+    '''
+
+    def __init__(self, start_frame=None, end_frame=None, nucleus=None):
+        from maya import cmds
+        self.nucleus = nucleus or cmds.ls(type='nucleus')
+        if start_frame is None:
+            start_frame = min([
+                cmds.getAttr(node + '.startFrame') for node in self.nucleus]
+                or [cmds.playbackOptions(query=True, minTime=True)])
+        if end_frame is None:
+            end_frame = cmds.playbackOptions(query=True, maxTime=True)
+        self.start_frame = int(start_frame)
+        self.end_frame = int(end_frame)
+
+    def get_enabled(self, nodes):
+        from maya import cmds
+        return {node: bool(cmds.getAttr(node + '.enable')) for node in nodes}
+
+    def list_driven(self, nodes):
+        '''
+        return the nodes whose enable attribute is keyed or driven by a
+        connection, setting it has no effect on the solve
+        '''
+        import maya.api.OpenMaya as om2
+        driven = []
+        for node in nodes:
+            plug = om2.MSelectionList().add(node + '.enable').getPlug(0)
+            if plug.isDestination:
+                driven.append(node)
+        return driven
+
+    def set_enabled(self, states):
+        '''
+        set the enable attributes given as {node: state} with one modifier.
+        It's not undoable, the profiler restores the original states.
+        '''
+        import maya.api.OpenMaya as om2
+        modifier = om2.MDGModifier()
+        for node, state in states.items():
+            plug = om2.MSelectionList().add(node + '.enable').getPlug(0)
+            modifier.newPlugValueBool(plug, bool(state))
+        modifier.doIt()
+
+    def evaluate(self):
+        from maya import cmds
+        current_time = cmds.currentTime(query=True)
+        start = default_timer()
+        try:
+            for frame in range(self.start_frame, self.end_frame + 1):
+                cmds.currentTime(frame, update=False)
+                cmds.dgeval(self.nucleus)
+            return default_timer() - start
+        finally:
+            cmds.currentTime(current_time, update=True)
+
+
+class FakeEvaluator(object):
+    '''
+    stand-in of the NucleusEvaluator, the evaluation time is the sum of the
+    costs of the enabled constraints, plus a random noise up to @noise. The
+    enable states of the @driven constraints can't be changed, like a keyed
+    attribute. It records the number of evaluations.
+    '''
+
+    def __init__(self, costs, base_cost=0.0, disabled=None, noise=0.0,
+                 seed=0, driven=None):
+        self.costs = dict(costs)
+        self.base_cost = base_cost
+        self.enabled = {node: True for node in self.costs}
+        self.enabled.update({node: False for node in disabled or []})
+        self.driven = set(driven or [])
+        self.noise = noise
+        self.evaluations = 0
+        self._random = random.Random(seed)
+
+    def get_enabled(self, nodes):
+        return {node: self.enabled.get(node, True) for node in nodes}
+
+    def list_driven(self, nodes):
+        return [node for node in nodes if node in self.driven]
+
+    def set_enabled(self, states):
+        self.enabled.update(
+            (node, state) for node, state in states.items()
+            if node not in self.driven)
+
+    def evaluate(self):
+        self.evaluations += 1
+        duration = self.base_cost + sum(
+            cost for node, cost in self.costs.items() if self.enabled[node])
+        return duration + self._random.uniform(0, self.noise)
+
+
+def _measure(evaluator, repeat):
+    # the fastest run is the less disturbed by the rest of the system
+    return min(evaluator.evaluate() for _ in range(max(repeat, 1)))
+
+
+def measure_baseline(evaluator, repeat=1):
+    '''
+    return the duration of the solve with all the constraints and the noise
+    floor: the spread of the repeated solves.
+    '''
+    solves = max(repeat, MINIMUM_BASELINE_SOLVES)
+    durations = [evaluator.evaluate() for _ in range(solves)]
+    return min(durations), (max(durations) - min(durations)) * NOISE_FACTOR
+
+
+def _measure_disabled(evaluator, group, baseline, repeat):
+    evaluator.set_enabled({node: False for node in group})
+    try:
+        return max(baseline - _measure(evaluator, repeat), 0.0)
+    finally:
+        evaluator.set_enabled({node: True for node in group})
+
+
+def profile_nconstraints(nodes, evaluator, minimum_cost=0.0, repeat=1):
+    '''
+    return a dict {node: cost in seconds}. The groups costing less than the
+    noise floor cost 0 and aren't split. The groups costing less than
+    minimum_cost aren't split either, their cost is shared between their
+    constraints. The disabled constraints cost 0, the constraints with a
+    keyed or driven enable aren't in the result. The enable states are
+    restored at the end, even if the evaluation fails.
+    '''
+    driven = set(evaluator.list_driven(nodes))
+    nodes = sorted(node for node in nodes if node not in driven)
+    states = evaluator.get_enabled(nodes)
+    costs = {node: 0.0 for node in nodes}
+    enabled = [node for node in nodes if states[node]]
+    if not enabled:
+        return costs
+
+    try:
+        baseline, noise_floor = measure_baseline(evaluator, repeat)
+        groups = [(enabled, _measure_disabled(
+            evaluator, enabled, baseline, repeat))]
+        while groups:
+            group, cost = groups.pop()
+            if cost <= noise_floor:
+                continue
+            if len(group) == 1 or cost <= minimum_cost:
+                for node in group:
+                    costs[node] = cost / len(group)
+                continue
+            middle = len(group) // 2
+            first, second = group[:middle], group[middle:]
+            first_cost = _measure_disabled(evaluator, first, baseline, repeat)
+            groups.append((second, max(cost - first_cost, 0.0)))
+            groups.append((first, first_cost))
+    finally:
+        evaluator.set_enabled(states)
+    return costs
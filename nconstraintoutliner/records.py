@@ -0,0 +1,139 @@
+"""
+This module contains the column store of the DynamicConstraint cached values,
+made for the scenes with tens of thousands of constraints. A DynamicConstraint
+is a slotted wrapper of its maya node and of a row of the store, the values
+are stored by columns in typed arrays instead of python objects by
+constraint: the strings and the components lists are stored once and
+referenced by id, the types are small ints and the colors are packed in one
+int.
+
+records = ConstraintRecords()
+row = records.allocate()
+records.set_components(row, ['pants', 'shirt'])
+records.get_components(row)  # ('pants', 'shirt'), shared by all the rows
+records.clear(row, ('components', ))  # not cached anymore
+records.release(row)
+
+The released rows are reused. The interned values are never removed, their
+count is bounded by the distinct names of the session. It doesn't import
+maya.
+"""
+
+from array import array
+
+
+UNSET = -1  # value of a cell which isn't cached
+COLUMNS = 'types', 'colors', 'nucleus', 'nice_names', 'components'
+
+
+def pack_color(r, g, b):
+    return (int(r) << 16) | (int(g) << 8) | int(b)
+
+
+def unpack_color(value):
+    return (value >> 16) & 255, (value >> 8) & 255, value & 255
+
+
+class InternTable(object):
+    ''' store each value (string, tuple) once and give it an integer id '''
+    __slots__ = '_ids', 'values'
+
+    def __init__(self):
+        self._ids = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def get_id(self, value):
+        identifier = self._ids.get(value)
+        if identifier is None:
+            identifier = len(self.values)
+            self._ids[value] = identifier
+            self.values.append(value)
+        return identifier
+
+    def intern(self, value):
+        ''' return the stored value equal to the given one '''
+        return self.values[self.get_id(value)]
+
+
+class ConstraintRecords(object):
+    '''
+    column store of the cached values, one row by DynamicConstraint. The
+    getters return None for the values which aren't cached.
+    '''
+    __slots__ = (
+        'strings', 'component_lists', 'types', 'colors', 'nucleus',
+        'nice_names', 'components', '_free_rows')
+
+    def __init__(self):
+        self.strings = InternTable()
+        # tuples of interned strings, many constraints share their cloths
+        self.component_lists = InternTable()
+        self.types = array('b')
+        self.colors = array('l')
+        self.nucleus = array('l')
+        self.nice_names = array('l')
+        self.components = array('l')
+        self._free_rows = []
+
+    def __len__(self):
+        ''' return the count of allocated rows '''
+        return len(self.types) - len(self._free_rows)
+
+    def allocate(self):
+        ''' return a row without cached value '''
+        if self._free_rows:
+            return self._free_rows.pop()
+        for column in COLUMNS:
+            getattr(self, column).append(UNSET)
+        return len(self.types) - 1
+
+    def release(self, row):
+        self.clear(row)
+        self._free_rows.append(row)
+
+    def clear(self, row, columns=COLUMNS):
+        for column in columns:
+            getattr(self, column)[row] = UNSET
+
+    def get_type(self, row):
+        value = self.types[row]
+        return None if value == UNSET else value
+
+    def set_type(self, row, constraint_type):
+        self.types[row] = constraint_type
+
+    def get_color(self, row):
+        value = self.colors[row]
+        return None if value == UNSET else unpack_color(value)
+
+    def set_color(self, row, color):
+        self.colors[row] = pack_color(*color)
+
+    def get_nucleus(self, row):
+        return self._get_string(self.nucleus, row)
+
+    def set_nucleus(self, row, nucleus):
+        self.nucleus[row] = self.strings.get_id(nucleus)
+
+    def get_nice_name(self, row):
+        return self._get_string(self.nice_names, row)
+
+    def set_nice_name(self, row, nice_name):
+        self.nice_names[row] = self.strings.get_id(nice_name)
+
+    def get_components(self, row):
+        identifier = self.components[row]
+        if identifier == UNSET:
+            return None
+        return self.component_lists.values[identifier]
+
+    def set_components(self, row, components):
+        components = tuple(self.strings.intern(c) for c in components)
+        self.components[row] = self.component_lists.get_id(components)
+
+    def _get_string(self, column, row):
+        identifier = column[row]
+        return None if identifier == UNSET else self.strings.values[identifier]
@@ -0,0 +1,89 @@
+"""
+This module contains a trigram index used to search the constraints by
+names, without any maya query. Each key (a constraint node) is indexed with
+a list of texts (parent name, nice name, type name, components names...).
+
+index = TrigramIndex()
+index.add('dynamicConstraintShape1', ['CTC_shirt_to_pants_DNC', 'shirt'])
+index.search('shirt') -> {'dynamicConstraintShape1'}
+index.search('shirt_pants', fuzzy=True) -> {'dynamicConstraintShape1'}
+"""
+
+
+FUZZY_THRESHOLD = 0.5
+
+
+def get_trigrams(text):
+    text = text.lower()
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+class TrigramIndex(object):
+
+    def __init__(self):
+        self._texts = {}
+        self._keys_by_trigram = {}
+
+    def __contains__(self, key):
+        return key in self._texts
+
+    def __len__(self):
+        return len(self._texts)
+
+    def clear(self):
+        self._texts = {}
+        self._keys_by_trigram = {}
+
+    def add(self, key, texts):
+        if key in self._texts:
+            self.remove(key)
+        texts = [text.lower() for text in texts if text]
+        self._texts[key] = texts
+        for text in texts:
+            for trigram in get_trigrams(text):
+                self._keys_by_trigram.setdefault(trigram, set()).add(key)
+
+    def remove(self, key):
+        texts = self._texts.pop(key, None)
+        if texts is None:
+            return
+        for text in texts:
+            for trigram in get_trigrams(text):
+                keys = self._keys_by_trigram.get(trigram)
+                if keys is None:
+                    continue
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_trigram[trigram]
+
+    def search(self, query, fuzzy=False):
+        '''
+        return the set of keys having a text containing the query. If fuzzy
+        is True, the keys sharing enough trigrams with the query are returned
+        too, it tolerates typos and missing letters.
+        '''
+        query = query.lower()
+        if not query:
+            return set(self._texts)
+
+        trigrams = get_trigrams(query)
+        if not trigrams:
+            # query too short to use the index
+            return set(
+                key for key, texts in self._texts.items()
+                if any(query in text for text in texts))
+
+        postings = sorted(
+            (self._keys_by_trigram.get(t, set()) for t in trigrams), key=len)
+        if not fuzzy:
+            candidates = set(postings[0]).intersection(*postings[1:])
+            return set(
+                key for key in candidates
+                if any(query in text for text in self._texts[key]))
+
+        scores = {}
+        for keys in postings:
+            for key in keys:
+                scores[key] = scores.get(key, 0) + 1
+        minimum = FUZZY_THRESHOLD * len(trigrams)
+        return set(key for key, score in scores.items() if score >= minimum)
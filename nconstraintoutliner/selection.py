@@ -1,17 +1,121 @@
 from functools import wraps
 from maya import cmds
+import maya.api.OpenMaya as om2
+
+
+REPLACE = 'replace'
+ADD = 'add'
+TOGGLE = 'toggle'
+# cmds.select flags, the selection changes must stay undoable
+SELECTION_MODES = {
+    REPLACE: 'replace',
+    ADD: 'add',
+    TOGGLE: 'toggle'}
+# nComponent componentType values
+COMPONENT_TYPES = {
+    2: om2.MFn.kMeshVertComponent,
+    3: om2.MFn.kMeshEdgeComponent,
+    4: om2.MFn.kMeshPolygonComponent}
+
+
+def get_selection():
+    ''' return a copy of the active selection as om2.MSelectionList '''
+    return om2.MSelectionList(om2.MGlobal.getActiveSelectionList())
+
+
+def set_selection(selection, mode=REPLACE):
+    '''
+    apply an om2.MSelectionList on the active selection with one cmds.select
+    (one undo). The components are given as compact ranges, like vtx[0:99].
+    MGlobal.setActiveSelectionList would be faster but isn't undoable.
+    '''
+    strings = selection.getSelectionStrings()
+    if strings:
+        cmds.select(strings, **{SELECTION_MODES[mode]: True})
+    elif mode == REPLACE:
+        cmds.select(clear=True)
+
+
+def build_nodes_selection(nodes, parents=False):
+    '''
+    return an om2.MSelectionList of the nodes. If parents is True, the
+    parents transforms of the shapes are added instead.
+    '''
+    selection = om2.MSelectionList()
+    for node in nodes:
+        selection.add(node)
+    if not parents:
+        return selection
+    transforms = om2.MSelectionList()
+    for i in range(selection.length()):
+        dagpath = selection.getDagPath(i)
+        dagpath.pop()
+        transforms.add(dagpath)
+    return transforms
+
+
+def build_memberships_selection(memberships):
+    '''
+    return an om2.MSelectionList of the constraints members. @memberships is
+    an iterable of (transform, component type, indices) tuples, see
+    DynamicConstraint.memberships. The members using the whole object are
+    selected as object.
+    '''
+    indices_by_key = {}
+    for transform, component_type, indices in memberships:
+        key = transform, component_type
+        if indices == 'all' or component_type not in COMPONENT_TYPES:
+            indices_by_key[key] = 'all'
+            continue
+        if indices_by_key.get(key) == 'all':
+            continue
+        if indices == 'borders':
+            indices = _get_border_vertices(transform)
+        indices_by_key.setdefault(key, set()).update(indices)
+
+    selection = om2.MSelectionList()
+    for (transform, component_type), indices in sorted(
+            indices_by_key.items(), key=lambda item: item[0]):
+        dagpath = om2.MSelectionList().add(transform).getDagPath(0)
+        if indices == 'all':
+            selection.add(dagpath)
+            continue
+        component = om2.MFnSingleIndexedComponent()
+        mobject = component.create(COMPONENT_TYPES[component_type])
+        component.addElements(sorted(indices))
+        selection.add((dagpath.extendToShape(), mobject))
+    return selection
+
+
+def _get_border_vertices(transform):
+    dagpath = om2.MSelectionList().add(transform).getDagPath(0)
+    iterator = om2.MItMeshVertex(dagpath.extendToShape())
+    indices = []
+    while not iterator.isDone():
+        if iterator.onBoundary():
+            indices.append(iterator.index())
+        iterator.next()
+    return indices
+
+
+def select_nodes(nodes, mode=REPLACE, parents=False):
+    set_selection(build_nodes_selection(nodes, parents), mode)
+
+
+def select_memberships(memberships, mode=REPLACE):
+    set_selection(build_memberships_selection(memberships), mode)
 
 
 def preserve_selection(func):
     '''
     this decorator save your maya selection before execute the
-    decorated function. And reselect it when it's executed. 
+    decorated function. And reselect it when it's executed.
     '''
     @wraps(func)
     def wrapper(*args, **kwargs):
-        selection = cmds.ls(sl=True)
+        selection = get_selection()
         result = func(*args, **kwargs)
-        cmds.select(selection)
+        set_selection(selection)
         return result
     return wrapper
 
@@ -23,7 +127,7 @@ def selection_required(func):
     '''
     @wraps(func)
     def wrapper(*args, **kwargs):
-        if not cmds.ls(selection=True):
+        if om2.MGlobal.getActiveSelectionList().isEmpty():
             return cmds.warning('Select at least one node')
         else:
             return func(*args, **kwargs)
@@ -43,9 +147,9 @@ class MayaSelectionManager(object):
         self.nodes = nodes
 
     def __enter__(self):
-        self.old_selection = cmds.ls(selection=True)
+        self.old_selection = get_selection()
         if self.nodes:
-            cmds.select(self.nodes)
+            select_nodes(self.nodes)
 
     def __exit__(self, type, value, traceback):
-        cmds.select(self.old_selection)  # retrieve original selection
+        set_selection(self.old_selection)  # retrieve original selection
@@ -0,0 +1,417 @@
+"""
+This module contains the process-wide index of the scene dynamic
+constraints. It owns one set of maya callbacks, shared by all the outliners
+and the scripts, and publishes the changes to its subscribers as deltas.
+
+def on_change(delta):
+    if delta.reset:
+        ...  # the scene changed completely, read get_nconstraint_index()
+    for nconstraint in delta.added: ...
+
+index = get_nconstraint_index()
+token = index.subscribe(on_change)
+index.list_nconstraints()
+...
+index.unsubscribe(token)
+
+The callbacks are registered with the first subscriber and removed with the
+last one. Without subscriber, the index isn't maintained and
+list_nconstraints scans the scene.
+
+The constraints of the hidden namespaces (and their nested namespaces) are
+skipped before any query, for all the subscribers:
+index.set_namespace_hidden('crowd', True)
+"""
+
+import logging
+from collections import OrderedDict, namedtuple
+from functools import partial
+from itertools import count
+
+from PySide2 import QtCore
+from maya import cmds
+import maya.OpenMaya as om
+
+from nconstraintoutliner.cache import (
+    get_nconstraints_signatures, load_nconstraints, save_nconstraints)
+from nconstraintoutliner.index import (
+    NO_REFERENCE, SceneIndex, get_namespace, get_nconstraints_references,
+    is_namespace_hidden, list_reference_children,
+    list_reference_nconstraints)
+from nconstraintoutliner.nconstraint import (
+    RENAME_TEMPORARY_PREFIX, DynamicConstraint)
+
+
+# reset: the whole scene changed, the subscribers have to read it again.
+# added, removed: DynamicConstraint tuples.
+# changed: dict {previous node name: DynamicConstraint} of the constraints
+# renamed, whose transform or components were renamed, or edited outside
+# the tool (found at the scene save).
+# reference: the reference node loading or unloading the constraints, None
+# for the changes made in the scene.
+IndexDelta = namedtuple(
+    'IndexDelta', ['reset', 'added', 'removed', 'changed', 'reference'])
+RESET_EVENTS = (
+    om.MSceneMessage.kAfterNew,
+    om.MSceneMessage.kAfterImport,
+    om.MSceneMessage.kAfterOpen)
+REFERENCE_CHANGE_STARTED_EVENTS = (
+    om.MSceneMessage.kBeforeCreateReference,
+    om.MSceneMessage.kBeforeLoadReference)
+REFERENCE_CHANGE_ENDED_EVENTS = (
+    om.MSceneMessage.kAfterRemoveReference,
+    om.MSceneMessage.kAfterUnloadReference)
+REFERENCE_LOADED_EVENTS = (
+    om.MSceneMessage.kAfterCreateReference,
+    om.MSceneMessage.kAfterLoadReference)
+REFERENCE_UNLOADING_EVENTS = (
+    om.MSceneMessage.kBeforeRemoveReference,
+    om.MSceneMessage.kBeforeUnloadReference)
+_index = None
+
+
+def get_nconstraint_index():
+    ''' return the NConstraintIndex shared by the whole maya session '''
+    global _index
+    if _index is None:
+        _index = NConstraintIndex()
+    return _index
+
+
+def create_delta(
+        reset=False, added=(), removed=(), changed=None, reference=None):
+    return IndexDelta(
+        reset, tuple(added), tuple(removed), changed or {}, reference)
+
+
+class NConstraintIndex(object):
+    '''
+    index of the scene constraints kept up to date by the maya callbacks
+    while it has subscribers. The DynamicConstraint instances are shared
+    with the subscribers, their cached values are computed once.
+    '''
+
+    def __init__(self):
+        self.scene_index = SceneIndex()
+        self.references = {}  # {node long name: reference node}
+        self.hidden_namespaces = set()
+        self._subscribers = OrderedDict()
+        self._tokens = count()
+        self._callbacks = []
+        self._reference_changing = False
+        # {node: signature} when the cached values were read, see
+        # cache.get_nconstraints_signatures
+        self._signatures = {}
+        # the renames are published in one delta, after the rename command:
+        # {id: (previous name, DynamicConstraint)}
+        self._pending_changed = {}
+        # {temporary name: name before rename_nconstraints}
+        self._temporary_names = {}
+
+    @property
+    def active(self):
+        return bool(self._subscribers)
+
+    def subscribe(self, callback):
+        '''
+        call @callback with an IndexDelta after each change. Return the token
+        needed to unsubscribe. The first subscriber builds the index.
+        '''
+        token = next(self._tokens)
+        self._subscribers[token] = callback
+        if len(self._subscribers) == 1:
+            self._register_callbacks()
+            self._build()
+        return token
+
+    def unsubscribe(self, token):
+        ''' the last subscriber removes the callbacks and clears the index '''
+        if self._subscribers.pop(token, None) is None:
+            return
+        if self._subscribers:
+            return
+        self._unregister_callbacks()
+        self.scene_index.clear()
+        self.references = {}
+        self._signatures = {}
+        self._pending_changed = {}
+        self._temporary_names = {}
+
+    def list_nconstraints(self):
+        '''
+        return the DynamicConstraint list sorted by name, from the index if
+        it's maintained, from the scene if not.
+        '''
+        if self.active:
+            return self.scene_index.list_nconstraints()
+        nconstraints = load_nconstraints(self.hidden_namespaces)
+        return self._scan() if nconstraints is None else nconstraints
+
+    def get_reference(self, nconstraint):
+        return self.references.get(nconstraint.fullpathname, NO_REFERENCE)
+
+    def is_hidden(self, node):
+        return is_namespace_hidden(
+            get_namespace(node), self.hidden_namespaces)
+
+    def set_namespace_hidden(self, namespace, state):
+        '''
+        hide or show the constraints of a namespace and of its nested
+        namespaces. The changes are published by reference partition.
+        '''
+        if state == (namespace in self.hidden_namespaces):
+            return
+        if state:
+            self.hidden_namespaces.add(namespace)
+        else:
+            self.hidden_namespaces.discard(namespace)
+        if not self.active:
+            return
+        if state:
+            nconstraints = [
+                dc for dc in self.scene_index.list_nconstraints()
+                if self.is_hidden(dc.nodename)]
+            for dc in nconstraints:
+                self.scene_index.remove(dc.nodename)
+        else:
+            nconstraints = [
+                self.scene_index.add(node) for node in self._list_nodes()
+                if node not in self.scene_index]
+        partitions = {}
+        for nconstraint in nconstraints:
+            partitions.setdefault(
+                self.get_reference(nconstraint), []).append(nconstraint)
+        for reference, partition in sorted(partitions.items()):
+            if state:
+                delta = create_delta(removed=partition, reference=reference)
+            else:
+                delta = create_delta(added=partition, reference=reference)
+            self._publish(delta)
+
+    def _list_nodes(self):
+        ''' return the constraints nodes, except the hidden ones '''
+        return [
+            node for node in cmds.ls(type='dynamicConstraint')
+            if not self.is_hidden(node)]
+
+    def _scan(self):
+        return [DynamicConstraint(node) for node in self._list_nodes()]
+
+    def rebuild(self):
+        ''' rescan the scene and send a reset to the subscribers '''
+        self._reference_changing = False
+        self._pending_changed = {}
+        self._temporary_names = {}
+        self._build()
+        self._publish(create_delta(reset=True))
+
+    def _build(self):
+        nconstraints = load_nconstraints(self.hidden_namespaces)
+        scanned = nconstraints is None
+        if scanned:
+            nconstraints = self._scan()
+        # the index build queries the values which weren't in the cache
+        self.scene_index.build(nconstraints)
+        self._signatures = get_nconstraints_signatures(
+            sorted(self.scene_index.nconstraints))
+        if scanned:
+            save_nconstraints(nconstraints, self._signatures)
+        self.references = get_nconstraints_references()
+
+    def _publish(self, delta):
+        # the pending renames are published first, the subscribers know the
+        # nodes of the next deltas by their new names
+        if self._pending_changed:
+            self._publish_pending_changed()
+        for callback in list(self._subscribers.values()):
+            try:
+                callback(delta)
+            except Exception:
+                logging.exception('nconstraint index subscriber failed')
+
+    def _register_callbacks(self):
+        cb = om.MDGMessage.addNodeRemovedCallback(
+            self._remove_node_callback, 'dynamicConstraint')
+        self._callbacks.append(cb)
+        cb = om.MDGMessage.addNodeAddedCallback(
+            self._created_node_callback, 'dynamicConstraint')
+        self._callbacks.append(cb)
+        for event in RESET_EVENTS:
+            cb = om.MSceneMessage.addCallback(event, self._reset_callback)
+            self._callbacks.append(cb)
+        for event in REFERENCE_CHANGE_STARTED_EVENTS:
+            cb = om.MSceneMessage.addCallback(
+                event, self._reference_change_started)
+            self._callbacks.append(cb)
+        for event in REFERENCE_CHANGE_ENDED_EVENTS:
+            cb = om.MSceneMessage.addCallback(
+                event, self._reference_change_ended)
+            self._callbacks.append(cb)
+        for event in REFERENCE_LOADED_EVENTS:
+            cb = om.MSceneMessage.addReferenceCallback(
+                event, self._reference_loaded_callback)
+            self._callbacks.append(cb)
+        for event in REFERENCE_UNLOADING_EVENTS:
+            cb = om.MSceneMessage.addReferenceCallback(
+                event, self._reference_unloading_callback)
+            self._callbacks.append(cb)
+        cb = om.MSceneMessage.addCallback(
+            om.MSceneMessage.kAfterSave, self._after_save_callback)
+        self._callbacks.append(cb)
+        cb = om.MNodeMessage.addNameChangedCallback(
+            om.MObject(), self._name_changed_callback)
+        self._callbacks.append(cb)
+
+    def _unregister_callbacks(self):
+        for callback in self._callbacks:
+            om.MMessage.removeCallback(callback)
+        self._callbacks = []
+
+    def _reset_callback(self, *unused_callbacks_args):
+        self.rebuild()
+
+    def _after_save_callback(self, *unused_callbacks_args):
+        '''
+        the constraints edited outside the tool since their values were
+        cached (members, type or nucleus changed) are queried and indexed
+        again before the values are saved in the disk cache
+        '''
+        nconstraints = self.scene_index.list_nconstraints()
+        signatures = get_nconstraints_signatures(
+            dc.nodename for dc in nconstraints)
+        changed = {
+            dc.nodename: dc for dc in nconstraints
+            if self._signatures.get(dc.nodename) != signatures.get(
+                dc.nodename)}
+        self._signatures = signatures
+        if changed:
+            self._reindex(changed)
+            self._publish(create_delta(changed=changed))
+        save_nconstraints(nconstraints, signatures)
+
+    def _reference_change_started(self, *unused_callbacks_args):
+        # the nodes are handled by reference, not node by node
+        self._reference_changing = True
+
+    def _reference_change_ended(self, *unused_callbacks_args):
+        self._reference_changing = False
+
+    def _reference_loaded_callback(self, mobject, *unused_callbacks_args):
+        self._reference_changing = False
+        reference = om.MFnDependencyNode(mobject).name()
+        for reference in [reference] + list_reference_children(reference):
+            nodes = list_reference_nconstraints(reference)
+            added = []
+            for node in nodes:
+                self.references[node] = reference
+                if self.is_hidden(node):
+                    continue
+                nconstraint = DynamicConstraint(node)
+                added.append(self.scene_index.add(
+                    nconstraint.nodename, nconstraint))
+            if added:
+                self._publish(create_delta(added=added, reference=reference))
+
+    def _reference_unloading_callback(self, mobject, *unused_callbacks_args):
+        # called before the unload, the nodes still exist
+        self._reference_changing = True
+        reference = om.MFnDependencyNode(mobject).name()
+        for reference in [reference] + list_reference_children(reference):
+            nodes = [
+                node for node, node_reference in self.references.items()
+                if node_reference == reference]
+            removed = []
+            for node in nodes:
+                del self.references[node]
+                nconstraint = self.scene_index.remove(node.split('|')[-1])
+                if nconstraint is not None:
+                    removed.append(nconstraint)
+            if removed:
+                self._publish(
+                    create_delta(removed=removed, reference=reference))
+
+    def _remove_node_callback(self, mobject, *unused_callbacks_args):
+        if self._reference_changing:
+            return
+        nconstraint = self.scene_index.remove(om.MFnDagNode(mobject).name())
+        if nconstraint is not None:
+            self._publish(create_delta(removed=[nconstraint]))
+
+    def _created_node_callback(self, mobject, *unused_callbacks_args):
+        if self._reference_changing:
+            return
+        nconstraint = DynamicConstraint(om.MFnDagNode(mobject).name())
+        # the node is not connected yet to its nucleus and components
+        QtCore.QTimer.singleShot(
+            0, partial(self._index_created_node, nconstraint))
+
+    def _index_created_node(self, nconstraint):
+        if not self.active or not cmds.objExists(nconstraint.nodename):
+            return
+        if self.is_hidden(nconstraint.nodename):
+            return
+        nconstraint.invalidate()
+        self.scene_index.add(nconstraint.nodename, nconstraint)
+        self._publish(create_delta(added=[nconstraint]))
+
+    def _name_changed_callback(self, mobject, previous_name, *unused_args):
+        '''
+        the constraints are indexed by name. A renamed constraint is moved to
+        its new name, its cached values stay valid, like the ones of a
+        constraint whose transform is renamed. Only the constraints using a
+        renamed component query their components again. The temporary names
+        of rename_nconstraints are skipped.
+        '''
+        if self._reference_changing or not previous_name:
+            return
+        fn = om.MFnDependencyNode(mobject)
+        name = fn.name()
+        if name.startswith(RENAME_TEMPORARY_PREFIX):
+            self._temporary_names[name] = previous_name
+            return
+        previous_name = self._temporary_names.pop(previous_name, previous_name)
+        if mobject.hasFn(om.MFn.kTransform):
+            self._transform_renamed(mobject, previous_name)
+        elif fn.typeName() == 'dynamicConstraint':
+            nconstraint = self.scene_index.rename(previous_name, name)
+            if nconstraint is None:
+                return
+            if previous_name in self._signatures:
+                self._signatures[name] = self._signatures.pop(previous_name)
+            self._queue_changed(previous_name, nconstraint)
+
+    def _transform_renamed(self, mobject, previous_name):
+        fn = om.MFnDagNode(mobject)
+        for i in range(fn.childCount()):
+            child = om.MFnDagNode(fn.child(i)).name()
+            nconstraint = self.scene_index.nconstraints.get(child)
+            if nconstraint is not None:
+                self._queue_changed(child, nconstraint)
+        for node in self.scene_index.list_nodes(component=previous_name):
+            nconstraint = self.scene_index.remove(node)
+            nconstraint.invalidate_components()
+            self.scene_index.add(node, nconstraint)
+            self._queue_changed(node, nconstraint)
+
+    def _queue_changed(self, previous_name, nconstraint):
+        '''
+        rename_nconstraints fires two callbacks by node, the changes are
+        published in one delta once the command is done
+        '''
+        if not self._pending_changed:
+            QtCore.QTimer.singleShot(0, self._publish_pending_changed)
+        # a constraint renamed twice is published with its first name
+        self._pending_changed.setdefault(
+            id(nconstraint), (previous_name, nconstraint))
+
+    def _publish_pending_changed(self):
+        pending, self._pending_changed = self._pending_changed, {}
+        if pending and self.active:
+            self._publish(create_delta(changed=dict(pending.values())))
+
+    def _reindex(self, nconstraints_by_previous_name):
+        for node, nconstraint in nconstraints_by_previous_name.items():
+            self.scene_index.remove(node)
+            # the components names are cached
+            nconstraint.invalidate()
+            self.scene_index.add(nconstraint.nodename, nconstraint)
@@ -0,0 +1,217 @@
+"""
+This module captures the settings of dynamic constraints in snapshots and
+restores them, to switch between several setups of a rig. A snapshot
+contains all the writable attributes of the dynamicConstraint node type,
+the enable and the constraint type included, read in one numpy matrix.
+
+snapshot = capture_snapshot(cmds.ls(type='dynamicConstraint'))
+store_snapshot('soft', snapshot)
+...
+restore_snapshot(get_snapshot('soft'))
+
+Restoring only writes the attributes which are different from the current
+state, in one modifier and one undo. The snapshots can be saved as .npz
+files with save_snapshot and load_snapshot.
+"""
+
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from maya import cmds
+import maya.api.OpenMaya as om2
+
+from nconstraintoutliner.history import operation
+from nconstraintoutliner.modifier import commit
+from nconstraintoutliner.nconstraint import TYPE_ATTR_NAME
+
+
+Snapshot = namedtuple('Snapshot', ['nodes', 'uuids', 'attributes', 'values'])
+SNAPSHOT_IGNORED_ATTRIBUTES = (
+    'isHistoricallyInteresting', 'caching', 'frozen', 'nodeState')
+SNAPSHOT_EXTENSION = '.npz'
+_NUMERIC_TYPES = (
+    om2.MFnNumericData.kBoolean, om2.MFnNumericData.kByte,
+    om2.MFnNumericData.kChar, om2.MFnNumericData.kShort,
+    om2.MFnNumericData.kInt, om2.MFnNumericData.kFloat,
+    om2.MFnNumericData.kDouble)
+_attributes_cache = []
+_snapshots = OrderedDict()
+
+
+def get_snapshot_attributes():
+    '''
+    return the writable scalar attributes declared by the dynamicConstraint
+    node type (not by its parent types), plus the custom type attribute.
+    '''
+    if _attributes_cache:
+        return list(_attributes_cache)
+    node_types = cmds.nodeType(
+        'dynamicConstraint', inherited=True, isTypeName=True)
+    inherited = set(_list_attributes(node_types[-2], writable_only=False))
+    attributes = [
+        attribute for attribute in _list_attributes('dynamicConstraint')
+        if attribute not in inherited and
+        attribute not in SNAPSHOT_IGNORED_ATTRIBUTES]
+    _attributes_cache.extend(sorted(attributes) + [TYPE_ATTR_NAME])
+    return list(_attributes_cache)
+
+
+def _list_attributes(node_type, writable_only=True):
+    attributes = om2.MNodeClass(node_type).getAttributes()
+    names = []
+    for i in range(len(attributes)):
+        mobject = attributes[i]
+        fn = om2.MFnAttribute(mobject)
+        if writable_only and (not fn.writable or fn.array):
+            continue
+        if mobject.hasFn(om2.MFn.kNumericAttribute):
+            numeric_type = om2.MFnNumericAttribute(mobject).numericType()
+            if numeric_type not in _NUMERIC_TYPES:
+                continue
+        elif not (
+                mobject.hasFn(om2.MFn.kEnumAttribute) or
+                mobject.hasFn(om2.MFn.kUnitAttribute)):
+            continue
+        names.append(fn.name)
+    return names
+
+
+def get_plugs(nodes, attributes):
+    '''
+    return a list of plug lists, one by node. The attributes the node doesn't
+    have get None.
+    '''
+    selection = om2.MSelectionList()
+    for node in nodes:
+        selection.add(node)
+    plugs = []
+    for i in range(selection.length()):
+        fn = om2.MFnDependencyNode(selection.getDependNode(i))
+        plugs.append([
+            fn.findPlug(attribute, False) if fn.hasAttribute(attribute)
+            else None for attribute in attributes])
+    return plugs
+
+
+def read_values(plugs):
+    ''' return the plugs values as a matrix, nan for the missing plugs '''
+    values = np.full(
+        (len(plugs), len(plugs[0]) if plugs else 0), np.nan, dtype=np.float64)
+    for row, node_plugs in enumerate(plugs):
+        for column, plug in enumerate(node_plugs):
+            if plug is not None:
+                values[row, column] = plug.asDouble()
+    return values
+
+
+def capture_snapshot(nodes):
+    ''' return a Snapshot of the given dynamic constraints '''
+    nodes = list(nodes)
+    attributes = get_snapshot_attributes()
+    uuids = cmds.ls(nodes, uuid=True) if nodes else []
+    values = read_values(get_plugs(nodes, attributes))
+    return Snapshot(nodes, uuids, attributes, values)
+
+
+def resolve_snapshot_nodes(snapshot):
+    '''
+    return the current node names of the snapshot nodes, found by uuid then
+    by name. The nodes deleted since the capture get None.
+    '''
+    nodes = []
+    for node, uuid in zip(snapshot.nodes, snapshot.uuids):
+        names = cmds.ls(uuid) if uuid else []
+        if not names and cmds.objExists(node):
+            names = [node]
+        nodes.append(names[0] if names else None)
+    return nodes
+
+
+def diff_snapshot(snapshot, tolerance=1e-6):
+    '''
+    return the list of (node, attribute, snapshot value) which are different
+    in the current scene.
+    '''
+    nodes = resolve_snapshot_nodes(snapshot)
+    rows = [row for row, node in enumerate(nodes) if node is not None]
+    if not rows:
+        return []
+    existing = [nodes[row] for row in rows]
+    plugs = get_plugs(existing, snapshot.attributes)
+    expected = np.asarray(snapshot.values)[rows]
+    current = read_values(plugs)
+    with np.errstate(invalid='ignore'):
+        changed = np.abs(current - expected) > tolerance
+    changed &= ~np.isnan(current) & ~np.isnan(expected)
+    return [
+        (existing[row], snapshot.attributes[column], expected[row, column])
+        for row, column in zip(*np.nonzero(changed))]
+
+
+def restore_snapshot(snapshot):
+    '''
+    write the snapshot values which are different from the current ones,
+    with one modifier. return the list of nodes changed.
+    '''
+    changes = diff_snapshot(snapshot)
+    if not changes:
+        return []
+    modifier = om2.MDGModifier()
+    selection = om2.MSelectionList()
+    for node, attribute, value in changes:
+        selection.add('{}.{}'.format(node, attribute))
+    for i, (_, _, value) in enumerate(changes):
+        _set_plug_value(modifier, selection.getPlug(i), value)
+    nodes = sorted(set(node for node, _, _ in changes))
+    with operation(nodes, 'restore_snapshot'):
+        commit(modifier)
+    return nodes
+
+
+def _set_plug_value(modifier, plug, value):
+    attribute = plug.attribute()
+    if attribute.hasFn(om2.MFn.kNumericAttribute):
+        numeric_type = om2.MFnNumericAttribute(attribute).numericType()
+        if numeric_type == om2.MFnNumericData.kBoolean:
+            return modifier.newPlugValueBool(plug, bool(value))
+        if numeric_type in (om2.MFnNumericData.kFloat,
+                            om2.MFnNumericData.kDouble):
+            return modifier.newPlugValueDouble(plug, float(value))
+        return modifier.newPlugValueInt(plug, int(round(value)))
+    if attribute.hasFn(om2.MFn.kEnumAttribute):
+        return modifier.newPlugValueInt(plug, int(round(value)))
+    modifier.newPlugValueDouble(plug, float(value))
+
+
+def store_snapshot(name, snapshot):
+    _snapshots[name] = snapshot
+
+
+def get_snapshot(name):
+    return _snapshots[name]
+
+
+def delete_snapshot(name):
+    _snapshots.pop(name, None)
+
+
+def list_snapshots():
+    return list(_snapshots)
+
+
+def save_snapshot(snapshot, filepath):
+    if not filepath.endswith(SNAPSHOT_EXTENSION):
+        filepath += SNAPSHOT_EXTENSION
+    np.savez_compressed(
+        filepath, nodes=np.array(snapshot.nodes, dtype=np.str_),
+        uuids=np.array(snapshot.uuids, dtype=np.str_),
+        attributes=np.array(snapshot.attributes, dtype=np.str_),
+        values=snapshot.values)
+    return filepath
+
+
+def load_snapshot(filepath):
+    with np.load(filepath, allow_pickle=False) as data:
+        return Snapshot(
+            data['nodes'].tolist(), data['uuids'].tolist(),
+            data['attributes'].tolist(), data['values'])
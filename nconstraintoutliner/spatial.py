@@ -0,0 +1,59 @@
+"""
+This module contains the spatial queries used on the meshes vertices. It
+uses the scipy kd-tree when scipy is available in maya, else a numpy brute
+force search processed by chunks to keep the memory usage low.
+"""
+
+import numpy as np
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+BRUTE_FORCE_CHUNK_SIZE = 1024
+
+
+def nearest_neighbours(points, queries):
+    '''
+    return the indices of the nearest points for each query point and the
+    distances. Both arguments are (n, 3) arrays.
+    '''
+    points = np.asarray(points, dtype=np.float64)
+    queries = np.asarray(queries, dtype=np.float64)
+    if not len(queries):
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    if cKDTree is not None:
+        distances, indices = cKDTree(points).query(queries)
+        return indices, distances
+
+    indices = np.empty(len(queries), dtype=np.int64)
+    distances = np.empty(len(queries))
+    for start in range(0, len(queries), BRUTE_FORCE_CHUNK_SIZE):
+        chunk = queries[start:start + BRUTE_FORCE_CHUNK_SIZE]
+        squared = ((chunk[:, np.newaxis, :] - points[np.newaxis]) ** 2).sum(2)
+        chunk_indices = squared.argmin(axis=1)
+        indices[start:start + len(chunk)] = chunk_indices
+        distances[start:start + len(chunk)] = np.sqrt(
+            squared[np.arange(len(chunk)), chunk_indices])
+    return indices, distances
+
+
+def polygons_edges(counts, vertices):
+    '''
+    return an (n, 2) array of the unique edges of a polygonal mesh, from the
+    maya MFnMesh.getVertices() result: vertices count by polygon and the
+    flat polygons vertices list.
+    '''
+    counts = np.asarray(counts, dtype=np.int64)
+    vertices = np.asarray(vertices, dtype=np.int64)
+    if not len(vertices):
+        return np.zeros((0, 2), dtype=np.int64)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    ends = np.repeat(np.cumsum(counts), counts)
+    following = np.arange(len(vertices)) + 1
+    # the last vertex of a polygon is linked to the first one
+    following[following == ends] = starts[following == ends]
+    edges = np.sort(np.stack([vertices, vertices[following]], axis=1), axis=1)
+    return np.unique(edges, axis=0)
@@ -0,0 +1,200 @@
+"""
+This module finds the broken dynamic constraints and the dead nComponents,
+which are still evaluated by the nucleus without doing anything:
+- dangling nComponents: connected to a constraint, but without nBase or
+  without mesh.
+- orphan nComponents: not connected to any constraint.
+- empty constraints: without nComponent, or with only dangling or empty
+  nComponents (an indices list without index).
+- hidden constraints: all their meshes are hidden or intermediate objects.
+
+report = sweep_scene()
+print(format_sweep_report(report))
+clean_sweep(report)
+
+The connections of all the nComponents are read in one pass, the meshes are
+resolved once by nBase. The cleanup is done in one modifier (one undo). The
+hidden constraints are only reported by default, a mesh can be hidden on
+purpose.
+"""
+
+from collections import OrderedDict, namedtuple
+from timeit import default_timer
+
+from maya import cmds
+import maya.api.OpenMaya as om2
+
+from nconstraintoutliner.history import operation
+from nconstraintoutliner.modifier import commit
+from nconstraintoutliner.nconstraint import (
+    NCOMPONENT_ELEMENTS, find_type_in_history, list_exclusive_ncomponents)
+
+
+SweepReport = namedtuple(
+    'SweepReport', [
+        'dangling_ncomponents', 'dangling_nconstraints',
+        'orphan_ncomponents', 'empty_nconstraints', 'hidden_nconstraints',
+        'timings'])
+SWEEP_CATEGORIES = (
+    'dangling_ncomponents', 'orphan_ncomponents', 'empty_nconstraints',
+    'hidden_nconstraints')
+DEFAULT_CLEANED_CATEGORIES = (
+    'dangling_ncomponents', 'orphan_ncomponents', 'empty_nconstraints')
+
+
+def list_connected_nodes(nodes, node_type):
+    '''
+    return a dict {node: set of connected nodes of the type}, with one
+    listConnections for all the nodes.
+    '''
+    if not nodes:
+        return {}
+    connections = cmds.listConnections(
+        nodes, type=node_type, shapes=True, connections=True) or []
+    connected = {}
+    for plug, other in zip(connections[::2], connections[1::2]):
+        connected.setdefault(plug.split('.')[0], set()).add(other)
+    return connected
+
+
+def is_shape_visible(shape):
+    ''' the parents visibilities are included '''
+    if cmds.getAttr(shape + '.intermediateObject'):
+        return False
+    return om2.MSelectionList().add(shape).getDagPath(0).isVisible()
+
+
+def get_nbase_mesh(nbase):
+    '''
+    return the shape simulated by the nBase and its visibility, (None, False)
+    if the mesh was deleted. It's the output mesh first, like in
+    get_component_transform.
+    '''
+    if cmds.nodeType(nbase) == 'nParticle':
+        return nbase, is_shape_visible(nbase)
+    mesh = (
+        find_type_in_history(nbase, nodetype='mesh', future=True, past=False)
+        or find_type_in_history(
+            nbase, nodetype='mesh', future=False, past=True))
+    if not mesh:
+        return None, False
+    return mesh, is_shape_visible(mesh)
+
+
+def is_ncomponent_empty(ncomponent):
+    ''' an indices nComponent without index has no member '''
+    element = NCOMPONENT_ELEMENTS[cmds.getAttr(ncomponent + '.elements')]
+    if element != 'indices':
+        return False
+    return not cmds.getAttr(ncomponent + '.componentIndices')
+
+
+def sweep_scene():
+    ''' return a SweepReport of the current scene '''
+    timings = OrderedDict()
+    start = default_timer()
+    ncomponents = cmds.ls(type='nComponent')
+    nconstraints = cmds.ls(type='dynamicConstraint')
+    nconstraints_by_ncomponent = list_connected_nodes(
+        ncomponents, 'dynamicConstraint')
+    nbases_by_ncomponent = list_connected_nodes(ncomponents, 'nBase')
+    timings['connections'] = default_timer() - start
+
+    start = default_timer()
+    meshes = {}
+    for nbases in nbases_by_ncomponent.values():
+        for nbase in nbases:
+            if nbase not in meshes:
+                meshes[nbase] = get_nbase_mesh(nbase)
+    timings['meshes'] = default_timer() - start
+
+    start = default_timer()
+    orphans = []
+    dangling = []
+    # nComponents with members: their meshes visibilities
+    visibilities = {}
+    ncomponents_by_nconstraint = {node: [] for node in nconstraints}
+    for ncomponent in ncomponents:
+        connected = nconstraints_by_ncomponent.get(ncomponent)
+        if not connected:
+            orphans.append(ncomponent)
+            continue
+        for nconstraint in connected:
+            ncomponents_by_nconstraint.setdefault(
+                nconstraint, []).append(ncomponent)
+        shapes = [
+            meshes[nbase] for nbase in nbases_by_ncomponent.get(
+                ncomponent, ())]
+        if not shapes or any(shape is None for shape, _ in shapes):
+            dangling.append(ncomponent)
+        elif not is_ncomponent_empty(ncomponent):
+            visibilities[ncomponent] = all(visible for _, visible in shapes)
+
+    dangling_set = set(dangling)
+    dangling_nconstraints = []
+    empty = []
+    hidden = []
+    for nconstraint, connected in sorted(ncomponents_by_nconstraint.items()):
+        if dangling_set.intersection(connected):
+            dangling_nconstraints.append(nconstraint)
+        alive = [c for c in connected if c in visibilities]
+        if not alive:
+            empty.append(nconstraint)
+        elif not any(visibilities[c] for c in alive):
+            hidden.append(nconstraint)
+    timings['classification'] = default_timer() - start
+
+    return SweepReport(
+        sorted(dangling), dangling_nconstraints, sorted(orphans), empty,
+        hidden, timings)
+
+
+def format_sweep_report(report):
+    lines = [
+        '{} dangling nComponents, on {} constraints'.format(
+            len(report.dangling_ncomponents),
+            len(report.dangling_nconstraints)),
+        '{} orphan nComponents'.format(len(report.orphan_ncomponents)),
+        '{} empty constraints'.format(len(report.empty_nconstraints)),
+        '{} constraints on hidden meshes'.format(
+            len(report.hidden_nconstraints))]
+    lines.append('sweep time: ' + ', '.join(
+        '{} {:.1f} ms'.format(step, duration * 1000)
+        for step, duration in report.timings.items()))
+    return '\n'.join(lines)
+
+
+def clean_sweep(report, categories=DEFAULT_CLEANED_CATEGORIES):
+    '''
+    delete the nodes of the report categories in one modifier (one undo):
+    the dangling and orphan nComponents, and the empty or hidden constraints
+    with their transform and their own nComponents. Deleting a dangling
+    nComponent disconnects it from its constraints. Return the deleted
+    nodes.
+    '''
+    nodes = []
+    nconstraints = []
+    for category in categories:
+        if category not in SWEEP_CATEGORIES:
+            raise ValueError('unknown sweep category: {}'.format(category))
+        if category in ('empty_nconstraints', 'hidden_nconstraints'):
+            nconstraints.extend(getattr(report, category))
+        else:
+            nodes.extend(getattr(report, category))
+    if nconstraints:
+        nodes.extend(list_exclusive_ncomponents(nconstraints))
+        nodes.extend(cmds.listRelatives(
+            nconstraints, parent=True, fullPath=True) or [])
+    nodes = [
+        node for node in OrderedDict.fromkeys(nodes) if cmds.objExists(node)]
+    if not nodes:
+        return []
+    modifier = om2.MDagModifier()
+    selection = om2.MSelectionList()
+    for node in nodes:
+        selection.add(node)
+    for i in range(selection.length()):
+        modifier.deleteNode(selection.getDependNode(i))
+    with operation([], 'clean_sweep'):
+        commit(modifier)
+    return nodes
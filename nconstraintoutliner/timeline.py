@@ -0,0 +1,151 @@
+"""
+This module evaluates the animated enable, strength and glue strength of
+the dynamic constraints on a frame range, as numpy arrays. The anim curves
+are read once with MFnAnimCurve and evaluated for all the frames together,
+there's no getAttr by frame. The evaluated curves are cached until they are
+edited.
+
+cache = CurvesCache()
+frames = np.arange(1, 301)
+values = evaluate_nconstraints(nodes, frames, cache)
+values['dynamicConstraintShape1']['enable'] -> array of 300 values
+activities = compute_activities(values)
+"""
+
+import numpy as np
+from maya import cmds
+import maya.api.OpenMaya as om2
+
+
+ANIMATED_ATTRIBUTES = 'enable', 'strength', 'glueStrength'
+_CONSTANT_INFINITY = om2.MFnAnimCurve.kConstant
+
+
+def get_driving_curves(nodes, attributes=ANIMATED_ATTRIBUTES):
+    '''
+    return a dict {(node, attribute): anim curve} of the animated plugs. All
+    the connections are queried in one call.
+    '''
+    if not nodes:
+        return {}
+    connections = cmds.listConnections(
+        nodes, type='animCurve', source=True, destination=False,
+        connections=True, plugs=False) or []
+    curves = {}
+    for plug, curve in zip(connections[::2], connections[1::2]):
+        node, _, attribute = plug.partition('.')
+        if attribute in attributes:
+            curves[(node, attribute)] = curve
+    return curves
+
+
+def evaluate_curve(curve, frames):
+    '''
+    return the anim curve values on the frames as an array. The stepped and
+    linear curves with constant infinities are evaluated with numpy, the
+    other ones with MFnAnimCurve.evaluate.
+    '''
+    mobject = om2.MSelectionList().add(curve).getDependNode(0)
+    fn = om2.MFnAnimCurve(mobject)
+    frames = np.asarray(frames, dtype=np.float64)
+    count = fn.numKeys
+    if not count:
+        return np.zeros(len(frames))
+    unit = om2.MTime.uiUnit()
+    times = np.array([fn.input(i).asUnits(unit) for i in range(count)])
+    values = np.array([fn.value(i) for i in range(count)])
+
+    constant_infinity = (
+        fn.preInfinityType == _CONSTANT_INFINITY and
+        fn.postInfinityType == _CONSTANT_INFINITY)
+    out_tangents = set(fn.outTangentType(i) for i in range(count - 1))
+    in_tangents = set(fn.inTangentType(i) for i in range(1, count))
+    if constant_infinity and not fn.isUnitlessInput:
+        step = om2.MFnAnimCurve.kTangentStep
+        if count == 1 or out_tangents == set([step]):
+            indices = np.searchsorted(times, frames, side='right') - 1
+            return values[np.clip(indices, 0, count - 1)]
+        linear = om2.MFnAnimCurve.kTangentLinear
+        if out_tangents | in_tangents == set([linear]):
+            return np.interp(frames, times, values)
+
+    return np.array([
+        fn.evaluate(om2.MTime(frame, unit)) for frame in frames])
+
+
+class CurvesCache(object):
+    '''
+    cache of the evaluated curves by curve name and frame range. The curves
+    edited have to be invalidated, see om.MAnimMessage.
+    '''
+
+    def __init__(self):
+        self._values = {}
+
+    def clear(self):
+        self._values = {}
+
+    def invalidate(self, curves):
+        for curve in curves:
+            self._values.pop(curve, None)
+
+    def evaluate(self, curve, frames):
+        key = frames[0], frames[-1], len(frames)
+        cached = self._values.get(curve)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        values = evaluate_curve(curve, frames)
+        self._values[curve] = key, values
+        return values
+
+
+def evaluate_nconstraints(
+        nodes, frames, cache=None, attributes=ANIMATED_ATTRIBUTES):
+    '''
+    return a dict {node: {attribute: array}}. The attributes not animated
+    are read once and repeated on all the frames.
+    '''
+    cache = cache or CurvesCache()
+    frames = np.asarray(frames, dtype=np.float64)
+    curves = get_driving_curves(nodes, attributes)
+    result = {}
+    for node in nodes:
+        result[node] = {}
+        for attribute in attributes:
+            curve = curves.get((node, attribute))
+            if curve is not None:
+                values = cache.evaluate(curve, frames)
+            else:
+                value = cmds.getAttr('{}.{}'.format(node, attribute))
+                values = np.full(len(frames), float(value))
+            result[node][attribute] = values
+    return result
+
+
+def compute_activities(values):
+    '''
+    return a dict {node: bool array}, a constraint is active when it's
+    enabled with a strength or a glue strength.
+    '''
+    activities = {}
+    for node, attributes in values.items():
+        active = attributes['enable'] > 0.5
+        strengths = [
+            attributes[name] > 0 for name in ('strength', 'glueStrength')
+            if name in attributes]
+        if strengths:
+            active &= np.logical_or.reduce(strengths)
+        activities[node] = active
+    return activities
+
+
+def get_active_ranges(activity):
+    '''
+    return the list of (start, end) indices of the active runs, end being
+    exclusive. It's used to draw the activity bars.
+    '''
+    activity = np.asarray(activity, dtype=np.int8)
+    changes = np.diff(np.concatenate(([0], activity, [0])))
+    starts = np.flatnonzero(changes == 1)
+    ends = np.flatnonzero(changes == -1)
+    return list(zip(starts.tolist(), ends.tolist()))
@@ -0,0 +1,136 @@
+"""
+Memory benchmark of the DynamicConstraint cached values. It compares the
+real DynamicConstraint, a slotted wrapper of a row of the records column
+store, with its layout before the store: one python object by constraint
+with a __dict__ holding the values. It runs in mayapy, all the wrappers
+share one dynamicConstraint node and are filled with generated values:
+
+mayapy ressources/benchmark_records.py
+"""
+
+import gc
+import random
+import sys
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+import maya.standalone
+maya.standalone.initialize()
+from maya import cmds
+import maya.api.OpenMaya as om2
+
+from nconstraintoutliner import nconstraint
+from nconstraintoutliner.nconstraint import DynamicConstraint
+from nconstraintoutliner.records import ConstraintRecords
+
+
+COUNTS = 1000, 10000, 50000
+CLOTHS_COUNT = 200
+NUCLEUS_COUNT = 4
+
+
+class DictConstraint(object):
+    ''' layout of a DynamicConstraint before the column store '''
+
+    def __init__(self, nodename):
+        self._dagnode = om2.MFnDagNode(
+            om2.MSelectionList().add(nodename).getDependNode(0))
+        self._components = None
+        self._components_iterator = None
+        self._members = None
+        self._nucleus = None
+        self._type = None
+        self._nice_name = None
+        self._color = None
+
+    def set_cached_values(
+            self, constraint_type, components, nice_name, nucleus, color):
+        self._type = constraint_type
+        self._components = components
+        self._nice_name = nice_name
+        self._nucleus = nucleus
+        self._color = color
+
+
+def generate_values(count):
+    random.seed(0)
+    for _ in range(count):
+        # maya returns new strings at each query, they are copied here
+        components = sorted(
+            ''.join(list('cloth_{}'.format(random.randrange(CLOTHS_COUNT))))
+            for _ in range(2))
+        nucleus = ''.join(list(
+            'nucleus{}'.format(random.randrange(NUCLEUS_COUNT))))
+        constraint_type = random.randrange(8)
+        nice_name = nconstraint.format_nconstraint_nice_name(
+            constraint_type, components)
+        color = tuple(random.randrange(256) for _ in range(3))
+        yield constraint_type, components, nice_name, nucleus, color
+
+
+def build_constraints(cls, nodename, count):
+    # a new store by measure, the rows and the interned strings of the
+    # previous one would be reused
+    nconstraint._records = ConstraintRecords()
+    constraints = []
+    for values in generate_values(count):
+        constraint = cls(nodename)
+        constraint.set_cached_values(*values)
+        constraints.append(constraint)
+    return constraints
+
+
+def get_rss():
+    ''' return the peak resident memory in Mb, None if unavailable '''
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux gives kilobytes and mac os bytes
+    return rss / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+def measure(builder, count):
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    try:
+        import tracemalloc
+    except ImportError:  # python 2
+        tracemalloc = None
+    if tracemalloc:
+        tracemalloc.start()
+    storage = builder(count)
+    gc.collect()
+    objects = len(gc.get_objects()) - objects_before
+    memory = None
+    if tracemalloc:
+        memory = tracemalloc.get_traced_memory()[0] / (1024.0 * 1024.0)
+        tracemalloc.stop()
+    del storage
+    return objects, memory
+
+
+def main():
+    nodename = cmds.createNode('dynamicConstraint')
+    builders = (
+        ('dict objects',
+         lambda n: build_constraints(DictConstraint, nodename, n)),
+        ('records',
+         lambda n: build_constraints(DynamicConstraint, nodename, n)))
+    print('{:>8} {:<16} {:>14} {:>12}'.format(
+        'count', 'storage', 'gc objects', 'memory (Mb)'))
+    for count in COUNTS:
+        for name, builder in builders:
+            objects, memory = measure(builder, count)
+            memory = '-' if memory is None else '{:.2f}'.format(memory)
+            print('{:>8} {:<16} {:>14} {:>12}'.format(
+                count, name, objects, memory))
+    rss = get_rss()
+    if rss is not None:
+        print('peak rss: {:.1f} Mb'.format(rss))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+from nconstraintoutliner.profiler import (
+    MINIMUM_BASELINE_SOLVES, FakeEvaluator, profile_nconstraints)
+
+
+def create_costs(count, expensive, cheap_cost=0.0, expensive_cost=1.0):
+    nodes = ['dynamicConstraintShape{}'.format(i) for i in range(count)]
+    return {
+        node: expensive_cost if node in expensive else cheap_cost
+        for node in nodes}
+
+
+def test_bisection_prunes_the_cheap_groups():
+    expensive = 'dynamicConstraintShape7', 'dynamicConstraintShape62'
+    costs = create_costs(100, expensive)
+    evaluator = FakeEvaluator(costs)
+    result = profile_nconstraints(costs, evaluator)
+    assert result == costs
+    # baseline, whole group, then one evaluation by split on two paths
+    assert evaluator.evaluations < 20
+
+
+def test_bisection_never_exceeds_individual_toggles():
+    costs = create_costs(100, expensive=(), cheap_cost=1.0)
+    evaluator = FakeEvaluator(costs)
+    result = profile_nconstraints(costs, evaluator)
+    assert result == costs
+    # baseline solves and n evaluations: the second half isn't measured
+    assert evaluator.evaluations <= len(costs) + MINIMUM_BASELINE_SOLVES
+
+
+def test_noise_isnt_charged_to_the_cheap_constraints():
+    expensive = 'dynamicConstraintShape31',
+    costs = create_costs(100, expensive, cheap_cost=1e-6)
+    evaluator = FakeEvaluator(costs, base_cost=0.5, noise=0.01)
+    result = profile_nconstraints(costs, evaluator, repeat=3)
+    assert abs(result['dynamicConstraintShape31'] - 1.0) < 0.05
+    cheap = [cost for node, cost in result.items() if node not in expensive]
+    assert max(cheap) == 0.0
+    assert evaluator.evaluations < len(costs)
+
+
+def test_disabled_constraints_are_restored():
+    costs = create_costs(10, expensive=('dynamicConstraintShape3', ))
+    evaluator = FakeEvaluator(costs, disabled=['dynamicConstraintShape3'])
+    result = profile_nconstraints(costs, evaluator)
+    assert result['dynamicConstraintShape3'] == 0.0
+    assert evaluator.enabled['dynamicConstraintShape3'] is False
+    assert all(evaluator.enabled[node] for node in costs if node[-1] != '3')
+
+
+def test_driven_constraints_are_not_profiled():
+    expensive = 'dynamicConstraintShape4', 'dynamicConstraintShape8'
+    costs = create_costs(10, expensive)
+    evaluator = FakeEvaluator(costs, driven=['dynamicConstraintShape4'])
+    result = profile_nconstraints(costs, evaluator)
+    assert 'dynamicConstraintShape4' not in result
+    assert result['dynamicConstraintShape8'] == 1.0
+    assert sum(result.values()) == 1.0
@@ -0,0 +1,49 @@
+from nconstraintoutliner.records import (
+    ConstraintRecords, pack_color, unpack_color)
+
+
+def test_colors_are_packed_in_one_int():
+    assert unpack_color(pack_color(255, 0, 128)) == (255, 0, 128)
+    assert unpack_color(pack_color(0, 0, 0)) == (0, 0, 0)
+
+
+def test_unset_values_are_none():
+    records = ConstraintRecords()
+    row = records.allocate()
+    assert records.get_type(row) is None
+    assert records.get_color(row) is None
+    assert records.get_nucleus(row) is None
+    assert records.get_nice_name(row) is None
+    assert records.get_components(row) is None
+    # the empty nucleus is cached: the constraint isn't connected
+    records.set_nucleus(row, '')
+    assert records.get_nucleus(row) == ''
+
+
+def test_components_are_interned():
+    records = ConstraintRecords()
+    rows = [records.allocate() for _ in range(3)]
+    for row in rows:
+        # maya returns new strings at each query
+        records.set_components(row, [''.join(list('pants')), 'shirt'])
+    components = [records.get_components(row) for row in rows]
+    assert components[0] == ('pants', 'shirt')
+    assert all(c is components[0] for c in components)
+    assert len(records.strings) == 2
+    assert len(records.component_lists) == 1
+
+
+def test_released_rows_are_cleared_and_reused():
+    records = ConstraintRecords()
+    row = records.allocate()
+    other = records.allocate()
+    records.set_type(row, 3)
+    records.set_color(row, (25, 25, 125))
+    records.set_components(other, ['shirt'])
+    records.clear(other, ('components', ))
+    assert records.get_components(other) is None
+    records.release(row)
+    assert len(records) == 1
+    assert records.allocate() == row
+    assert records.get_type(row) is None
+    assert records.get_color(row) is None